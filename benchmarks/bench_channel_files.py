@@ -0,0 +1,166 @@
+"""
+Compare starting 20k gates from one config file against the same channels
+split into per-guild files in a `channels_dir`: the time until the first
+gates are scheduled, the time until all are, and peak memory while loading
+(measured in a second pass with tracemalloc, which slows things down).
+
+Run with `python -m benchmarks.bench_channel_files`.
+"""
+
+import asyncio
+from pathlib import Path
+import tempfile
+import time
+import tracemalloc
+from typing import Optional
+
+import yaml
+
+from floodgate.config import load_config
+from floodgate.dispatch import RestDispatcher
+from floodgate.gate.cog import Gate
+from floodgate.metrics import FloodgateMetrics
+
+CHANNELS = 20_000
+FILES = 200
+FIRST_CHANNEL_ID = 10**17
+TIMEZONES = ("UTC", "America/New_York", "Europe/Berlin", "Asia/Tokyo")
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+
+
+class FakeBot:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.dispatcher = RestDispatcher(loop)
+        self.metrics = FloodgateMetrics()
+        # Never set, the benchmark schedules the gates itself
+        self.ready = asyncio.Event()
+
+    def get_channel(self, channel_id: int):
+        return FakeChannel(channel_id)
+
+    async def wait_until_ready(self):
+        await self.ready.wait()
+
+
+def make_channels(first: int, count: int) -> dict[int, dict]:
+    return {
+        channel_id: {
+            "gate_open": {
+                "timezone": TIMEZONES[channel_id % len(TIMEZONES)],
+                "time": ["9:00", "17:00"],
+                "duration": "5 min",
+            },
+            "messages": {"open": "Open!", "close": "Closed."},
+        }
+        for channel_id in range(first, first + count)
+    }
+
+
+def write_yaml(path: Path, obj):
+    path.write_text(yaml.dump(obj, Dumper=getattr(yaml, "CDumper", yaml.Dumper)))
+
+
+def write_configs(directory: Path) -> tuple[Path, Path]:
+    """Write the channels as one config, and as a config and a channels_dir."""
+    floodgate = {"state_file": None}
+    monolithic = directory / "monolithic.yml"
+    write_yaml(
+        monolithic,
+        {
+            "bot_token": "token",
+            "bot": {
+                "modules": {
+                    "floodgate": {
+                        **floodgate,
+                        "channels": make_channels(FIRST_CHANNEL_ID, CHANNELS),
+                    }
+                }
+            },
+        },
+    )
+
+    channels_dir = directory / "channels"
+    channels_dir.mkdir()
+    per_file = CHANNELS // FILES
+    for i in range(FILES):
+        write_yaml(
+            channels_dir / f"guild-{i:04}.yml",
+            make_channels(FIRST_CHANNEL_ID + i * per_file, per_file),
+        )
+    split = directory / "split.yml"
+    write_yaml(
+        split,
+        {
+            "bot_token": "token",
+            "bot": {
+                "modules": {
+                    "floodgate": {**floodgate, "channels_dir": str(channels_dir)}
+                }
+            },
+        },
+    )
+    return monolithic, split
+
+
+async def start_gates(config_path: Path) -> tuple[float, float]:
+    """
+    Load a config and schedule its gates.
+
+    :return: seconds until the first gates were scheduled, and until all were
+    """
+    start = time.perf_counter()
+    first: Optional[float] = None
+    config = load_config(config_path, cache_dir=None).bot.modules.floodgate
+    gate = Gate(FakeBot(asyncio.get_running_loop()), config)
+    reconcile = gate._reconcile
+
+    def timed_reconcile(*args, **kwargs):
+        nonlocal first
+        counts = reconcile(*args, **kwargs)
+        if first is None and gate._gates:
+            first = time.perf_counter() - start
+        return counts
+
+    gate._reconcile = timed_reconcile
+    await gate._schedule_todays_gate_openings()
+    elapsed = time.perf_counter() - start
+    assert len(gate._gates) == CHANNELS
+    gate.cog_unload()
+    # Cancel the cog's own startup task, which waits for a ready that never
+    # comes (once it has started)
+    await asyncio.sleep(0)
+    tasks = asyncio.all_tasks() - {asyncio.current_task()}
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return first, elapsed
+
+
+def peak_memory(config_path: Path) -> float:
+    tracemalloc.start()
+    asyncio.run(start_gates(config_path))
+    __, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2**20
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        monolithic, split = write_configs(Path(directory))
+        print(f"{CHANNELS} channels, split into {FILES} files")
+        print(f"{'config':<10} | {'first gates':>11} | {'all gates':>9} | {'peak':>7}")
+        for name, path in (("monolithic", monolithic), ("split", split)):
+            first, elapsed = asyncio.run(start_gates(path))
+            peak = peak_memory(path)
+            print(
+                f"{name:<10} | {first:>9.2f} s | {elapsed:>7.2f} s | {peak:>3.0f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Measure the memory each gated channel keeps for as long as the bot runs:
+its validated config as pydantic models (how channels used to be kept), as
+the frozen records gates run from now, and its gate's runtime state
+(controller, scheduled calls and bookkeeping). Configs are parsed from YAML
+like the real config file, so every channel starts with its own copy of
+each string.
+
+Run with `python -m benchmarks.bench_channel_memory`.
+"""
+
+import asyncio
+import gc
+import tracemalloc
+from typing import Callable, TypeVar
+
+from pydantic import parse_obj_as
+import yaml
+
+from floodgate.config import Config, YamlLoader
+from floodgate.dispatch import RestDispatcher
+from floodgate.gate.cog import Gate
+from floodgate.metrics import FloodgateMetrics
+from floodgate.records import freeze_channels
+
+CHANNELS = 20_000
+FIRST_CHANNEL_ID = 10**17
+TIMEZONES = ("UTC", "America/New_York", "Europe/Berlin", "Asia/Tokyo")
+TIMES = (["9:00", "17:00"], "12:00")
+
+# noinspection PyProtectedMember
+ChannelModel = Config._Bot._Modules._Floodgate._Channel
+T = TypeVar("T")
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+
+
+class FakeBot:
+    def __init__(self, loop: asyncio.AbstractEventLoop, channel_ids: list[int]):
+        self.loop = loop
+        self.dispatcher = RestDispatcher(loop)
+        self.metrics = FloodgateMetrics()
+        # Never set, the benchmark schedules the gates itself
+        self.ready = asyncio.Event()
+        # discord.py keeps the channels whether or not they're gated
+        self.channels = {
+            channel_id: FakeChannel(channel_id) for channel_id in channel_ids
+        }
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id)
+
+    async def wait_until_ready(self):
+        await self.ready.wait()
+
+
+def make_source(count: int) -> str:
+    channels = {
+        FIRST_CHANNEL_ID
+        + i: {
+            "gate_open": {
+                "timezone": TIMEZONES[i % len(TIMEZONES)],
+                "time": TIMES[i % len(TIMES)],
+                "duration": "5 min",
+            },
+            "messages": {"open": "The gate is open!", "close": "The gate is closed."},
+        }
+        for i in range(count)
+    }
+    return yaml.dump(channels, Dumper=getattr(yaml, "CDumper", yaml.Dumper))
+
+
+def parse_models(source: str) -> dict[int, ChannelModel]:
+    return parse_obj_as(dict[int, ChannelModel], yaml.load(source, YamlLoader))
+
+
+def retained(build: Callable[[], T]) -> tuple[T, int]:
+    """Build something and get how many bytes it keeps allocated."""
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    return result, tracemalloc.get_traced_memory()[0] - before
+
+
+async def main():
+    source = make_source(CHANNELS)
+    # Load the timezones first, they're shared by every config
+    parse_models(make_source(len(TIMEZONES)))
+    tracemalloc.start()
+
+    models, models_size = retained(lambda: parse_models(source))
+    del models
+    records, records_size = retained(lambda: freeze_channels(parse_models(source)))
+
+    config = Config.parse_obj(
+        {"bot_token": "token", "bot": {"modules": {"floodgate": {"state_file": None}}}}
+    ).bot.modules.floodgate
+    bot = FakeBot(asyncio.get_running_loop(), list(records))
+    gate = Gate(bot, config)
+    __, gates_size = retained(lambda: gate._reconcile(records))
+    assert len(gate._gates) == CHANNELS
+    tracemalloc.stop()
+    gate.cog_unload()
+
+    print(f"{CHANNELS} gated channels")
+    print(f"{'kept per channel':<20} | {'total':>9} | {'per channel':>11}")
+    for name, size in (
+        ("pydantic config", models_size),
+        ("frozen config", records_size),
+        ("gate state", gates_size),
+    ):
+        print(f"{name:<20} | {size / 2**20:>5.1f} MiB | {size / CHANNELS:>9.0f} B")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Time loading a config with 20k channels: parsing the YAML with the pure
+Python and libyaml loaders, validating it, and loading the cached validated
+config instead.
+
+Run with `python -m benchmarks.bench_config_load`.
+"""
+
+from pathlib import Path
+import tempfile
+import time
+
+import yaml
+
+from floodgate.config import Config, load_config
+
+CHANNELS = 20_000
+FIRST_CHANNEL_ID = 10**17
+TIMEZONES = ("UTC", "America/New_York", "Europe/Berlin", "Asia/Tokyo")
+
+
+def make_channel(timezone: str) -> dict:
+    return {
+        "gate_open": {
+            "timezone": timezone,
+            "time": ["9:00", "17:00"],
+            "duration": "5 min",
+            "weekdays": ["mon", "tue", "wed", "thu", "fri"],
+        },
+        "messages": {"open": "Open!", "close": "Closed."},
+    }
+
+
+def write_config(path: Path):
+    channels = {
+        FIRST_CHANNEL_ID + i: make_channel(TIMEZONES[i % len(TIMEZONES)])
+        for i in range(CHANNELS)
+    }
+    config = {
+        "bot_token": "token",
+        "bot": {"modules": {"floodgate": {"channels": channels}}},
+    }
+    path.write_text(yaml.dump(config, Dumper=getattr(yaml, "CDumper", yaml.Dumper)))
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "config.yml"
+        write_config(path)
+        source = path.read_bytes()
+        print(f"{CHANNELS} channels, {len(source) / 2**20:.1f} MiB of YAML")
+
+        __, elapsed = timed(yaml.load, source, yaml.Loader)
+        print(f"  yaml.Loader      {elapsed:>6.2f} s")
+        if hasattr(yaml, "CLoader"):
+            obj, elapsed = timed(yaml.load, source, yaml.CLoader)
+            print(f"  yaml.CLoader     {elapsed:>6.2f} s")
+        else:
+            obj = yaml.load(source, yaml.Loader)
+            print("  yaml.CLoader     (PyYAML wasn't built with libyaml)")
+        __, elapsed = timed(Config.parse_obj, obj)
+        print(f"  validation       {elapsed:>6.2f} s")
+
+        cache_dir = Path(directory) / "cache"
+        __, elapsed = timed(load_config, path, cache_dir)
+        print(f"  uncached load    {elapsed:>6.2f} s")
+        __, elapsed = timed(load_config, path, cache_dir)
+        cache_size = (cache_dir / f"{path.name}.cache").stat().st_size
+        print(
+            f"  cached load      {elapsed:>6.2f} s "
+            f"({cache_size / 2**20:.1f} MiB cache)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Measure how many MESSAGE_CREATE events per second the bot gets through for
+ungated, open and closed channels, with and without `raw_events`.
+
+The model path is discord.py's own parser (build a `discord.Message`, then
+dispatch on_message to the bot and the `leak_prevention` listener). The raw
+path is the `Gate` payload hook.
+
+Run with `python -m benchmarks.bench_leak_prevention`.
+"""
+
+import asyncio
+import time
+
+import discord
+
+from floodgate.config import Config
+from floodgate.floodgate import GATE_EXTENSION, Floodgate
+
+EVENTS = 20_000
+BATCH = 500
+GUILD_ID = 100
+BOT_ID = 200
+UNGATED_ID = 300
+OPEN_ID = 301
+CLOSED_ID = 302
+
+
+class FakeGate:
+    def __init__(self, channel_id: int):
+        self.channel = discord.Object(id=channel_id)
+
+
+def make_payload(channel_id: int, message_id: int) -> dict:
+    return {
+        "id": str(message_id),
+        "channel_id": str(channel_id),
+        "guild_id": str(GUILD_ID),
+        "author": {
+            "id": "400",
+            "username": "raider",
+            "discriminator": "0001",
+            "avatar": None,
+        },
+        "content": "hello",
+        "timestamp": "2022-01-01T00:00:00+00:00",
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+        "type": 0,
+    }
+
+
+def make_bot(raw_events: bool) -> Floodgate:
+    config = Config.parse_obj(
+        {
+            "bot_token": "token",
+            "bot": {
+                "modules": {
+                    "floodgate": {
+                        "deletion_window": "1 hour",
+                        "raw_events": raw_events,
+                        "state_file": None,
+                    }
+                }
+            },
+        }
+    )
+    bot = Floodgate(config.bot)
+    # Normally loaded when the bot logs in
+    bot.load_extension(GATE_EXTENSION)
+    # noinspection PyProtectedMember
+    bot._connection.user = discord.Object(id=BOT_ID)
+    gate = bot.get_cog("Gate")
+    gate._bot_user_key = str(BOT_ID)
+    gate._gates[OPEN_ID] = FakeGate(OPEN_ID)
+    gate._gates[CLOSED_ID] = FakeGate(CLOSED_ID)
+    gate._messages_seen.update({str(OPEN_ID): 0, str(CLOSED_ID): 0})
+    gate._closed_channels.add(CLOSED_ID)
+    return bot
+
+
+def measure(bot: Floodgate, channel_id: int) -> float:
+    # noinspection PyProtectedMember
+    parse = bot._connection.parsers["MESSAGE_CREATE"]
+    payloads = [make_payload(channel_id, 10**17 + i) for i in range(EVENTS)]
+    loop = bot.loop
+
+    start = time.perf_counter()
+    for i in range(0, EVENTS, BATCH):
+        for payload in payloads[i : i + BATCH]:
+            parse(payload)
+        # Let dispatched on_message handlers run
+        loop.run_until_complete(asyncio.sleep(0))
+    elapsed = time.perf_counter() - start
+    return EVENTS / elapsed
+
+
+def main():
+    print(f"{'channel':<8} | {'model (events/s)':>16} | {'raw (events/s)':>14}")
+    bots = {raw: make_bot(raw) for raw in (False, True)}
+    for name, channel_id in (
+        ("ungated", UNGATED_ID),
+        ("open", OPEN_ID),
+        ("closed", CLOSED_ID),
+    ):
+        model = measure(bots[False], channel_id)
+        raw = measure(bots[True], channel_id)
+        print(f"{name:<8} | {model:>16,.0f} | {raw:>14,.0f}")
+    for bot in bots.values():
+        bot.get_cog("Gate").cog_unload()
+
+    loop = bots[False].loop
+    tasks = asyncio.all_tasks(loop)
+    for task in tasks:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Run the real bot against a local fake Discord (see `tests.harness`)
+with many guilds and channels, slow REST responses and some 429s.
+
+First a storm of messages is sent to the closed gates and the time until
+the fake REST API has seen every one deleted is measured. Then every gate
+opens at the next minute boundary and closes again shortly after, and the
+open/close lateness and announcement lag are read from the bot. This waits
+for real time, so it takes up to a minute and a half.
+
+Run with `python -m benchmarks.bench_load`.
+"""
+
+import asyncio
+import logging
+import resource
+import time
+
+import pendulum as pen
+
+from tests.harness import FakeDiscord, make_config, start_bot, stop_bot
+
+GUILDS = 20
+CHANNELS_PER_GUILD = 10
+MESSAGES = 20_000
+LATENCY = 0.02
+RATE_LIMIT_CHANCE = 0.02
+OPEN_DURATION = 5
+# Gates open at the first minute boundary at least this far away
+OPEN_LEAD = 10
+
+
+def max_rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def wait_for(predicate, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+
+async def main():
+    # The dispatcher logs a warning for every simulated 429
+    logging.getLogger("floodgate").setLevel(logging.ERROR)
+    fake = FakeDiscord(
+        GUILDS,
+        CHANNELS_PER_GUILD,
+        latency=LATENCY,
+        rate_limit_chance=RATE_LIMIT_CHANCE,
+    )
+    await fake.start()
+
+    opens_at = pen.now("UTC").add(seconds=OPEN_LEAD + 60).start_of("minute")
+    gate_open = {
+        "timezone": "UTC",
+        "time": opens_at.format("HH:mm"),
+        "duration": f"{OPEN_DURATION} sec",
+    }
+    config = make_config({channel_id: gate_open for channel_id in fake.channel_ids})
+    rss_before = max_rss_mib()
+    start = time.perf_counter()
+    bot, task = await start_bot(config, timeout=30)
+    print(
+        f"{len(fake.channel_ids)} gates in {GUILDS} guilds ready in "
+        f"{time.perf_counter() - start:.2f} s"
+    )
+
+    try:
+        start = time.time()
+        sent = set(await fake.send_messages(fake.channel_ids, MESSAGES))
+        dispatched = time.time() - start
+        done = await wait_for(lambda: fake.deleted >= sent, timeout=120)
+        elapsed = fake.last_deleted_at - start
+        print(
+            f"storm: {MESSAGES} messages dispatched in {dispatched:.2f} s, "
+            f"{len(fake.deleted & sent)} deleted in {elapsed:.2f} s "
+            f"({len(fake.deleted & sent) / elapsed:,.0f}/s)"
+            + ("" if done else " (timed out)")
+        )
+        print(
+            f"rest: {sum(fake.requests.values())} requests, "
+            f"{fake.rate_limited} rate limited, "
+            f"{bot.rate_limit_log.rate_limited} retried by discord.py and "
+            f"{bot.dispatcher.retried_429} by the dispatcher"
+        )
+
+        print(f"waiting for gates to open at {opens_at.format('HH:mm:ss')} UTC")
+        closes_at = opens_at.add(seconds=OPEN_DURATION).timestamp()
+        expected = 2 * len(fake.channel_ids)
+        await asyncio.sleep(max(closes_at - time.time(), 0))
+        await wait_for(lambda: len(fake.announcements) >= expected, timeout=60)
+
+        gate = bot.get_cog("Gate")
+        error = gate._scheduler.error
+        announcer = gate._announcer
+        print(
+            f"transitions: {error.count} ran, lateness mean "
+            f"{error.mean * 1000:.2f} ms, max {error.max * 1000:.2f} ms"
+        )
+        print(
+            f"announcements: {len(fake.announcements)} sent, lag mean "
+            f"{announcer.lag.mean * 1000:.0f} ms, max {announcer.lag.max * 1000:.0f} ms"
+        )
+    finally:
+        await stop_bot(bot, task)
+        await fake.stop()
+    print(f"max RSS {max_rss_mib():.0f} MiB (+{max_rss_mib() - rss_before:.0f} MiB)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+"""
+Compare the cost of scheduling gate transitions with one sleeping task per
+transition (the old `GateController` approach) against a single
+`GateScheduler` heap.
+
+Run with `python -m benchmarks.bench_scheduler`.
+"""
+
+import asyncio
+import gc
+import time
+import tracemalloc
+
+from floodgate.gate.scheduler import GateScheduler
+
+CHANNEL_COUNTS = (1_000, 10_000, 100_000)
+DAY = 24 * 60 * 60
+
+
+def _noop():
+    pass
+
+
+async def _sleep_then_run(delay: float):
+    await asyncio.sleep(delay)
+    _noop()
+
+
+async def schedule_with_tasks(channels: int):
+    loop = asyncio.get_running_loop()
+    tasks = []
+    for i in range(channels):
+        open_delay = DAY / 2 + i
+        tasks.append(loop.create_task(_sleep_then_run(open_delay)))
+        tasks.append(loop.create_task(_sleep_then_run(open_delay + 300)))
+    # Let every task start and park in asyncio.sleep
+    await asyncio.sleep(0)
+    return tasks
+
+
+def cancel_tasks(tasks: list[asyncio.Task]):
+    for task in tasks:
+        task.cancel()
+
+
+async def schedule_with_heap(channels: int):
+    scheduler = GateScheduler(asyncio.get_running_loop())
+    for i in range(channels):
+        open_delay = DAY / 2 + i
+        scheduler.call_later(open_delay, _noop)
+        scheduler.call_later(open_delay + 300, _noop)
+    await asyncio.sleep(0)
+    return scheduler
+
+
+async def measure(schedule, teardown, channels: int) -> tuple[float, int]:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    handle = await schedule(channels)
+    elapsed = time.perf_counter() - start
+    memory, __ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    teardown(handle)
+    await asyncio.sleep(0)
+    return elapsed, memory
+
+
+async def main():
+    print(
+        f"{'channels':>9} | {'strategy':<9} | {'schedule (ms)':>13} | "
+        f"{'memory (KiB)':>12} | {'bytes/channel':>13}"
+    )
+    for channels in CHANNEL_COUNTS:
+        for name, schedule, teardown in (
+            ("tasks", schedule_with_tasks, cancel_tasks),
+            ("heap", schedule_with_heap, GateScheduler.close),
+        ):
+            elapsed, memory = await measure(schedule, teardown, channels)
+            print(
+                f"{channels:>9} | {name:<9} | {elapsed * 1000:>13.1f} | "
+                f"{memory / 1024:>12.0f} | {memory / channels:>13.0f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
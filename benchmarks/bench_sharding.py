@@ -0,0 +1,136 @@
+"""
+Run the bot's shards against a local fake Discord (see `tests.harness`)
+from one process, then split across several, and measure how fast a storm
+of messages to closed gates is deleted. Each process parses the gateway
+events of its own shards' guilds, which is the work a single process runs
+out of CPU for. REST responses are fast and never rate limited, so that
+the bot's processes rather than the fake API are the bottleneck.
+
+The processes are started like they would be in production, with a shard
+range each and a shared status directory, and the benchmark waits for them
+through their status sockets.
+
+Run with `python -m benchmarks.bench_sharding`.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+from pathlib import Path
+import tempfile
+import time
+from typing import Optional
+
+import discord
+
+from floodgate.config import Config
+from floodgate.sharding import format_shard_ids
+from floodgate.status import query_status
+from tests.harness import FakeDiscord, make_config, start_bot, stop_bot
+
+GUILDS = 40
+CHANNELS_PER_GUILD = 5
+SHARD_COUNT = 4
+PROCESSES = (1, 2, 4)
+MESSAGES = 40_000
+LATENCY = 0.001
+
+
+def run_shards(base_url: str, config: Config, stop: multiprocessing.Event):
+    # The fake only replaces the API's base URL in the process it runs in
+    discord.http.Route.BASE = f"{base_url}/api/v7"
+    logging.getLogger("floodgate").setLevel(logging.ERROR)
+
+    async def main():
+        bot, task = await start_bot(config, timeout=60)
+        await asyncio.get_running_loop().run_in_executor(None, stop.wait)
+        await stop_bot(bot, task)
+
+    asyncio.run(main())
+
+
+async def wait_for_processes(status_dir: Path, count: int, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        statuses = await query_status(status_dir)
+        if len(statuses) == count and all(
+            status.get("gates") is not None for status in statuses
+        ):
+            return
+        await asyncio.sleep(0.1)
+    raise TimeoutError("The bot's processes didn't schedule their gates in time")
+
+
+async def run(fake: FakeDiscord, processes: int):
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    gate_open = {"timezone": "UTC", "time": "00:00", "duration": "1 sec"}
+    channels = {channel_id: gate_open for channel_id in fake.channel_ids}
+    per_process = SHARD_COUNT // processes
+
+    with tempfile.TemporaryDirectory() as status_dir:
+        children = []
+        for i in range(processes):
+            shard_ids: Optional[list[int]] = list(
+                range(i * per_process, (i + 1) * per_process)
+            )
+            if processes == 1:
+                # One process runs every shard without listing them
+                shard_ids = None
+            config = make_config(
+                channels,
+                sharding={
+                    "enabled": True,
+                    "shard_count": SHARD_COUNT,
+                    "shard_ids": shard_ids,
+                    "status_dir": status_dir,
+                },
+            )
+            child = context.Process(
+                target=run_shards, args=(fake.base_url, config, stop)
+            )
+            child.start()
+            children.append(child)
+
+        try:
+            await wait_for_processes(Path(status_dir), processes)
+            start = time.time()
+            sent = set(await fake.send_messages(fake.channel_ids, MESSAGES))
+            deadline = time.monotonic() + 120
+            while not fake.deleted >= sent and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+            elapsed = fake.last_deleted_at - start
+            deleted = len(fake.deleted & sent)
+        finally:
+            stop.set()
+            for child in children:
+                await asyncio.get_running_loop().run_in_executor(None, child.join, 10)
+
+    shards = "all" if processes == 1 else format_shard_ids(range(per_process))
+    print(
+        f"{processes:>9} | {shards:>14} | {deleted:>7} | {elapsed:>7.2f} s "
+        f"| {deleted / elapsed:>9,.0f}"
+        + ("" if deleted == len(sent) else " (timed out)")
+    )
+
+
+async def main():
+    fake = FakeDiscord(GUILDS, CHANNELS_PER_GUILD, latency=LATENCY)
+    await fake.start()
+    print(
+        f"{GUILDS} guilds, {len(fake.channel_ids)} gated channels, "
+        f"{SHARD_COUNT} shards, {MESSAGES} messages"
+    )
+    print(
+        f"{'processes':>9} | {'first process':>14} | {'deleted':>7} | "
+        f"{'time':>9} | {'deleted/s':>9}"
+    )
+    try:
+        for processes in PROCESSES:
+            await run(fake, processes)
+    finally:
+        await fake.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,195 @@
+"""
+Measure how long the bot takes to start, from a fresh interpreter to
+`on_ready`, against a local fake Discord (see `tests.harness`) that
+answers REST requests after a delay like the real API's.
+
+Each run starts the bot in a new process going through the same steps as
+`run_bot`: importing, loading the config, setting up logging, then logging
+in and connecting to the gateway. discord.py normally waits up to 2 seconds
+for more guilds before `on_ready`; that's shortened here since the fake
+sends them all at once. A last run with `-X importtime` breaks the import
+time down by package.
+
+Run with `python -m benchmarks.bench_startup`.
+"""
+
+import asyncio
+from collections import Counter
+import json
+from pathlib import Path
+import statistics
+import sys
+import tempfile
+import time
+
+GUILDS = 10
+CHANNELS_PER_GUILD = 10
+# Seconds to answer each REST request in, about a round trip to Discord
+LATENCY = 0.1
+RUNS = 5
+GUILD_READY_TIMEOUT = 0.05
+# Packages shown in the import breakdown
+TOP_PACKAGES = 10
+
+PHASES = ("interpreter", "import", "config", "logging", "login", "connect", "ready")
+
+
+def child(config_path: str, base_url: str):
+    """Start the bot like `run_bot` does and print how long each step took."""
+    marks = {"start": time.time()}
+    start = time.perf_counter()
+
+    def mark(name: str):
+        marks[name] = time.perf_counter() - start
+
+    import gc
+
+    import discord.http
+
+    from floodgate.config import load_config
+    from floodgate.floodgate import Floodgate, setup_logging
+    from floodgate.runtime import install_event_loop_policy
+
+    mark("import")
+    config = load_config(Path(config_path))
+    mark("config")
+    log_pipeline = setup_logging(config)
+    gc.freeze()
+    mark("logging")
+
+    discord.http.Route.BASE = f"{base_url}/api/v7"
+    install_event_loop_policy(config.runtime)
+    bot = Floodgate(config.bot, runtime=config.runtime)
+    # noinspection PyProtectedMember
+    bot._connection.guild_ready_timeout = GUILD_READY_TIMEOUT
+
+    async def on_connect():
+        mark("connect")
+
+    async def on_ready():
+        mark("ready")
+        await bot.close()
+
+    real_login = bot.login
+
+    async def login(*args, **kwargs):
+        await real_login(*args, **kwargs)
+        mark("login")
+
+    bot.login = login
+    bot.add_listener(on_connect)
+    bot.add_listener(on_ready)
+    try:
+        bot.run(config.bot_token.get_secret_value())
+    finally:
+        log_pipeline.stop()
+    print(json.dumps(marks))
+
+
+def write_config(directory: Path, channel_ids: list[int]) -> Path:
+    import yaml
+
+    gate_open = {"timezone": "UTC", "time": "12:00", "duration": "5 min"}
+    config = {
+        "bot_token": "token",
+        "bot": {
+            "modules": {
+                "floodgate": {
+                    "state_file": None,
+                    "channels": {
+                        channel_id: {
+                            "gate_open": gate_open,
+                            "messages": {"open": "open", "close": "close"},
+                        }
+                        for channel_id in channel_ids
+                    },
+                }
+            },
+            "reload": {"watch": False},
+        },
+        "logging": {"output_file": str(directory / "floodgate.log")},
+    }
+    path = directory / "config.yml"
+    path.write_text(yaml.safe_dump(config))
+    return path
+
+
+async def run_child(
+    config_path: Path, base_url: str, *python_args: str
+) -> tuple[dict, bytes]:
+    spawned = time.time()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        *python_args,
+        "-m",
+        "benchmarks.bench_startup",
+        "--child",
+        str(config_path),
+        base_url,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"The bot failed to start:\n{stderr.decode()}")
+    marks = json.loads(stdout.decode().splitlines()[-1])
+
+    # Turn the marks into the duration of each phase
+    durations = {"interpreter": marks["start"] - spawned}
+    previous = 0.0
+    for phase in PHASES[1:]:
+        durations[phase] = marks[phase] - previous
+        previous = marks[phase]
+    durations["total"] = durations["interpreter"] + previous
+    return durations, stderr
+
+
+def import_breakdown(importtime: bytes) -> Counter[str]:
+    """Sum `-X importtime` self times (in seconds) by top level package."""
+    totals: Counter[str] = Counter()
+    for line in importtime.decode().splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, __, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            # The header
+            continue
+        totals[name.strip().split(".")[0]] += int(self_us) / 1_000_000
+    return totals
+
+
+async def main():
+    from tests.harness import FakeDiscord
+
+    fake = FakeDiscord(GUILDS, CHANNELS_PER_GUILD, latency=LATENCY)
+    await fake.start()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            config_path = write_config(Path(directory), fake.channel_ids)
+            runs = [
+                (await run_child(config_path, fake.base_url))[0] for __ in range(RUNS)
+            ]
+            __, importtime = await run_child(
+                config_path, fake.base_url, "-X", "importtime"
+            )
+    finally:
+        await fake.stop()
+
+    print(
+        f"{len(fake.channel_ids)} gates in {GUILDS} guilds, {LATENCY * 1000:.0f} ms "
+        f"REST latency, median of {RUNS} runs"
+    )
+    for phase in PHASES + ("total",):
+        median = statistics.median(run[phase] for run in runs)
+        print(f"  {phase:<12} {median * 1000:>7.1f} ms")
+
+    print("import time by package (self time, under -X importtime)")
+    for package, seconds in import_breakdown(importtime).most_common(TOP_PACKAGES):
+        print(f"  {package:<20} {seconds * 1000:>7.1f} ms")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(*sys.argv[2:4])
+    else:
+        asyncio.run(main())
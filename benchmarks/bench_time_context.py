@@ -0,0 +1,128 @@
+"""
+Compare planning a day of gate openings for 50k channels spread over a few
+timezones with per-channel pendulum calls (the old `_get_delay_times`)
+against a shared `TimeContext`. Also times a full reconcile pass, which
+plans every gate through the controller.
+
+Run with `python -m benchmarks.bench_time_context`.
+"""
+
+import asyncio
+import datetime as dt
+from random import random
+import time
+
+import pendulum as pen
+
+from floodgate.common.time import TimeContext, random_time
+from floodgate.config import Config
+from floodgate.dispatch import RestDispatcher
+from floodgate.gate.cog import Gate
+from floodgate.metrics import FloodgateMetrics
+
+CHANNELS = 50_000
+TIMEZONES = ("UTC", "America/New_York", "Europe/Berlin", "Asia/Tokyo")
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+
+
+class FakeBot:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.dispatcher = RestDispatcher(loop)
+        self.metrics = FloodgateMetrics()
+
+    def get_channel(self, channel_id: int):
+        return FakeChannel(channel_id)
+
+    async def wait_until_ready(self):
+        await asyncio.Event().wait()
+
+
+def make_config():
+    config = Config.parse_obj(
+        {
+            "bot_token": "token",
+            "bot": {
+                "modules": {
+                    "floodgate": {
+                        "state_file": None,
+                        "channels": {
+                            channel_id: {
+                                "gate_open": {
+                                    "timezone": TIMEZONES[channel_id % len(TIMEZONES)],
+                                    "time_window_start": "10:00",
+                                    "time_window_end": "22:00",
+                                    "duration": "5 min",
+                                },
+                                "messages": {"open": "open", "close": "close"},
+                            }
+                            for channel_id in range(1, CHANNELS + 1)
+                        },
+                    }
+                }
+            },
+        }
+    )
+    return config.bot.modules.floodgate
+
+
+def old_random_time(start: pen.Time, end: pen.Time) -> pen.Time:
+    total_seconds = (end - start).total_seconds()
+    return start + pen.Duration(seconds=random() * total_seconds)
+
+
+def plan_with_pendulum(channels) -> float:
+    start = time.perf_counter()
+    for channel_config in channels.values():
+        config = channel_config.gate_open
+        now = pen.now()
+        today = pen.today(config.timezone)
+        open_time = old_random_time(config.time_window_start, config.time_window_end)
+        start_dt = pen.instance(
+            dt.datetime.combine(today, open_time), tz=config.timezone
+        )
+        start_delay = (start_dt - now).total_seconds()
+        start_delay + config.duration.total_seconds()
+    return time.perf_counter() - start
+
+
+def plan_with_context(channels) -> float:
+    start = time.perf_counter()
+    context = TimeContext()
+    for channel_config in channels.values():
+        config = channel_config.gate_open
+        today = context.today(config.timezone)
+        open_time = random_time(config.time_window_start, config.time_window_end)
+        open_at = context.timestamp(config.timezone, today, open_time)
+        open_at + config.duration.total_seconds()
+    return time.perf_counter() - start
+
+
+async def reconcile(config) -> float:
+    gate = Gate(FakeBot(asyncio.get_running_loop()), config)
+    start = time.perf_counter()
+    gate._reconcile(config.channels)
+    elapsed = time.perf_counter() - start
+    gate.cog_unload()
+    for task in asyncio.all_tasks() - {asyncio.current_task()}:
+        task.cancel()
+    return elapsed
+
+
+def main():
+    config = make_config()
+    before = plan_with_pendulum(config.channels)
+    after = plan_with_context(config.channels)
+    print(f"{CHANNELS:,} channels in {len(TIMEZONES)} timezones")
+    print(f"{'planning':<20} | {'time (s)':>8}")
+    print(f"{'per-channel pendulum':<20} | {before:>8.3f}")
+    print(f"{'shared TimeContext':<20} | {after:>8.3f}")
+    print(f"{'full reconcile':<20} | {asyncio.run(reconcile(config)):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Time compiling a week of windows for 100k channels, for gates that open at
+fixed times, at random times and at seeded random times.
+
+Run with `python -m benchmarks.bench_timetable`.
+"""
+
+import time
+
+from floodgate.config import Config
+from floodgate.gate.timetable import compile_timetable
+
+CHANNELS = 100_000
+DAYS = 7
+TIMEZONES = ("UTC", "America/New_York", "Europe/Berlin", "Asia/Tokyo")
+RULES = {
+    "fixed": [
+        {"time": "12:00"},
+        {"time": ["9:00", "17:00"], "weekdays": ["mon", "tue", "wed", "thu", "fri"]},
+    ],
+    "random": [{"time_window_start": "10:00", "time_window_end": "22:00"}],
+}
+
+
+def make_channels(rules: list[dict]):
+    """Parse one config per rule and timezone and share them among channels."""
+    configs = Config.parse_obj(
+        {
+            "bot_token": "token",
+            "bot": {
+                "modules": {
+                    "floodgate": {
+                        "channels": {
+                            i: {
+                                "gate_open": {
+                                    "timezone": timezone,
+                                    "duration": "5 min",
+                                    **rule,
+                                },
+                                "messages": {"open": "open", "close": "close"},
+                            }
+                            for i, (timezone, rule) in enumerate(
+                                (timezone, rule)
+                                for timezone in TIMEZONES
+                                for rule in rules
+                            )
+                        }
+                    }
+                }
+            },
+        }
+    ).bot.modules.floodgate.channels
+    configs = list(configs.values())
+    return {
+        channel_id: configs[channel_id % len(configs)]
+        for channel_id in range(1, CHANNELS + 1)
+    }
+
+
+def measure(channels, salt=None) -> tuple[float, int]:
+    start = time.perf_counter()
+    timetable = compile_timetable(channels, days=DAYS, salt=salt)
+    return time.perf_counter() - start, len(timetable)
+
+
+def main():
+    print(f"{CHANNELS:,} channels x {DAYS} days")
+    print(f"{'rules':<14} | {'windows':>9} | {'time (s)':>8}")
+    for name, rules, salt in (
+        ("fixed", RULES["fixed"], None),
+        ("random", RULES["random"], None),
+        ("seeded random", RULES["random"], b"salt"),
+    ):
+        elapsed, count = measure(make_channels(rules), salt)
+        print(f"{name:<14} | {count:>9,} | {elapsed:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Schedule thousands of wall clock transitions a few seconds out, some at the
+same instant (like gates sharing a time) and some spread out, and report how
+late they ran. The second pass steps the scheduler's wall clock forward a
+little mid-run, like an NTP correction, and checks the transitions still run
+on the corrected clock.
+
+Run with `python -m benchmarks.bench_transition_accuracy`.
+"""
+
+import asyncio
+import time
+
+from floodgate.gate.scheduler import GateScheduler
+
+TRANSITIONS = 5_000
+SPREAD = 2.0
+LEAD = 1.5
+
+
+class SteppedClock:
+    def __init__(self):
+        self.skew = 0.0
+
+    def __call__(self) -> float:
+        return time.time() + self.skew
+
+
+async def run(step: float) -> tuple[GateScheduler, list[float]]:
+    clock = SteppedClock()
+    scheduler = GateScheduler(asyncio.get_running_loop(), clock)
+    errors = []
+    start = clock() + LEAD
+    for i in range(TRANSITIONS):
+        # Half the transitions share one instant
+        timestamp = start if i % 2 else start + SPREAD * i / TRANSITIONS
+        scheduler.call_at_time(
+            timestamp, lambda ts=timestamp: errors.append(clock() - ts)
+        )
+    await asyncio.sleep(LEAD / 2)
+    clock.skew = step
+    await asyncio.sleep(LEAD + SPREAD)
+    scheduler.close()
+    return scheduler, errors
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+async def main():
+    print(
+        f"{'clock step (s)':>14} | {'ran':>5} | {'p50 (ms)':>8} | "
+        f"{'p99 (ms)':>8} | {'max (ms)':>8} | {'jumps':>5}"
+    )
+    for step in (0.0, 0.25):
+        scheduler, errors = await run(step)
+        print(
+            f"{step:>14} | {len(errors):>5} | "
+            f"{percentile(errors, 0.5) * 1000:>8.2f} | "
+            f"{percentile(errors, 0.99) * 1000:>8.2f} | "
+            f"{max(errors) * 1000:>8.2f} | {scheduler.clock_jumps:>5}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,6 +1,19 @@
 import logging
 logger = logging.getLogger(__name__)
 
-from .floodgate import *
+__all__ = [
+    'Floodgate', 'AutoShardedFloodgate', 'make_bot', 'configure_sharding',
+    'setup_logging', 'run_bot',
+]
 
 __version__ = '0.1.0'
+
+
+def __getattr__(name: str):
+    # discord.py is most of the startup time, so it's only imported once
+    # something needs it, not just for loading the config. Simulating does
+    # need it, since it runs the real Gate cog.
+    if name in __all__:
+        from . import floodgate
+        return getattr(floodgate, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
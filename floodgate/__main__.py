@@ -1,3 +1,53 @@
-from . import run_bot
+import argparse
+from pathlib import Path
 
-run_bot()
+from .config import default_config_path
+from .sharding import parse_shard_ids
+
+parser = argparse.ArgumentParser(prog="python -m floodgate")
+parser.add_argument(
+    "--shards",
+    type=parse_shard_ids,
+    help="run only these shards in this process, e.g. 0-3 (turns sharding on)",
+)
+parser.add_argument("--shard-count", type=int, help="the bot's total number of shards")
+subparsers = parser.add_subparsers(dest="command")
+simulate_parser = subparsers.add_parser(
+    "simulate", help="preview the gates' schedule on a virtual clock"
+)
+simulate_parser.add_argument(
+    "--days", type=int, default=7, help="number of days to simulate (default 7)"
+)
+simulate_parser.add_argument(
+    "--config", type=Path, default=default_config_path, help="config file to load"
+)
+simulate_parser.add_argument(
+    "--no-timeline", action="store_true", help="only print the stats"
+)
+status_parser = subparsers.add_parser(
+    "status", help="show the status of each process running the bot"
+)
+status_parser.add_argument(
+    "--config", type=Path, default=default_config_path, help="config file to load"
+)
+args = parser.parse_args()
+
+if args.command == "simulate":
+    from .config import load_config
+    from .simulate import print_simulation, simulate
+
+    config = load_config(args.config).bot.modules.floodgate
+    result = simulate(config, days=args.days)
+    print_simulation(result, timeline=not args.no_timeline)
+elif args.command == "status":
+    import asyncio
+
+    from .config import load_config
+    from .status import format_status, query_status
+
+    status_dir = load_config(args.config).bot.sharding.status_dir
+    print(format_status(asyncio.run(query_status(status_dir))))
+else:
+    from . import run_bot
+
+    run_bot(args.shards, args.shard_count)
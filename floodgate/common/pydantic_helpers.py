@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Any, Callable, Type, TypeVar, Union
+from typing import Any, Callable, Optional, Type, TypeVar, Union
 
 from pydantic import BaseModel, ConfigError, root_validator, validator
 from pydantic.fields import FieldInfo
@@ -38,7 +38,9 @@ def instance_list_factory(class_: Type[V], *args, **kwargs) -> Callable[[], list
 def maybe_relative_path(fields: T_MaybeList[str], root_path: Path):
     fields = ensure_list(fields)
 
-    def validate_fn(path: Union[Path, str]):
+    def validate_fn(path: Optional[Union[Path, str]]):
+        if path is None:
+            return None
         if not isinstance(path, Path):
             path = Path(path)
         if not path.is_absolute():
@@ -0,0 +1,13 @@
+from discord.utils import DISCORD_EPOCH
+
+__all__ = ["snowflake_timestamp", "timestamp_snowflake"]
+
+
+def snowflake_timestamp(snowflake: int) -> float:
+    """Get the Unix timestamp encoded in a Discord snowflake."""
+    return ((snowflake >> 22) + DISCORD_EPOCH) / 1000
+
+
+def timestamp_snowflake(timestamp: float) -> int:
+    """Get the lowest Discord snowflake for a Unix timestamp."""
+    return (int(timestamp * 1000) - DISCORD_EPOCH) << 22
@@ -0,0 +1,30 @@
+__all__ = ["LatencyStats"]
+
+
+class LatencyStats:
+    """Running count/mean/max of a latency measured in seconds."""
+
+    __slots__ = ("count", "total", "max", "last")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def __str__(self) -> str:
+        return (
+            f"mean={self.mean * 1000:.0f}ms max={self.max * 1000:.0f}ms "
+            f"last={self.last * 1000:.0f}ms"
+        )
@@ -1,14 +1,23 @@
+from collections.abc import Sequence
+import datetime as dt
+import hashlib
 from random import random
 import re
-from typing import Type, TypeVar
+import struct
+from typing import Optional, Type, TypeVar
 
 import pendulum as pen
+from pendulum.tz.timezone import Timezone
 import pytimeparse
 
 __all__ = [
     "parse_time",
     "parse_duration",
     "random_time",
+    "seeded_random",
+    "seeded_random_table",
+    "seeded_random_times",
+    "TimeContext",
 ]
 
 time_pattern = re.compile(
@@ -71,9 +80,156 @@ def parse_duration(duration_str: str, class_: Type[V] = pen.Duration) -> V:
     return class_(seconds=seconds)
 
 
-def random_time(start: pen.Time, end: pen.Time) -> pen.Time:
+def _time_seconds(time: dt.time) -> float:
+    return (
+        time.hour * 3600 + time.minute * 60 + time.second + time.microsecond / 1_000_000
+    )
+
+
+def random_time(
+    start: pen.Time, end: pen.Time, fraction: Optional[float] = None
+) -> pen.Time:
+    """
+    Pick a random time between `start` and `end`.
+
+    :param fraction: where in the range to pick, from 0 to 1. A new random
+        number is drawn if not given.
+    """
     if end < start:
         raise ValueError("end must be a time after start")
-    total_seconds = (end - start).total_seconds()
-    random_seconds = random() * total_seconds
-    return start + pen.Duration(seconds=random_seconds)
+    if fraction is None:
+        fraction = random()
+    start_seconds = _time_seconds(start)
+    # Plain arithmetic, this is called for every random gate each day
+    seconds = start_seconds + fraction * (_time_seconds(end) - start_seconds)
+    microseconds = round(seconds * 1_000_000)
+    seconds, microsecond = divmod(microseconds, 1_000_000)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    return pen.Time(hour, minute, second, microsecond)
+
+
+# A seeded hash gives the numbers for a whole ISO week, one per day
+_WEEK = struct.Struct(">7Q")
+
+
+def _seeded_key(salt: bytes) -> hashlib.blake2b:
+    if len(salt) > hashlib.blake2b.MAX_KEY_SIZE:
+        salt = hashlib.blake2b(salt).digest()
+    return hashlib.blake2b(key=salt, digest_size=_WEEK.size)
+
+
+def _seeded_week(
+    key: hashlib.blake2b, channel_id: int, year: int, week: int
+) -> tuple[int, ...]:
+    key = key.copy()
+    key.update(f"{channel_id}:{year}-W{week}".encode())
+    return _WEEK.unpack(key.digest())
+
+
+def seeded_random(salt: bytes, channel_id: int, day: dt.date) -> float:
+    """
+    Get a number in [0, 1) derived from a keyed hash of a channel ID and a
+    date. Anyone with the same salt gets the same number, so separate
+    processes agree on random times without talking to each other.
+    """
+    year, week, weekday = day.isocalendar()
+    return _seeded_week(_seeded_key(salt), channel_id, year, week)[weekday - 1] / 2**64
+
+
+def seeded_random_table(
+    salt: bytes, channel_ids: Sequence[int], days: Sequence[dt.date]
+) -> list[list[float]]:
+    """
+    Get the seeded random numbers for many channels over several days. Each
+    channel is only hashed once per ISO week the days fall in.
+
+    :return: a list of the channels' numbers for each day, in the same
+        orders as `days` and `channel_ids`
+    """
+    key = _seeded_key(salt)
+    weeks: dict[tuple[int, int], list[tuple[int, ...]]] = {}
+    table = []
+    for day in days:
+        year, week, weekday = day.isocalendar()
+        try:
+            hashes = weeks[year, week]
+        except KeyError:
+            hashes = weeks[year, week] = [
+                _seeded_week(key, channel_id, year, week) for channel_id in channel_ids
+            ]
+        index = weekday - 1
+        table.append([numbers[index] / 2**64 for numbers in hashes])
+    return table
+
+
+def seeded_random_times(
+    salt: bytes,
+    channel_ids: Sequence[int],
+    days: Sequence[dt.date],
+    start: pen.Time,
+    end: pen.Time,
+) -> dict[int, list[pen.Time]]:
+    """
+    Get the seeded random times between `start` and `end` for many channels
+    over several days, e.g. a week ahead.
+
+    :return: each channel's times, in the same order as `days`
+    """
+    table = seeded_random_table(salt, channel_ids, days)
+    return {
+        channel_id: [random_time(start, end, numbers[i]) for numbers in table]
+        for i, channel_id in enumerate(channel_ids)
+    }
+
+
+class TimeContext:
+    """
+    Calendar lookups shared by a scheduling pass. The current time is read
+    once, and each timezone's date and day boundaries are worked out by
+    pendulum only the first time they're needed, so planning thousands of
+    gates in a handful of timezones costs a handful of pendulum calls.
+    """
+
+    def __init__(self, now: Optional[pen.DateTime] = None):
+        self.now = pen.now("UTC") if now is None else now
+        self._todays: dict[str, pen.Date] = {}
+        # (timezone name, date) -> (midnight timestamp, next midnight
+        # timestamp, whether the UTC offset is the same at both)
+        self._days: dict[tuple[str, dt.date], tuple[float, float, bool]] = {}
+
+    def today(self, timezone: Timezone) -> pen.Date:
+        """Get the date in a timezone at the context's snapshot of now."""
+        try:
+            return self._todays[timezone.name]
+        except KeyError:
+            today = self._todays[timezone.name] = self.now.in_timezone(timezone).date()
+            return today
+
+    def _day(self, timezone: Timezone, day: dt.date) -> tuple[float, float, bool]:
+        key = (timezone.name, day)
+        try:
+            return self._days[key]
+        except KeyError:
+            pass
+        midnight = pen.datetime(day.year, day.month, day.day, tz=timezone)
+        next_midnight = midnight.add(days=1)
+        info = self._days[key] = (
+            midnight.timestamp(),
+            next_midnight.timestamp(),
+            midnight.offset == next_midnight.offset,
+        )
+        return info
+
+    def day_bounds(self, timezone: Timezone, day: dt.date) -> tuple[float, float]:
+        """Get the Unix timestamps of a day's midnight and the next one."""
+        start, end, __ = self._day(timezone, day)
+        return start, end
+
+    def timestamp(self, timezone: Timezone, day: dt.date, time: dt.time) -> float:
+        """Get the Unix timestamp of a local time on a day in a timezone."""
+        midnight, __, fixed_offset = self._day(timezone, day)
+        if fixed_offset:
+            return midnight + _time_seconds(time)
+        # The offset changes during this day, let pendulum resolve the time
+        return pen.instance(dt.datetime.combine(day, time), tz=timezone).timestamp()
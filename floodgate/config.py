@@ -1,33 +1,85 @@
 from __future__ import annotations
 
+import datetime as dt
 from functools import cached_property
+import gc
+import hashlib
 import logging
-from logging.handlers import TimedRotatingFileHandler
+import os
 from pathlib import Path
+import pickle
+import sys
 from typing import Annotated, Literal, Optional
 
 import pendulum as pen
 from pendulum.tz.timezone import Timezone
-from pydantic import BaseModel, Field, SecretStr, conint
+from pydantic import (
+    BaseModel,
+    Field,
+    SecretStr,
+    confloat,
+    conint,
+    parse_obj_as,
+    validator,
+)
+import yaml
+
+try:
+    from yaml import CLoader as YamlLoader
+except ImportError:
+    # PyYAML was built without libyaml
+    from yaml import Loader as YamlLoader
 
 import floodgate
 from floodgate.common.pydantic_helpers import *
 from floodgate.common.time import *
+from floodgate.common.typing import ensure_list
+from floodgate.logs import BatchedTimedRotatingFileHandler, LogPipeline
+from floodgate.records import GateChannel, freeze_channels
+from floodgate.sharding import parse_shard_ids
 
-__all__ = ["Config"]
+__all__ = [
+    "Config",
+    "default_config_path",
+    "default_cache_dir",
+    "load_config",
+    "load_channel_file",
+]
+
+logger = logging.getLogger("floodgate.config")
 
 root_path = Path(floodgate.__path__[0])
+default_config_path = root_path / "config.yml"
+default_cache_dir = root_path / "data"
 logging_levels = Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+weekday_names = Literal["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
 
 
 class TimezoneField(Timezone, FieldConverter):
+    # Loading a timezone reads its tzdata file, so fields naming the same
+    # timezone share one instance
+    _interned: dict[str, TimezoneField] = {}
+
+    @classmethod
+    def _intern(cls, name: str) -> TimezoneField:
+        try:
+            return cls._interned[name]
+        except KeyError:
+            timezone = cls._interned[name] = cls(name)
+            return timezone
+
     @classmethod
     def _pyd_convert_str(cls, timezone_str: str):
-        return cls(timezone_str)
+        return cls._intern(timezone_str)
 
     @classmethod
     def _pyd_convert_timezone(cls, timezone: Timezone):
-        return cls(timezone.name)
+        return cls._intern(timezone.name)
+
+    def __reduce__(self):
+        # Pickled by name, so cached configs share the interned instances
+        # (and compare equal to freshly parsed ones)
+        return self._intern, (self.name,)
 
 
 class TimeField(pen.Time, FieldConverter):
@@ -43,7 +95,7 @@ class DurationField(pen.Duration, FieldConverter):
 
 
 class Config(BaseModel):
-    version: int = 120
+    version: int = 122
 
     bot_token: SecretStr
 
@@ -58,32 +110,131 @@ class Config(BaseModel):
                         timezone: TimezoneField
                         duration: DurationField
 
-                        time: Optional[TimeField] = None
+                        # One window per time
+                        time: Optional[list[TimeField]] = None
                         # OR
                         time_window_start: Optional[TimeField] = None
                         time_window_end: Optional[TimeField] = None
 
+                        weekdays: Optional[list[weekday_names]] = None
+                        skip_dates: list[dt.date] = Factory(list)
+
                         _check_one_of_times = only_one_of(
                             "time",
                             ["time_window_start", "time_window_end"],
                             need_all=[True, False],
                         )
 
+                        @validator("time", pre=True)
+                        def _ensure_time_list(cls, time):
+                            return None if time is None else ensure_list(time)
+
+                        @validator("time")
+                        def _check_time(cls, time: Optional[list[TimeField]]):
+                            if time is not None and not time:
+                                raise ValueError("At least one time is required")
+                            return time
+
+                        @validator("time_window_end")
+                        def _check_time_window(cls, end: Optional[TimeField], values):
+                            start = values.get("time_window_start")
+                            if end is not None and start is not None and end < start:
+                                raise ValueError("end must be a time after start")
+                            return end
+
                     class _Messages(BaseModel):
                         open: str
                         close: str
 
                     gate_open: _GateOpen = Factory(_GateOpen)
                     messages: _Messages = Factory(_Messages)
+                    mode: Literal["delete", "permissions"] = "delete"
+                    roles: list[int] = Factory(list)
 
+                # Frozen into GateChannel records once validated
                 channels: dict[int, _Channel] = Factory(dict)
+                channels_dir: Optional[Path] = None
+                announcement_concurrency: Annotated[int, conint(ge=1)] = 4
+                deletion_window: DurationField = Factory(
+                    lambda: DurationField(seconds=1)
+                )
+                raw_events: bool = False
+                random_salt: Optional[SecretStr] = None
+                sweep_concurrency: Annotated[int, conint(ge=1)] = 2
+                state_file: Optional[Path] = root_path / "data/floodgate.sqlite3"
+
+                _norm_paths = maybe_relative_path(
+                    ["state_file", "channels_dir"], root_path
+                )
+
+                @validator("channels")
+                def _freeze_channels(
+                    cls, channels: dict[int, _Channel]
+                ) -> dict[int, GateChannel]:
+                    return freeze_channels(channels)
 
             floodgate: _Floodgate = Factory(_Floodgate)
 
         modules: _Modules = Factory(_Modules)
 
+        class _Rest(BaseModel):
+            max_concurrency: Annotated[int, conint(ge=1)] = 8
+            global_rate: float = 50
+            bucket_rate: float = 1
+            bucket_capacity: float = 5
+            max_retries: Annotated[int, conint(ge=0)] = 3
+
+        rest: _Rest = Factory(_Rest)
+
+        class _Reload(BaseModel):
+            watch: bool = True
+            poll_interval: Annotated[float, confloat(gt=0)] = 5
+            debounce: Annotated[float, confloat(ge=0)] = 0.5
+
+        reload: _Reload = Factory(_Reload)
+
+        class _Metrics(BaseModel):
+            enabled: bool = False
+            host: str = "127.0.0.1"
+            port: Annotated[int, conint(ge=0, le=65535)] = 9464
+
+        metrics: _Metrics = Factory(_Metrics)
+
+        class _Sharding(BaseModel):
+            enabled: bool = False
+            shard_count: Optional[Annotated[int, conint(ge=1)]] = None
+            shard_ids: Optional[list[int]] = None
+            status_dir: Path = root_path / "data/status"
+
+            _norm_status_dir = maybe_relative_path("status_dir", root_path)
+
+            @validator("shard_ids", pre=True)
+            def _parse_shard_ids(cls, shard_ids):
+                return None if shard_ids is None else parse_shard_ids(shard_ids)
+
+            @validator("shard_ids")
+            def _check_shard_ids(cls, shard_ids: Optional[list[int]], values):
+                if shard_ids is None:
+                    return None
+                shard_count = values.get("shard_count")
+                if shard_count is None:
+                    raise ValueError("shard_count is required with shard_ids")
+                if shard_ids[-1] >= shard_count:
+                    raise ValueError(f"Shard IDs must be less than {shard_count}")
+                return shard_ids
+
+        sharding: _Sharding = Factory(_Sharding)
+
     bot: _Bot = Field(default_factory=_Bot)
 
+    class _Runtime(BaseModel):
+        profile: Literal["production", "debug"] = "production"
+        uvloop: bool = True
+        slow_callback_ms: Annotated[float, confloat(gt=0)] = 100
+        lag_sample_interval: Annotated[float, confloat(gt=0)] = 0.25
+
+    runtime: _Runtime = Field(default_factory=_Runtime)
+
     class _Logging(BaseModel):
         class Config:
             allow_mutation = False
@@ -97,6 +248,7 @@ class Config(BaseModel):
         interval: Annotated[int, conint(ge=1)] = 1
         backup_count: Annotated[int, conint(ge=0)] = 7
         format: str = "%(asctime)s %(levelname)s %(name)s | %(message)s"
+        queue_size: Annotated[int, conint(ge=1)] = 10_000
 
         _norm_output_file = maybe_relative_path("output_file", root_path)
 
@@ -107,7 +259,7 @@ class Config(BaseModel):
         @cached_property
         def handler(self):
             self.output_file.parent.mkdir(parents=True, exist_ok=True)
-            handler = TimedRotatingFileHandler(
+            handler = BatchedTimedRotatingFileHandler(
                 filename=self.output_file,
                 when=self.when,
                 interval=self.interval,
@@ -116,7 +268,120 @@ class Config(BaseModel):
             handler.setFormatter(self.formatter)
             return handler
 
+        @cached_property
+        def pipeline(self):
+            # The log file is opened by the pipeline's writer thread
+            return LogPipeline(lambda: [self.handler], self.queue_size)
+
     logging: _Logging = Field(default_factory=_Logging)
 
 
 update_forward_refs_recursive(Config)
+# noinspection PyProtectedMember
+_ChannelConfig = Config._Bot._Modules._Floodgate._Channel
+
+
+def _schema_fingerprint(model: type[BaseModel]) -> str:
+    """Describe a model's fields and their types, including nested models'."""
+    parts = []
+    for name, field in model.__fields__.items():
+        parts.append(f"{name}: {field.outer_type_!r}")
+        if isinstance(field.type_, type) and issubclass(field.type_, BaseModel):
+            parts.append(f"{name} ({_schema_fingerprint(field.type_)})")
+    return ", ".join(parts)
+
+
+def _cache_key(source: bytes) -> bytes:
+    # Configs cached with other fields are parsed again. Bump Config.version
+    # when validation changes, which the fields don't show.
+    key = hashlib.sha256(source)
+    key.update(
+        f"{Config.__fields__['version'].default} {floodgate.__version__} "
+        f"{sys.version_info[:2]} {_schema_fingerprint(Config)}".encode()
+    )
+    return key.hexdigest().encode()
+
+
+def _cache_file(cache_dir: Path, path: Path) -> Path:
+    # Named after the config's full path, so that configs with the same name
+    # in different directories don't replace each other's cache
+    path_hash = hashlib.sha1(str(path.resolve()).encode()).hexdigest()[:12]
+    return cache_dir / f"{path.name}.{path_hash}.cache"
+
+
+def _load_cached(cache_file: Path, key: bytes) -> Optional[Config]:
+    try:
+        with cache_file.open("rb") as f:
+            if f.readline().rstrip(b"\n") != key:
+                return None
+            # Unpickling makes no garbage, but the collector would keep
+            # scanning every object it makes
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                return pickle.load(f)
+            finally:
+                if gc_enabled:
+                    gc.enable()
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.warning(f"Ignoring unreadable config cache {cache_file}", exc_info=True)
+        return None
+
+
+def _save_cached(cache_file: Path, key: bytes, config: Config):
+    # Per process, since the processes running a bot's shards load it together
+    temp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # It holds the bot token, like the config file
+        fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, "wb") as f:
+            f.write(key + b"\n")
+            pickle.dump(config, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, cache_file)
+    except OSError:
+        logger.warning(f"Failed to write config cache {cache_file}", exc_info=True)
+
+
+def _parse_config(source: bytes) -> Config:
+    return Config.parse_obj(yaml.load(source, YamlLoader))
+
+
+def load_config(
+    path: Path = default_config_path, cache_dir: Optional[Path] = default_cache_dir
+) -> Config:
+    """
+    Load and validate a config file.
+
+    :param path: the YAML config file
+    :param cache_dir: where to keep the validated config, which is loaded
+        instead of parsing the file again until the file changes. None to
+        always parse it.
+    """
+    source = path.read_bytes()
+    if cache_dir is None:
+        return _parse_config(source)
+
+    cache_file = _cache_file(cache_dir, path)
+    key = _cache_key(source)
+    config = _load_cached(cache_file, key)
+    if config is None:
+        config = _parse_config(source)
+        _save_cached(cache_file, key, config)
+    return config
+
+
+def load_channel_file(path: Path) -> dict[int, GateChannel]:
+    """
+    Load and validate a file of floodgate channels, a mapping of channel IDs
+    to channel configs like the floodgate module's `channels`.
+
+    :raises yaml.YAMLError: if the file isn't valid YAML
+    :raises pydantic.ValidationError: if the channels aren't valid
+    """
+    with path.open("rb") as f:
+        channels = yaml.load(f, YamlLoader)
+    # An empty file has no channels
+    return freeze_channels(parse_obj_as(dict[int, _ChannelConfig], channels or {}))
@@ -0,0 +1,342 @@
+import asyncio
+from collections.abc import Awaitable, Hashable
+import enum
+import heapq
+import itertools
+import logging
+from typing import Any, Callable, Optional, TypeVar
+
+import discord
+
+__all__ = ["Priority", "TokenBucket", "RestDispatcher", "RateLimitLog"]
+
+logger = logging.getLogger("floodgate.dispatch")
+
+T = TypeVar("T")
+
+
+class Priority(enum.IntEnum):
+    """Request priorities, lower values are dispatched first."""
+
+    TRANSITION = 0
+    DELETION = 1
+    SWEEP = 2
+
+
+class TokenBucket:
+    """
+    A token bucket refilled at `rate` tokens per second up to `capacity`.
+    It can also be blocked until a given time, e.g. after a 429 response.
+    """
+
+    __slots__ = ("rate", "capacity", "_tokens", "_updated", "_blocked_until")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = now
+        self._blocked_until = now
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+
+    def delay(self, now: float) -> float:
+        """Get how long to wait until a token is available."""
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        self._refill(now)
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self._tokens -= 1
+
+    def block(self, until: float):
+        self._blocked_until = max(self._blocked_until, until)
+        self._tokens = 0
+
+
+class _Request:
+    __slots__ = ("priority", "seq", "bucket", "fn", "future", "retries")
+
+    def __init__(
+        self,
+        priority: Priority,
+        seq: int,
+        bucket: Hashable,
+        fn: Callable[[], Awaitable[Any]],
+        future: asyncio.Future,
+    ):
+        self.priority = priority
+        self.seq = seq
+        self.bucket = bucket
+        self.fn = fn
+        self.future = future
+        self.retries = 0
+
+    def __lt__(self, other: "_Request") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class RestDispatcher:
+    """
+    Sends REST requests in priority order while respecting rate limits.
+
+    Every request names a bucket (e.g. `("delete", channel_id)`). Requests
+    only go out when both their bucket and the global bucket have a token and
+    fewer than `max_concurrency` requests are in flight.
+
+    discord.py retries 429 responses by itself (see `RateLimitLog`), and only
+    raises them once it runs out of retries. Those requests are requeued
+    after the advertised retry delay. A 429 without a Via header didn't come
+    from Discord's API but from Cloudflare, which bans IPs that make too many
+    invalid requests. Retrying would only extend the ban, so the request
+    fails and every request is held back for `ban_backoff` seconds.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        max_concurrency: int = 8,
+        global_rate: float = 50,
+        bucket_rate: float = 1,
+        bucket_capacity: float = 5,
+        max_retries: int = 3,
+        ban_backoff: float = 60,
+    ):
+        self._loop = loop
+        self.max_concurrency = max_concurrency
+        self.bucket_rate = bucket_rate
+        self.bucket_capacity = bucket_capacity
+        self.max_retries = max_retries
+        self.ban_backoff = ban_backoff
+
+        self._global_bucket = TokenBucket(global_rate, global_rate, loop.time())
+        self._buckets: dict[Hashable, TokenBucket] = {}
+        self._queue: list[_Request] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self._in_flight: set[asyncio.Task] = set()
+        self.retried_429 = 0
+        self.banned = 0
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    async def request(
+        self,
+        priority: Priority,
+        bucket: Hashable,
+        fn: Callable[[], Awaitable[T]],
+    ) -> T:
+        """
+        Queue a request and wait for its result.
+
+        :param priority: the request's priority
+        :param bucket: the rate limit bucket the request belongs to
+        :param fn: a function that makes the request. It may be called more
+            than once if the request is rate limited.
+        """
+        future = self._loop.create_future()
+        self._push(_Request(priority, next(self._seq), bucket, fn, future))
+        return await future
+
+    def close(self):
+        for request in self._queue:
+            request.future.cancel()
+        self._queue.clear()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _push(self, request: _Request):
+        heapq.heappush(self._queue, request)
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = self._loop.create_task(self._run())
+        self._wakeup.set()
+
+    def _get_bucket(self, key: Hashable) -> TokenBucket:
+        try:
+            return self._buckets[key]
+        except KeyError:
+            bucket = self._buckets[key] = TokenBucket(
+                self.bucket_rate, self.bucket_capacity, self._loop.time()
+            )
+            return bucket
+
+    def _pop_ready(self) -> tuple[Optional[_Request], Optional[float]]:
+        """
+        Pop the highest priority request that can be sent now. If there is
+        none, return how long to wait before checking again.
+        """
+        now = self._loop.time()
+        global_delay = self._global_bucket.delay(now)
+        if global_delay > 0:
+            return None, global_delay
+
+        deferred = []
+        ready = None
+        min_delay = None
+        while self._queue:
+            request = heapq.heappop(self._queue)
+            if request.future.done():
+                # The caller stopped waiting for this request
+                continue
+            bucket = self._get_bucket(request.bucket)
+            delay = bucket.delay(now)
+            if delay > 0:
+                deferred.append(request)
+                min_delay = delay if min_delay is None else min(min_delay, delay)
+                continue
+            bucket.take(now)
+            self._global_bucket.take(now)
+            ready = request
+            break
+
+        for request in deferred:
+            heapq.heappush(self._queue, request)
+        return ready, min_delay
+
+    async def _run(self):
+        wakeup = self._wakeup
+        while True:
+            wakeup.clear()
+            delay = None
+            if self.in_flight < self.max_concurrency:
+                request, delay = self._pop_ready()
+                if request is not None:
+                    task = self._loop.create_task(self._send(request))
+                    self._in_flight.add(task)
+                    continue
+
+            if delay is None:
+                await wakeup.wait()
+                continue
+            timer = self._loop.call_later(delay, wakeup.set)
+            try:
+                await wakeup.wait()
+            finally:
+                timer.cancel()
+
+    async def _send(self, request: _Request):
+        try:
+            result = await request.fn()
+        except Exception as e:
+            if isinstance(e, discord.HTTPException) and e.status == 429:
+                if not _headers(e).get("Via"):
+                    self._on_banned(request, e)
+                elif request.retries < self.max_retries:
+                    self._on_rate_limited(request, e)
+                    return
+            self.failed += 1
+            if not request.future.done():
+                request.future.set_exception(e)
+        else:
+            self.completed += 1
+            if not request.future.done():
+                request.future.set_result(result)
+        finally:
+            self._in_flight.discard(asyncio.current_task())
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    def _on_rate_limited(self, request: _Request, exc: discord.HTTPException):
+        self.retried_429 += 1
+        request.retries += 1
+
+        headers = _headers(exc)
+        retry_after = _retry_after(headers, 1.0)
+        is_global = headers.get("X-RateLimit-Global") == "true"
+
+        until = self._loop.time() + retry_after
+        if is_global:
+            self._global_bucket.block(until)
+        else:
+            self._get_bucket(request.bucket).block(until)
+        logger.warning(
+            f"Rate limited, retrying in {retry_after:.2f}s "
+            f"(bucket={request.bucket}, global={is_global}, "
+            f"attempt={request.retries})"
+        )
+        heapq.heappush(self._queue, request)
+
+    def _on_banned(self, request: _Request, exc: discord.HTTPException):
+        self.banned += 1
+        backoff = max(self.ban_backoff, _retry_after(_headers(exc), 0.0))
+        self._global_bucket.block(self._loop.time() + backoff)
+        logger.error(
+            f"Got a 429 response without a Via header, so the bot's IP is "
+            f"probably banned by Cloudflare for making too many invalid "
+            f"requests. Holding back all requests for {backoff:.0f}s "
+            f"(bucket={request.bucket})"
+        )
+
+
+def _headers(exc: discord.HTTPException):
+    return getattr(exc.response, "headers", None) or {}
+
+
+def _retry_after(headers, default: float) -> float:
+    try:
+        return float(headers.get("Retry-After", default))
+    except ValueError:
+        return default
+
+
+class RateLimitLog(logging.Filter):
+    """
+    Counts the 429 responses that discord.py retries by itself, which never
+    reach the dispatcher, from the warnings discord.http logs for them.
+
+    The filter is added to the discord.http logger, which is set to let
+    warnings through even if discord.py's configured log level is higher.
+    Records below that level are counted and then dropped.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.level = logging.NOTSET
+        self.rate_limited = 0
+        self.global_rate_limited = 0
+
+    def attach(self, level: int):
+        """
+        Start counting, or update the configured level.
+
+        :param level: the level discord.py's records are logged at
+        """
+        self.level = level
+        http_logger = logging.getLogger("discord.http")
+        http_logger.setLevel(min(level, logging.WARNING))
+        if self not in http_logger.filters:
+            http_logger.addFilter(self)
+
+    def detach(self):
+        http_logger = logging.getLogger("discord.http")
+        http_logger.removeFilter(self)
+        http_logger.setLevel(logging.NOTSET)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno == logging.WARNING and isinstance(record.msg, str):
+            if record.msg.startswith("We are being rate limited"):
+                self.rate_limited += 1
+            elif record.msg.startswith("Global rate limit has been hit"):
+                self.global_rate_limited += 1
+        return record.levelno >= self.level
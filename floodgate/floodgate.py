@@ -1,23 +1,67 @@
+import asyncio
+import gc
+import importlib
 import logging
+import math
+import os
 from pathlib import Path
 import sys
+import time
+from typing import Optional
 
 import discord
 import discord.ext.commands as commands
-import yaml
-from yaml import Loader as YamlLoader
 
-from floodgate.config import Config
+from floodgate.config import Config, default_config_path, load_config
+from floodgate.dispatch import RateLimitLog, RestDispatcher
+from floodgate.logs import LogPipeline
+from floodgate.metrics import FloodgateMetrics, MetricsServer
+from floodgate.reload import ConfigWatcher
+from floodgate.runtime import (
+    LoopLagMonitor,
+    configure_loop,
+    install_event_loop_policy,
+)
+from floodgate.sharding import format_shard_ids
+from floodgate.status import StatusServer, query_status
 
-__all__ = ["Floodgate", "run_bot"]
+__all__ = [
+    "Floodgate",
+    "AutoShardedFloodgate",
+    "make_bot",
+    "configure_sharding",
+    "setup_logging",
+    "run_bot",
+]
 
 logger = logging.getLogger("floodgate")
 
+GATE_EXTENSION = "floodgate.gate"
+
+
+def _preload_extensions():
+    try:
+        importlib.import_module(GATE_EXTENSION)
+    except Exception:
+        # Raised again (and reported) when the extension is loaded
+        pass
+
 
 # noinspection PyMethodMayBeStatic
 class Floodgate(commands.Bot):
-    def __init__(self, config: Config._Bot):
-
+    def __init__(
+        self,
+        config: Config._Bot,
+        config_path: Optional[Path] = None,
+        runtime: Optional[Config._Runtime] = None,
+        **options,
+    ):
+        """
+        :param config: the bot's config
+        :param config_path: the config file, to reload the config from
+        :param runtime: how to run the event loop
+        :param options: passed on to discord.py's client
+        """
         intents = discord.Intents(guilds=True, messages=True)
         allowed_mentions = discord.AllowedMentions(users=True)
         activity = discord.Game(f"{config.command_prefix}help")
@@ -31,14 +75,231 @@ class Floodgate(commands.Bot):
             # Bot params
             command_prefix=config.command_prefix,
             description=config.description,
+            **options,
         )
+        self._started = time.monotonic()
+        # Whether other processes run some of the bot's shards
+        self.partial_shards = False
+
+        self.lag_monitor: Optional[LoopLagMonitor] = None
+        if runtime is not None:
+            self.lag_monitor = configure_loop(self.loop, runtime)
 
         self.modules_config = config.modules
+        self.dispatcher = RestDispatcher(self.loop, **config.rest.dict())
+        # Counts the 429s discord.py retries before the dispatcher sees them
+        self.rate_limit_log = RateLimitLog()
+        self.rate_limit_log.attach(logging.getLogger("discord").getEffectiveLevel())
+
+        # Recorded regardless of whether they're served
+        self.metrics = FloodgateMetrics()
+        self._collect_metrics()
+        self._metrics_server: Optional[MetricsServer] = None
+        if config.metrics.enabled:
+            self._metrics_server = MetricsServer(
+                self.metrics.registry, config.metrics.host, config.metrics.port
+            )
+
+        self._status_dir = config.sharding.status_dir
+        self._status_server: Optional[StatusServer] = None
+        if config.sharding.enabled:
+            shard_ids = config.sharding.shard_ids
+            name = "all" if shard_ids is None else format_shard_ids(shard_ids)
+            self._status_server = StatusServer(
+                self._status_dir / f"shards-{name}.sock", self.get_status
+            )
+
+        self._config_path = config_path
+        self._reload_lock = asyncio.Lock()
+        self._config_watcher: Optional[ConfigWatcher] = None
+        if config_path is not None and config.reload.watch:
+            self._config_watcher = ConfigWatcher(
+                self.loop,
+                config_path,
+                self._on_config_changed,
+                poll_interval=config.reload.poll_interval,
+                debounce=config.reload.debounce,
+            )
+
+    async def login(self, token: str, *, bot: bool = True):
+        # The gate extension isn't needed until the gateway connects, so it's
+        # imported by a worker thread while logging in waits on Discord
+        preload = self.loop.run_in_executor(None, _preload_extensions)
+        try:
+            await super().login(token, bot=bot)
+        finally:
+            await asyncio.wait([preload])
+        if GATE_EXTENSION not in self.extensions:
+            self.load_extension(GATE_EXTENSION)
+
+    def _collect_metrics(self):
+        metrics = self.metrics
+        dispatcher = self.dispatcher
+        metrics.collect(
+            "floodgate_rest_retried_429_total",
+            "REST requests retried after discord.py gave up on a 429 response",
+            lambda: dispatcher.retried_429,
+            kind="counter",
+        )
+        rate_limit_log = self.rate_limit_log
+        metrics.collect(
+            "floodgate_rest_rate_limited_total",
+            "429 responses from Discord, which discord.py retries by itself",
+            lambda: rate_limit_log.rate_limited,
+            kind="counter",
+        )
+        metrics.collect(
+            "floodgate_rest_banned_total",
+            "429 responses from Cloudflare, which mean the bot's IP is banned",
+            lambda: dispatcher.banned,
+            kind="counter",
+        )
+        metrics.collect(
+            "floodgate_rest_completed_total",
+            "REST requests completed",
+            lambda: dispatcher.completed,
+            kind="counter",
+        )
+        metrics.collect(
+            "floodgate_rest_failed_total",
+            "REST requests that failed",
+            lambda: dispatcher.failed,
+            kind="counter",
+        )
+        metrics.collect(
+            "floodgate_rest_queued", "REST requests waiting", lambda: dispatcher.queued
+        )
+        metrics.collect(
+            "floodgate_rest_in_flight",
+            "REST requests in flight",
+            lambda: dispatcher.in_flight,
+        )
+        metrics.collect(
+            "floodgate_event_loop_lag_seconds",
+            "How late the last event loop lag sample ran",
+            lambda: None if self.lag_monitor is None else self.lag_monitor.last_lag,
+        )
+        metrics.collect(
+            "floodgate_event_loop_lag_max_seconds",
+            "The most an event loop lag sample has run late",
+            lambda: None if self.lag_monitor is None else self.lag_monitor.max_lag,
+        )
+
+    @property
+    def running_shard_ids(self) -> Optional[list[int]]:
+        """The shards this process runs, or None if the bot isn't sharded."""
+        return None
+
+    def get_status(self) -> dict:
+        """Get this process's status, as served to the bot's other processes."""
+        gate = self.get_cog("Gate")
+        latencies = {
+            str(shard_id): latency if math.isfinite(latency) else None
+            for shard_id, latency in self._latencies()
+        }
+        return {
+            "pid": os.getpid(),
+            "shard_ids": self.running_shard_ids,
+            "shard_count": self.shard_count,
+            "uptime": time.monotonic() - self._started,
+            "guilds": len(self.guilds),
+            "latencies": latencies,
+            "gates": None if gate is None else gate.get_status(),
+        }
+
+    def _latencies(self) -> list[tuple[int, float]]:
+        return [(0, self.latency)]
+
+    async def query_status(self) -> list[dict]:
+        """
+        Get the status of every process running the bot (just this one,
+        unless it's sharded).
+        """
+        if self._status_server is None:
+            return [self.get_status()]
+        return await query_status(self._status_dir)
+
+    async def reload_config(self) -> tuple[str, float]:
+        """
+        Reload the config file and apply the changes without reconnecting.
+        Only gates whose channels were added, removed or changed are touched.
+
+        :return: a summary of the gate changes and how long the reload took
+            in seconds
+        """
+        if self._config_path is None:
+            raise RuntimeError("The bot wasn't started from a config file")
+
+        async with self._reload_lock:
+            start = time.perf_counter()
+            config = await self.loop.run_in_executor(
+                None, load_config, self._config_path
+            )
 
-        self.load_extension("floodgate.gate")
+            self.command_prefix = config.bot.command_prefix
+            logging.getLogger("floodgate").setLevel(
+                config.logging.floodgate_logging_level
+            )
+            logging.getLogger("discord").setLevel(config.logging.discord_logging_level)
+            self.rate_limit_log.attach(logging.getLogger("discord").getEffectiveLevel())
+
+            self.modules_config = config.bot.modules
+            gate = self.get_cog("Gate")
+            summary = "gates not scheduled yet"
+            if gate is not None:
+                counts = await gate.apply_config(config.bot.modules.floodgate)
+                if counts is not None:
+                    summary = str(counts)
+            elapsed = time.perf_counter() - start
+
+        logger.info(f"Reloaded config in {elapsed * 1000:.0f} ms ({summary})")
+        return summary, elapsed
+
+    def _on_config_changed(self):
+        logger.info("Config file changed, reloading")
+        task = self.loop.create_task(self.reload_config())
+        task.add_done_callback(self._on_reload_done)
+
+    def _on_reload_done(self, task: asyncio.Task):
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            logger.error("Failed to reload config, keeping the old one", exc_info=exc)
 
     async def on_connect(self):
         logger.info("Client connected")
+        if self._config_watcher is not None:
+            self._config_watcher.start()
+        if self._metrics_server is not None:
+            try:
+                await self._metrics_server.start()
+            except OSError:
+                logger.error("Failed to start the metrics server", exc_info=True)
+                self._metrics_server = None
+        if self._status_server is not None:
+            try:
+                await self._status_server.start()
+            except OSError:
+                logger.error("Failed to start the status server", exc_info=True)
+                self._status_server = None
+
+    async def close(self):
+        if GATE_EXTENSION in self.extensions:
+            # Save the gates' state first, so it's written even if a later
+            # step fails or the close is cancelled (BotBase.close only
+            # unloads extensions at the end)
+            self.unload_extension(GATE_EXTENSION)
+        if self._config_watcher is not None:
+            self._config_watcher.stop()
+        if self.lag_monitor is not None:
+            self.lag_monitor.stop()
+        if self._metrics_server is not None:
+            await self._metrics_server.stop()
+        if self._status_server is not None:
+            await self._status_server.stop()
+        self.rate_limit_log.detach()
+        await super().close()
 
     async def on_disconnect(self):
         logger.info("Client disconnected")
@@ -71,23 +332,145 @@ class Floodgate(commands.Bot):
             )
 
 
-def run_bot():
-    # Load config
-    config_path = Path(__file__).parent / "config.yml"
-    with config_path.open() as f:
-        config = Config.parse_obj(yaml.load(f, YamlLoader))
+class AutoShardedFloodgate(Floodgate, commands.AutoShardedBot):
+    """
+    Floodgate connected with several gateway shards: all of the bot's
+    shards, or the `shard_ids` in its sharding config. Gates are only
+    scheduled for channels in the guilds of the shards it runs.
+    """
+
+    def __init__(
+        self,
+        config: Config._Bot,
+        config_path: Optional[Path] = None,
+        runtime: Optional[Config._Runtime] = None,
+    ):
+        shard_ids = config.sharding.shard_ids
+        shard_count = config.sharding.shard_count
+        super().__init__(
+            config,
+            config_path,
+            runtime,
+            shard_ids=shard_ids,
+            shard_count=shard_count,
+        )
+        # Shard IDs are distinct and less than the shard count
+        self.partial_shards = shard_ids is not None and len(shard_ids) < shard_count
+
+    @property
+    def running_shard_ids(self) -> Optional[list[int]]:
+        if self.shard_ids is not None:
+            return list(self.shard_ids)
+        # Every shard, once Discord has told us how many to run
+        return list(range(self.shard_count or 0))
+
+    def _latencies(self) -> list[tuple[int, float]]:
+        return self.latencies
+
+
+def make_bot(
+    config: Config._Bot,
+    config_path: Optional[Path] = None,
+    runtime: Optional[Config._Runtime] = None,
+) -> Floodgate:
+    """Create the bot, sharded if its config says to."""
+    bot_class = AutoShardedFloodgate if config.sharding.enabled else Floodgate
+    return bot_class(config, config_path, runtime)
+
+
+def configure_sharding(
+    config: Config,
+    shard_ids: Optional[list[int]] = None,
+    shard_count: Optional[int] = None,
+):
+    """
+    Apply shard options given on the command line, which turn sharding on.
+    A process running only some of the shards gets its own log file and
+    metrics port, so that the processes for the other shards can run
+    alongside it from the same config.
+
+    :raises pydantic.ValidationError: if the shard options aren't valid
+    """
+    sharding = config.bot.sharding
+    if shard_ids is not None or shard_count is not None:
+        overrides = {"enabled": True}
+        if shard_ids is not None:
+            overrides["shard_ids"] = shard_ids
+        if shard_count is not None:
+            overrides["shard_count"] = shard_count
+        sharding = config.bot.sharding = type(sharding).parse_obj(
+            {**sharding.dict(), **overrides}
+        )
+    if not sharding.enabled or sharding.shard_ids is None:
+        return
+
+    suffix = f".shards-{format_shard_ids(sharding.shard_ids)}"
+    output_file = config.logging.output_file
+    config.logging = config.logging.copy(
+        update={
+            "output_file": output_file.with_name(
+                output_file.stem + suffix + output_file.suffix
+            )
+        }
+    )
+    if config.bot.metrics.port != 0:
+        config.bot.metrics.port += sharding.shard_ids[0]
+
+
+def setup_logging(config: Config) -> LogPipeline:
+    """
+    Send floodgate's and discord.py's log records to the log file.
+
+    :return: the started pipeline writing them, to stop on exit
+    """
+    # Log records are written to disk by a background thread
+    log_pipeline = config.logging.pipeline
+    log_pipeline.start()
 
     # Floodgate logging
     logger = logging.getLogger("floodgate")
     logger.setLevel(config.logging.floodgate_logging_level)
-    logger.addHandler(config.logging.handler)
+    logger.addHandler(log_pipeline.handler)
 
     # Discord logging
     logger = logging.getLogger("discord")
     logger.setLevel(config.logging.discord_logging_level)
-    logger.addHandler(config.logging.handler)
+    logger.addHandler(log_pipeline.handler)
+
+    # asyncio reports slow callbacks in the debug profile
+    if config.runtime.profile == "debug":
+        logging.getLogger("asyncio").addHandler(log_pipeline.handler)
+
+    return log_pipeline
+
+
+def run_bot(shard_ids: Optional[list[int]] = None, shard_count: Optional[int] = None):
+    """
+    Run the bot with the default config file until it's stopped.
+
+    :param shard_ids: the shards for this process to run, overriding the
+        config's
+    :param shard_count: the bot's total number of shards, overriding the
+        config's
+    """
+    # Load config
+    config_path = default_config_path
+    config = load_config(config_path)
+    configure_sharding(config, shard_ids, shard_count)
+    log_pipeline = setup_logging(config)
+
+    # Everything imported and loaded so far lives as long as the bot, so
+    # don't make the garbage collector keep scanning it (discord.py runs a
+    # full collection when the client is created and on every READY)
+    gc.freeze()
 
     # Run bot
-    floodgate = Floodgate(config.bot)
-    floodgate.loop.set_debug(True)
-    floodgate.run(config.bot_token.get_secret_value())
+    loop_name = install_event_loop_policy(config.runtime)
+    logging.getLogger("floodgate").info(
+        f"Starting with the {config.runtime.profile} profile ({loop_name})"
+    )
+    floodgate = make_bot(config.bot, config_path, config.runtime)
+    try:
+        floodgate.run(config.bot_token.get_secret_value())
+    finally:
+        log_pipeline.stop()
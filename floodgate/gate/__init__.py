@@ -3,4 +3,10 @@ from .cog import Gate
 
 
 def setup(bot: Floodgate):
-    bot.add_cog(Gate(bot, config=bot.modules_config.floodgate))
+    bot.add_cog(
+        Gate(
+            bot,
+            config=bot.modules_config.floodgate,
+            partial_shards=bot.partial_shards,
+        )
+    )
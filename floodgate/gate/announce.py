@@ -0,0 +1,125 @@
+import asyncio
+from collections import deque
+from collections.abc import Awaitable
+import logging
+import time
+from typing import Callable, Optional
+
+from floodgate.common.stats import LatencyStats
+from floodgate.metrics import Histogram
+
+__all__ = ["AnnouncementDispatcher"]
+
+logger = logging.getLogger("floodgate.gate.announce")
+
+T_Transition = Callable[[], Awaitable[None]]
+
+
+class AnnouncementDispatcher:
+    """
+    Paces the REST side of gate transitions (announcements and permission
+    changes).
+
+    Gates flip their open/closed state as soon as their transition is due and
+    hand the rest to `announce`. Transitions queued in the same event loop
+    iteration, e.g. every gate the scheduler found due at one instant, are
+    started together as one batch. At most `concurrency` run at once, and the
+    next one to start is taken from each guild in turn, so a guild with many
+    gates at the same time doesn't hold up the others. Each transition's
+    delivery lag (from being queued until it's done) is kept in `lag`.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        concurrency: int,
+        lag_histogram: Optional[Histogram] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self._loop = loop
+        self._clock = clock
+        self.concurrency = concurrency
+
+        # Guild ID -> (transition, time queued), in round robin order
+        self._queues: dict[int, deque[tuple[T_Transition, float]]] = {}
+        self._queued = 0
+        self._pump_handle: Optional[asyncio.Handle] = None
+        self._in_flight: set[asyncio.Task] = set()
+
+        self.completed = 0
+        self.failed = 0
+        self.lag = LatencyStats()
+        self._lag_histogram = lag_histogram
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def announce(self, guild_id: int, transition: T_Transition):
+        """
+        Queue a gate transition's REST requests.
+
+        :param guild_id: the ID of the gate channel's guild
+        :param transition: makes the transition's requests when called
+        """
+        item = (transition, self._clock())
+        try:
+            self._queues[guild_id].append(item)
+        except KeyError:
+            self._queues[guild_id] = deque((item,))
+        self._queued += 1
+        if self._pump_handle is None:
+            # Wait for the rest of this loop iteration's transitions
+            self._pump_handle = self._loop.call_soon(self._pump)
+
+    def cancel(self):
+        if self._pump_handle is not None:
+            self._pump_handle.cancel()
+            self._pump_handle = None
+        for task in self._in_flight:
+            task.cancel()
+        self._in_flight.clear()
+        self._queues.clear()
+        self._queued = 0
+
+    def _pump(self):
+        self._pump_handle = None
+        if self._queued > 1 and not self._in_flight:
+            logger.debug(
+                f"Announcing {self._queued} gate transitions across "
+                f"{len(self._queues)} guild(s)"
+            )
+        queues = self._queues
+        while queues and len(self._in_flight) < self.concurrency:
+            # Take one from the first guild and move it to the back
+            guild_id = next(iter(queues))
+            queue = queues.pop(guild_id)
+            transition, queued_at = queue.popleft()
+            if queue:
+                queues[guild_id] = queue
+            self._queued -= 1
+            task = self._loop.create_task(self._run(transition, queued_at))
+            self._in_flight.add(task)
+
+    async def _run(self, transition: T_Transition, queued_at: float):
+        try:
+            await transition()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.error("Exception raised by gate transition", exc_info=e)
+        else:
+            self.completed += 1
+            lag = self._clock() - queued_at
+            self.lag.record(lag)
+            if self._lag_histogram is not None:
+                self._lag_histogram.observe(lag)
+        finally:
+            self._in_flight.discard(asyncio.current_task())
+            if self._queues and self._pump_handle is None:
+                self._pump_handle = self._loop.call_soon(self._pump)
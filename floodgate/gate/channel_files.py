@@ -0,0 +1,72 @@
+import asyncio
+from collections.abc import AsyncIterator
+import logging
+from pathlib import Path
+
+from floodgate.config import load_channel_file
+from floodgate.records import GateChannel
+
+__all__ = ["ChannelFiles"]
+
+logger = logging.getLogger("floodgate.gate.channel_files")
+
+SUFFIXES = (".yml", ".yaml")
+
+
+class ChannelFiles:
+    """
+    Floodgate channels kept in a directory of YAML files (e.g. one per
+    guild), each mapping channel IDs to channel configs like the floodgate
+    module's `channels`.
+
+    Files are read and validated one at a time in a worker thread, so only
+    one file's YAML is in memory at once and each file's channels can be
+    used as soon as it's loaded. A file that fails to load is reported and
+    skipped without affecting the others. If it loaded before, its previous
+    channels are kept.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        # Path -> that file's channels, as of its last successful load
+        self.files: dict[Path, dict[int, GateChannel]] = {}
+        # Path -> why that file failed to load last time
+        self.errors: dict[Path, str] = {}
+
+    def paths(self) -> list[Path]:
+        """The channel files in the directory, in the order they're loaded."""
+        try:
+            return sorted(
+                path
+                for path in self.directory.iterdir()
+                if path.suffix in SUFFIXES and path.is_file()
+            )
+        except OSError as e:
+            logger.error(f"Failed to list channel files in {self.directory}: {e}")
+            return []
+
+    async def load(
+        self, loop: asyncio.AbstractEventLoop
+    ) -> AsyncIterator[tuple[Path, dict[int, GateChannel]]]:
+        """
+        Load every file in the directory, yielding each one's channels as
+        soon as it's loaded. Files that fail to load aren't yielded, and
+        files that were removed are forgotten once all are loaded.
+        """
+        paths = self.paths()
+        for path in paths:
+            try:
+                channels = await loop.run_in_executor(None, load_channel_file, path)
+            except Exception as e:
+                self.errors[path] = str(e)
+                kept = " (keeping its previous channels)" if path in self.files else ""
+                logger.error(f"Failed to load channel file {path}{kept}:\n{e}")
+                continue
+            self.errors.pop(path, None)
+            self.files[path] = channels
+            yield path, channels
+
+        for path in self.files.keys() - set(paths):
+            del self.files[path]
+        for path in self.errors.keys() - set(paths):
+            del self.errors[path]
@@ -2,22 +2,51 @@ import asyncio
 from collections.abc import Coroutine
 import datetime as dt
 import logging
-from typing import Optional
+from pathlib import Path
+import time
+from typing import Callable, NamedTuple, Optional
 
 import discord
 from discord.ext import commands, tasks
 import pendulum as pen
 
-from floodgate.common.time import random_time
+from floodgate.common.snowflake import snowflake_timestamp, timestamp_snowflake
+from floodgate.common.time import TimeContext
 from floodgate.config import Config
+from floodgate.dispatch import Priority, RestDispatcher
+from floodgate.metrics import FloodgateMetrics, Histogram
+from floodgate.records import GateChannel
+from floodgate.status import format_status
+from .announce import AnnouncementDispatcher
+from .channel_files import ChannelFiles
+from .deletion import DeletionQueue
+from .scheduler import GateScheduler, ScheduledCall
+from .store import GateRecord, GateStore
+from .timetable import compile_timetable
 
 __all__ = ["Gate"]
 
 logger = logging.getLogger("floodgate.gate")
 # noinspection PyProtectedMember
 FloodgateConfig = Config._Bot._Modules._Floodgate
-# noinspection PyProtectedMember
-ChannelConfig = FloodgateConfig._Channel
+
+
+def _without_duplicates(
+    channels: dict[int, GateChannel], new: dict[int, GateChannel], source: Path
+) -> dict[int, GateChannel]:
+    """Get the channels in `new` that aren't in `channels` yet."""
+    duplicates = new.keys() & channels.keys()
+    if not duplicates:
+        return new
+    logger.warning(
+        f"Ignoring {len(duplicates)} channel(s) in {source} that are already "
+        f"configured: {', '.join(map(str, sorted(duplicates)))}"
+    )
+    return {
+        channel_id: channel_config
+        for channel_id, channel_config in new.items()
+        if channel_id not in duplicates
+    }
 
 
 def _handle_task_exception(task: asyncio.Task) -> None:
@@ -29,176 +58,1304 @@ def _handle_task_exception(task: asyncio.Task) -> None:
         logger.error(f"Exception raised by task {task}", exc_info=e)
 
 
+class ClosedChannels:
+    """
+    IDs of the channels whose gates are currently closed. The IDs are also
+    kept as strings so raw gateway payloads can be checked without
+    converting them.
+    """
+
+    __slots__ = ("ids", "keys")
+
+    def __init__(self):
+        self.ids: set[int] = set()
+        self.keys: set[str] = set()
+
+    def __contains__(self, channel_id: int) -> bool:
+        return channel_id in self.ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, channel_id: int):
+        self.ids.add(channel_id)
+        self.keys.add(str(channel_id))
+
+    def discard(self, channel_id: int):
+        self.ids.discard(channel_id)
+        self.keys.discard(str(channel_id))
+
+
+class ReconcileCounts(NamedTuple):
+    reused: int
+    updated: int
+    created: int
+    dropped: int
+
+    def __str__(self) -> str:
+        return (
+            f"{self.reused} reused, {self.updated} updated, "
+            f"{self.created} created, {self.dropped} dropped"
+        )
+
+
+def _time_context(scheduler: GateScheduler) -> TimeContext:
+    return TimeContext(pen.from_timestamp(scheduler.time()))
+
+
+def _in_windows(timestamp: float, windows: list[tuple[float, float]]) -> bool:
+    return any(open_at <= timestamp < close_at for open_at, close_at in windows)
+
+
 class GateController:
-    _open_gate_task: Optional[asyncio.Task] = None
-    _close_gate_task: Optional[asyncio.Task] = None
+    # Every gated channel has a controller for as long as the bot runs
+    __slots__ = (
+        "_scheduler",
+        "_dispatcher",
+        "_closed_channels",
+        "_store",
+        "_loop",
+        "_channel",
+        "_config",
+        "salt",
+        "_lateness",
+        "_announcer",
+        "windows",
+        "_window_index",
+        "open_at",
+        "close_at",
+        "_day_start",
+        "_past_windows",
+        "_open_gate_call",
+        "_close_gate_call",
+        "_catch_up_call",
+        "_previous_close_call",
+    )
 
     def __init__(
         self,
-        loop: asyncio.AbstractEventLoop,
+        scheduler: GateScheduler,
+        dispatcher: RestDispatcher,
+        closed_channels: ClosedChannels,
+        store: Optional[GateStore],
         channel: discord.TextChannel,
-        config: ChannelConfig,
+        config: GateChannel,
+        saved: Optional[GateRecord] = None,
+        context: Optional[TimeContext] = None,
+        salt: Optional[bytes] = None,
+        windows: Optional[list[tuple[float, float]]] = None,
+        lateness: Optional[Histogram] = None,
+        announcer: Optional[AnnouncementDispatcher] = None,
+        replaces_closed: Optional[bool] = None,
     ):
-        self._loop = loop
+        self._scheduler = scheduler
+        self._dispatcher = dispatcher
+        self._closed_channels = closed_channels
+        self._store = store
+        self._loop = scheduler.loop
         self._channel = channel
         self._config = config
+        # Random times are derived from this if given, see seeded_random
+        self.salt = salt
+        # Seconds between each planned transition and when it ran
+        self._lateness = lateness
+        # Paces transition requests, otherwise they're made right away
+        self._announcer = announcer
+
+        # Today's (open, close) windows as Unix timestamps, and the current
+        # or next one
+        self.windows: list[tuple[float, float]] = []
+        self._window_index = 0
+        self.open_at: Optional[float] = None
+        self.close_at: Optional[float] = None
+        self._day_start: Optional[float] = None
+        # Windows of earlier days, compiled as the sweep needs them
+        self._past_windows: Optional[dict[dt.date, list[tuple[float, float]]]] = None
+
+        self._open_gate_call: Optional[ScheduledCall] = None
+        self._close_gate_call: Optional[ScheduledCall] = None
+        self._catch_up_call: Optional[ScheduledCall] = None
+        # The close of a window planned on a previous day that runs past midnight
+        self._previous_close_call: Optional[ScheduledCall] = None
 
-        self._closed = True
+        closed_channels.add(channel.id)
+        self._schedule_transitions(
+            saved, context=context, windows=windows, replaces_closed=replaces_closed
+        )
+
+        if config.mode == "permissions" and self._catch_up_call is None:
+            # Make sure the overwrites match the state we start in
+            self._create_task(
+                self._try_set_send_messages(None if not self.closed else False)
+            )
 
-        self._schedule_tasks()
+    @property
+    def channel(self) -> discord.TextChannel:
+        return self._channel
 
     @property
     def closed(self) -> bool:
-        return self._closed
+        return self._channel.id in self._closed_channels
 
     @property
     def scheduled(self):
-        return self._open_gate_task is not None
+        return any(
+            call is not None and call.pending
+            for call in (
+                self._open_gate_call,
+                self._close_gate_call,
+                self._catch_up_call,
+            )
+        )
+
+    @property
+    def config(self) -> GateChannel:
+        return self._config
+
+    def update_config(self, config: GateChannel):
+        """Swap in a config whose gate_open section is unchanged."""
+        if config.gate_open != self._config.gate_open:
+            raise ValueError("gate_open config differs, create a new controller")
+        old_config = self._config
+        self._config = config
+
+        if config.mode == old_config.mode and config.roles == old_config.roles:
+            return
+        self._create_task(self._replace_overwrites(old_config))
+
+    def reschedule(
+        self,
+        today: Optional[pen.Date] = None,
+        context: Optional[TimeContext] = None,
+        windows: Optional[list[tuple[float, float]]] = None,
+    ):
+        """
+        Plan a new day's transitions for a controller that is being reused,
+        unless its current plan's opening is still pending.
 
-    def _schedule_tasks(self):
-        open_delay, close_delay = self._get_delay_times()
-        if open_delay < 0:
+        :param today: the new day in the gate's timezone, if it's already
+            been worked out for other gates in the timezone
+        :param context: the scheduling pass's shared calendar lookups
+        :param windows: the day's windows, if they've been compiled already
+        """
+        if self._open_gate_call is not None and self._open_gate_call.pending:
             return
-        self._open_gate_task = self._create_task(self._on_open(open_delay))
-        self._close_gate_task = self._create_task(self._on_close(close_delay))
+        if self._close_gate_call is not None and self._close_gate_call.pending:
+            # The current window runs past midnight, let it finish without
+            # moving on to the new day's windows
+            self._close_gate_call.cancel()
+            self._previous_close_call = self._scheduler.call_at_time(
+                self._close_gate_call.timestamp, self._on_close
+            )
+        self._open_gate_call = None
+        self._close_gate_call = None
+        self._catch_up_call = None
+        self._schedule_transitions(None, today, context, windows)
+
+    def _schedule_transitions(
+        self,
+        saved: Optional[GateRecord],
+        today: Optional[pen.Date] = None,
+        context: Optional[TimeContext] = None,
+        windows: Optional[list[tuple[float, float]]] = None,
+        replaces_closed: Optional[bool] = None,
+    ):
+        """
+        Plan today's transitions, reusing the saved plan if it's for today and
+        the gate's config hasn't changed. Transitions the saved state shows
+        were missed while the bot was down are scheduled to run immediately,
+        so the scheduler handles all of them in one batch.
+
+        :param replaces_closed: whether the gate this controller replaces
+            after a config change was closed. The gate keeps that state unless
+            the new plan says otherwise.
+        """
+        if context is None:
+            context = _time_context(self._scheduler)
+        gate_open = self._config.gate_open
+        timezone = gate_open.timezone
+        rolled_over = today is not None
+        if today is None:
+            today = context.today(timezone)
+        if windows is None:
+            windows = self._compile(today, context)
+        now = self._scheduler.time()
+        day_start, day_end = context.day_bounds(timezone, today)
+        self._day_start = day_start
+        self._past_windows = None
 
-    def _get_delay_times(self) -> tuple[float, float]:
-        config = self._config.gate_open
-        now = pen.now()
-        today = pen.today(config.timezone)
+        resumed = saved is not None and saved.config_hash == gate_open.hash
+        reused_plan = resumed and day_start <= saved.open_at < day_end
+        if reused_plan and gate_open.time is None:
+            # Keep the random time drawn before the restart
+            windows = [(saved.open_at, saved.close_at)]
+        elif not reused_plan and windows and self._store is not None:
+            self._store.save_plan(
+                self._channel.id, windows[0][0], windows[0][1], gate_open.hash
+            )
 
-        if config.time is not None:
-            # Scheduled time
-            time = config.time
+        # Start from the first window that hasn't ended yet
+        index = 0
+        while index < len(windows) - 1 and windows[index][1] <= now:
+            index += 1
+        self.windows = windows
+        self._window_index = index
+        if windows:
+            self.open_at, self.close_at = windows[index]
         else:
-            # Random time
-            time = random_time(config.time_window_start, config.time_window_end)
+            self.open_at = self.close_at = None
 
-        start_dt = pen.instance(dt.datetime.combine(today, time), tz=config.timezone)
-        start_delay = (start_dt - now).total_seconds()
-        end_delay = start_delay + config.duration.total_seconds()
-        return start_delay, end_delay
+        if resumed and not saved.closed:
+            # The gate was open when the bot went down
+            self._closed_channels.discard(self._channel.id)
+            if not reused_plan:
+                # ...during a previous day's window
+                if now < saved.close_at:
+                    self._previous_close_call = self._scheduler.call_at_time(
+                        saved.close_at, self._on_close
+                    )
+                else:
+                    self._catch_up("close")
+            elif self.open_at is None or now < self.open_at:
+                self._catch_up("close")
+        elif replaces_closed is False:
+            self._closed_channels.discard(self._channel.id)
+            if self.open_at is None or not self.open_at <= now < self.close_at:
+                self._catch_up("close", "after a config change")
+
+        if self.open_at is None:
+            # No windows today
+            return
+        if now < self.open_at:
+            self._schedule_open(self.open_at)
+            self._schedule_close(self.close_at)
+        elif now < self.close_at:
+            if self.closed:
+                if rolled_over:
+                    # The gate opens right at midnight
+                    self._schedule_open(self.open_at)
+                elif reused_plan:
+                    self._catch_up("open")
+                elif replaces_closed is not None:
+                    self._catch_up("open", "after a config change")
+                # Otherwise don't open late on a freshly drawn plan, but move
+                # on to the next window when this one ends
+            self._schedule_close(self.close_at)
+        elif reused_plan and not self.closed:
+            self._catch_up("close")
+
+    def was_closed_at(self, timestamp: float) -> bool:
+        """
+        Guess whether the gate was closed at a Unix timestamp using its
+        current plan. Times before today are checked against that day's
+        windows, which are known for gates that open at fixed times or at a
+        seeded random time. For other random gates the day's draw is unknown,
+        so the gate is assumed to have been open.
+        """
+        if _in_windows(timestamp, self.windows):
+            return False
+        today = timestamp >= self._day_start
+        previous_close = self._previous_close_call
+        if (
+            today
+            and previous_close is not None
+            and timestamp < previous_close.timestamp
+        ):
+            # Yesterday's window was left to finish after midnight
+            return False
+        gate_open = self._config.gate_open
+        if gate_open.time is None and self.salt is None:
+            return today
+
+        date = pen.from_timestamp(timestamp, tz=gate_open.timezone).date()
+        if self._past_windows is None:
+            self._past_windows = {}
+        # The window may have started the day before and run past midnight.
+        # Today's windows were checked already.
+        days = (date.subtract(days=1),) if today else (date, date.subtract(days=1))
+        for day in days:
+            try:
+                windows = self._past_windows[day]
+            except KeyError:
+                windows = self._past_windows[day] = self._compile(day)
+            if _in_windows(timestamp, windows):
+                return False
+        return True
+
+    def _compile(
+        self, day: dt.date, context: Optional[TimeContext] = None
+    ) -> list[tuple[float, float]]:
+        """Compile this gate's windows on a day."""
+        timetable = compile_timetable(
+            {self._channel.id: self._config},
+            start=day,
+            context=context,
+            salt=self.salt,
+        )
+        return timetable.by_channel().get(self._channel.id, [])
+
+    def _schedule_open(self, timestamp: float):
+        self._open_gate_call = self._scheduler.call_at_time(
+            timestamp, self._on_scheduled_open
+        )
+
+    def _schedule_close(self, timestamp: float):
+        self._close_gate_call = self._scheduler.call_at_time(
+            timestamp, self._on_window_close
+        )
+
+    def _catch_up(self, transition: str, reason: str = "missed while offline"):
+        logger.info(
+            f"Catching up on gate {transition} {reason} "
+            f"(channel_id={self._channel.id})"
+        )
+        callback = self._on_open if transition == "open" else self._on_close
+        self._catch_up_call = self._scheduler.call_later(0, callback)
 
     def _create_task(self, coro: Coroutine[None]) -> Optional[asyncio.Task]:
         task = self._loop.create_task(coro)
         task.add_done_callback(_handle_task_exception)
         return task
 
-    async def _on_open(self, sleep_time: float):
-        await asyncio.sleep(sleep_time)
-        self._closed = False
-        await self._try_send_message(self._config.messages.open)
+    def _announce(self, transition: Callable[[], Coroutine[None]]):
+        if self._announcer is None:
+            self._create_task(transition())
+        else:
+            self._announcer.announce(self._channel.guild.id, transition)
+
+    def _on_open(self):
+        self._closed_channels.discard(self._channel.id)
+        if self._store is not None:
+            self._store.save_state(self._channel.id, False)
+        self._announce(self._open)
+
+    def _on_close(self):
+        self._closed_channels.add(self._channel.id)
+        if self._store is not None:
+            self._store.save_state(self._channel.id, True)
+        self._announce(self._close)
+
+    def _on_scheduled_open(self):
+        if self._lateness is not None:
+            self._lateness.observe(self._scheduler.time() - self.open_at, "open")
+        self._on_open()
+
+    def _on_window_close(self):
+        if self._lateness is not None:
+            self._lateness.observe(self._scheduler.time() - self.close_at, "close")
+        if not self.closed:
+            self._on_close()
+        self._window_index += 1
+        if self._window_index >= len(self.windows):
+            return
+        self.open_at, self.close_at = self.windows[self._window_index]
+        self._schedule_open(self.open_at)
+        self._schedule_close(self.close_at)
+
+    async def _open(self):
+        if self._config.mode == "permissions":
+            await self._try_set_send_messages(None)
+        await self._try_send_message(self._config.open_message)
+
+    async def _close(self):
+        # Announce before revoking permissions in case they also apply to us
+        await self._try_send_message(self._config.close_message)
+        if self._config.mode == "permissions":
+            await self._try_set_send_messages(False)
+
+    async def _replace_overwrites(self, old_config: GateChannel):
+        """
+        Undo the overwrites set under an old config, then set the current
+        config's. It's done in one task so the two can't interleave.
+        """
+        if old_config.mode == "permissions":
+            if self._config.mode == "permissions":
+                # Only undo the roles that aren't configured anymore, the
+                # rest are set below
+                roles = tuple(set(old_config.roles) - set(self._config.roles))
+                await self._try_set_send_messages(None, roles, everyone=False)
+            else:
+                await self._try_set_send_messages(None, old_config.roles)
+        if self._config.mode == "permissions":
+            await self._try_set_send_messages(None if not self.closed else False)
+
+    async def _try_set_send_messages(
+        self,
+        allow: Optional[bool],
+        roles: Optional[tuple[int, ...]] = None,
+        everyone: bool = True,
+    ):
+        """
+        Set the send_messages overwrite for @everyone and the configured
+        roles (or `roles` if given). Overwrites that are already correct
+        aren't touched.
+        """
+        if roles is None:
+            roles = self._config.roles
+        guild = self._channel.guild
+        targets = [guild.default_role] if everyone else []
+        for role_id in roles:
+            role = guild.get_role(role_id)
+            if role is None:
+                logger.warning(
+                    f"Role with ID {role_id} cannot be found "
+                    f"(channel_id={self._channel.id})"
+                )
+                continue
+            targets.append(role)
 
-    async def _on_close(self, sleep_time: float):
-        await asyncio.sleep(sleep_time)
-        self._closed = True
-        await self._try_send_message(self._config.messages.close)
+        for target in targets:
+            overwrite = self._channel.overwrites_for(target)
+            if overwrite.send_messages is allow:
+                continue
+            overwrite.send_messages = allow
+            try:
+                await self._dispatcher.request(
+                    Priority.TRANSITION,
+                    ("permissions", self._channel.id),
+                    lambda: self._channel.set_permissions(
+                        target,
+                        overwrite=overwrite,
+                        reason=(
+                            "Floodgate opened" if allow is None else "Floodgate closed"
+                        ),
+                    ),
+                )
+            except discord.HTTPException as e:
+                logger.error(
+                    f"Failed to update send_messages overwrite "
+                    f"(channel_id={self._channel.id}, target_id={target.id})",
+                    exc_info=e,
+                )
 
     async def _try_send_message(self, msg: str):
         try:
-            await self._channel.send(msg)
+            await self._dispatcher.request(
+                Priority.TRANSITION,
+                ("send", self._channel.id),
+                lambda: self._channel.send(msg),
+            )
         except Exception as e:
             logger.error(
                 f"Failed to send gate open message (channel_id={self._channel.id})",
                 exc_info=e,
             )
 
+    def close_now(self):
+        """Close the gate ahead of schedule."""
+        self._on_close()
+
+    def release(self):
+        """Cancel the controller and undo any permission overwrites it set."""
+        self.cancel()
+        if self._config.mode == "permissions":
+            self._create_task(self._try_set_send_messages(None))
+
     def cancel(self):
-        if self._open_gate_task is not None:
-            self._open_gate_task.cancel()
-            self._open_gate_task = None
-        if self._close_gate_task is not None:
-            self._close_gate_task.cancel()
-            self._close_gate_task = None
+        self._closed_channels.discard(self._channel.id)
+        if self._previous_close_call is not None:
+            self._previous_close_call.cancel()
+            self._previous_close_call = None
+        if self._catch_up_call is not None:
+            self._catch_up_call.cancel()
+            self._catch_up_call = None
+        if self._open_gate_call is not None:
+            self._open_gate_call.cancel()
+            self._open_gate_call = None
+        if self._close_gate_call is not None:
+            self._close_gate_call.cancel()
+            self._close_gate_call = None
 
 
 class Gate(commands.Cog):
-    def __init__(self, bot: commands.Bot, config: FloodgateConfig):
+    def __init__(
+        self,
+        bot: commands.Bot,
+        config: FloodgateConfig,
+        clock: Callable[[], float] = time.time,
+        partial_shards: bool = False,
+        closed_channels: Optional[ClosedChannels] = None,
+    ):
+        """
+        :param bot: the bot the cog is added to
+        :param config: the floodgate module's config
+        :param clock: returns the current Unix time, for running gates on a
+            virtual clock
+        :param partial_shards: whether other processes run some of the bot's
+            shards, so configured channels that can't be found are expected
+            to be in their guilds
+        :param closed_channels: where the closed gates' channels are kept,
+            e.g. to watch the gates open and close (default a new one)
+        """
         self._bot = bot
+        self._scheduler = GateScheduler(bot.loop, clock)
         self._gates: dict[int, GateController] = {}
+        # The configured channels, from the config and any channel files
+        self._channels: dict[int, GateChannel] = {}
+        # Configured channels that aren't in this process's guilds
+        self._unowned: set[int] = set()
+        self._partial_shards = partial_shards
+        self._channel_files: Optional[ChannelFiles] = None
+        self._use_channels_dir(config.channels_dir)
+        if closed_channels is None:
+            closed_channels = ClosedChannels()
+        self._closed_channels = closed_channels
+        self._deletion_queues: dict[int, DeletionQueue] = {}
+        self._announcer = AnnouncementDispatcher(
+            bot.loop,
+            config.announcement_concurrency,
+            lag_histogram=bot.metrics.announcement_lag,
+            clock=clock,
+        )
         self._config = None
-        self.set_config(config)
 
-    def set_config(self, config: FloodgateConfig):
+        self._metrics: FloodgateMetrics = bot.metrics
+        # Has a key for each gated channel, as the ID string that raw payloads
+        # have, so it doubles as the set of gated channels
+        self._messages_seen = self._metrics.messages_seen.values
+        self._collect_metrics()
+
+        self._store: Optional[GateStore] = None
+        self._saved: dict[int, GateRecord] = {}
+        if config.state_file is not None:
+            self._store = GateStore(config.state_file)
+
+        # ID of the last message processed in each gated channel
+        self._cursors: dict[int, int] = {}
+        self._dirty_cursors: set[int] = set()
+        self._sweep_task: Optional[asyncio.Task] = None
+
+        # Each timezone's gates are planned at that timezone's midnight
+        self._timezone_groups: dict[str, list[int]] = {}
+        self._rollovers: dict[str, ScheduledCall] = {}
+
+        self._bot_user_key: Optional[str] = None
+        self._parse_message_create = None
+        if config.raw_events:
+            self._install_raw_message_hook()
+
         self._config = config
-        asyncio.run_coroutine_threadsafe(self._init_daily_loop(), self._bot.loop)
+        self._initialized = False
+        asyncio.run_coroutine_threadsafe(self._init_gates(), self._bot.loop)
+
+    def _collect_metrics(self):
+        metrics = self._metrics
+        queues = self._deletion_queues
+        metrics.collect(
+            "floodgate_messages_deleted_total",
+            "Leaked messages deleted",
+            lambda: {channel_id: q.deleted for channel_id, q in queues.items()},
+            kind="counter",
+            label="channel_id",
+        )
+        metrics.collect(
+            "floodgate_messages_failed_total",
+            "Leaked messages that couldn't be deleted",
+            lambda: {channel_id: q.failed for channel_id, q in queues.items()},
+            kind="counter",
+            label="channel_id",
+        )
+        metrics.collect(
+            "floodgate_deletion_backlog",
+            "Leaked messages waiting to be deleted",
+            lambda: sum(queue.backlog for queue in queues.values()),
+        )
+        metrics.collect(
+            "floodgate_gates",
+            "Floodgate channels with a gate",
+            lambda: len(self._gates),
+        )
+        metrics.collect(
+            "floodgate_gates_scheduled",
+            "Gates with a transition scheduled",
+            lambda: sum(1 for gate in self._gates.values() if gate.scheduled),
+        )
+        metrics.collect(
+            "floodgate_gates_closed",
+            "Gates that are currently closed",
+            lambda: len(self._closed_channels),
+        )
+        metrics.collect(
+            "floodgate_announcements_queued",
+            "Gate transitions waiting to make their requests",
+            lambda: self._announcer.queued,
+        )
+        metrics.collect(
+            "floodgate_announcements_failed_total",
+            "Gate transitions whose requests raised an exception",
+            lambda: self._announcer.failed,
+            kind="counter",
+        )
+        metrics.collect(
+            "floodgate_clock_jumps_total",
+            "Times the wall clock jumped relative to the event loop clock",
+            lambda: self._scheduler.clock_jumps,
+            kind="counter",
+        )
+        metrics.collect(
+            "floodgate_transition_error_max_seconds",
+            "The most a scheduled transition has run late",
+            lambda: self._scheduler.error.max,
+        )
+
+    def set_config(self, config: FloodgateConfig) -> Optional[ReconcileCounts]:
+        """
+        Apply a new config. Only gates whose channels were added, removed or
+        changed are rescheduled. Channel files aren't read again, see
+        `apply_config`.
+
+        :return: what happened to the gates, or None if they haven't been
+            scheduled yet (they'll use the new config when they are)
+        """
+        old_config = self._config
+        self._config = config
+        self._use_channels_dir(config.channels_dir)
+
+        if config.raw_events != old_config.raw_events:
+            logger.warning("Changing raw_events requires a restart")
+        if config.state_file != old_config.state_file:
+            logger.warning("Changing state_file requires a restart")
+        window = config.deletion_window.total_seconds()
+        for queue in self._deletion_queues.values():
+            queue.window = window
+        self._announcer.concurrency = config.announcement_concurrency
+        salt = self._salt
+        for gate in self._gates.values():
+            # Takes effect from the next day's draw
+            gate.salt = salt
 
-    async def _init_daily_loop(self):
+        if not self._initialized:
+            return None
+        counts = self._reconcile(self._merge_channels(), rollover=False)
+        self._update_rollovers()
+        return counts
+
+    async def apply_config(self, config: FloodgateConfig) -> Optional[ReconcileCounts]:
+        """
+        Read the channel files in the config's `channels_dir` again (if it
+        has one), then apply the config with `set_config`.
+        """
+        self._use_channels_dir(config.channels_dir)
+        if self._channel_files is not None:
+            async for __ in self._channel_files.load(self._bot.loop):
+                pass
+        return self.set_config(config)
+
+    def _use_channels_dir(self, directory: Optional[Path]):
+        current = None if self._channel_files is None else self._channel_files.directory
+        if directory != current:
+            self._channel_files = None if directory is None else ChannelFiles(directory)
+
+    def _merge_channels(self) -> dict[int, GateChannel]:
+        """Combine the config's channels with the loaded channel files'."""
+        channels = dict(self._config.channels)
+        if self._channel_files is not None:
+            for path, file_channels in self._channel_files.files.items():
+                channels.update(_without_duplicates(channels, file_channels, path))
+        return channels
+
+    def get_status(self) -> Optional[dict]:
+        """
+        Get the gates' status for the bot's status report, or None if they
+        haven't been scheduled yet.
+        """
+        if not self._initialized:
+            return None
+        return {
+            "gates": len(self._gates),
+            "closed": len(self._closed_channels),
+            "scheduled": sum(1 for gate in self._gates.values() if gate.scheduled),
+            "backlog": sum(queue.backlog for queue in self._deletion_queues.values()),
+            "unowned": sorted(self._unowned),
+        }
+
+    @property
+    def _salt(self) -> Optional[bytes]:
+        if self._config.random_salt is None:
+            return None
+        return self._config.random_salt.get_secret_value().encode()
+
+    async def _init_gates(self):
         await self._bot.wait_until_ready()
-        self._daily_loop.stop()
+        self._bot_user_key = str(self._bot.user.id)
+        if self._store is not None and not self._saved:
+            self._saved = await self._bot.loop.run_in_executor(None, self._store.load)
+            self._cursors = await self._bot.loop.run_in_executor(
+                None, self._store.load_cursors
+            )
+            if not self._save_cursors.is_running():
+                self._save_cursors.start()
 
-        # Schedule once, then wait until midnight to schedule again
-        await self._schedule_todays_gate_openings()
-        tomorrow = pen.today() + pen.duration(days=1)
-        tomorrows_midnight = pen.datetime(
-            tomorrow.year,
-            tomorrow.month,
-            tomorrow.day,
-            0,
-            0,
-            0,
-            tz=pen.local_timezone(),
-        )
-        time_till_midnight = tomorrows_midnight - pen.now()
-        await asyncio.sleep(time_till_midnight)
-        self._daily_loop.start()
-
-    @tasks.loop(hours=24)
-    async def _daily_loop(self):
+        await self.schedule_gates()
+        self._start_sweep()
+
+    async def schedule_gates(self):
+        """
+        Plan today's gates and start running them. This is done once the bot
+        is ready, so it only needs calling directly when the bot never
+        connects.
+        """
         await self._schedule_todays_gate_openings()
+        self._initialized = True
+
+    def _update_rollovers(self, now: Optional[pen.DateTime] = None):
+        """
+        Group the gates by timezone and make sure each timezone in use (and
+        only those) has a rollover scheduled for its next local midnight.
+
+        :param now: the time to find the next midnight from (default now)
+        """
+        groups: dict[str, list[int]] = {}
+        for channel_id, channel_config in self._channels.items():
+            timezone = channel_config.gate_open.timezone.name
+            groups.setdefault(timezone, []).append(channel_id)
+        self._timezone_groups = groups
 
-    @_daily_loop.error
-    async def _on_daily_loop_error(self, exc: Exception):
-        logger.error("Unhandled exception in daily_loop task", exc_info=exc)
+        for timezone in self._rollovers.keys() - groups.keys():
+            self._rollovers.pop(timezone).cancel()
+        if now is None:
+            now = pen.from_timestamp(self._scheduler.time())
+        for timezone in groups.keys() - self._rollovers.keys():
+            midnight = now.in_timezone(timezone).add(days=1).start_of("day")
+            self._schedule_rollover(timezone, midnight)
+
+    def _schedule_rollover(self, timezone: str, midnight: pen.DateTime):
+        self._rollovers[timezone] = self._scheduler.call_at_time(
+            midnight.timestamp(),
+            lambda: self._roll_over(timezone, midnight),
+        )
+
+    def _roll_over(self, timezone: str, midnight: pen.DateTime):
+        """Plan the new day for every gate in a timezone that just hit midnight."""
+        # Work out the date once for the whole group. It's taken from the
+        # planned midnight rather than the clock in case we're called early.
+        today = midnight.date()
+        context = _time_context(self._scheduler)
+        channels = {
+            channel_id: self._channels[channel_id]
+            for channel_id in self._timezone_groups.get(timezone, ())
+        }
+        windows = compile_timetable(
+            channels, start=today, context=context, salt=self._salt
+        ).by_channel()
+        rescheduled = 0
+        for channel_id, channel_config in channels.items():
+            gate = self._gates.get(channel_id)
+            channel_windows = windows.get(channel_id, [])
+            if gate is not None:
+                gate.reschedule(today, context, channel_windows)
+            elif not self._create_gate(
+                channel_id, channel_config, context, channel_windows
+            ):
+                continue
+            rescheduled += 1
+        logger.info(
+            f"Rolled over to {today} in {timezone}, {rescheduled} gate(s) planned"
+        )
+        # Add a calendar day rather than 24 hours so DST changes are respected
+        self._schedule_rollover(timezone, midnight.add(days=1))
+
+    @tasks.loop(seconds=30)
+    async def _save_cursors(self):
+        for channel_id in self._dirty_cursors:
+            self._store.save_cursor(channel_id, self._cursors[channel_id])
+        self._dirty_cursors.clear()
+
+    @_save_cursors.error
+    async def _on_save_cursors_error(self, exc: Exception):
+        logger.error("Unhandled exception in save_cursors task", exc_info=exc)
+
+    def cog_unload(self):
+        if self._parse_message_create is not None:
+            # noinspection PyProtectedMember
+            parsers = self._bot._connection.parsers
+            parsers["MESSAGE_CREATE"] = self._parse_message_create
+            self._parse_message_create = None
+        self._scheduler.close()
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+        for queue in self._deletion_queues.values():
+            queue.cancel()
+        self._announcer.cancel()
+        if self._store is not None:
+            self._save_cursors.cancel()
+            for channel_id in self._dirty_cursors:
+                self._store.save_cursor(channel_id, self._cursors[channel_id])
+            self._store.close()
 
     async def _schedule_todays_gate_openings(self):
         if self._config is None:
             raise RuntimeError("No config has been set")
 
-        scheduled_count = 0
-        for channel_id, channel_config in self._config.channels.items():
-            channel = self._bot.get_channel(channel_id)
-            if channel is None:
-                logger.warning(f"Channel with ID {channel_id} cannot be found")
-                continue
-            self._gates[channel_id] = task = GateController(
-                self._bot.loop, channel, channel_config
-            )
-            if task.scheduled:
-                scheduled_count += 1
+        # Gates scheduled while channel files are loading get their rollover
+        # at the midnight after this, even if loading runs past it
+        now = pen.from_timestamp(self._scheduler.time())
+        self._reconcile(self._config.channels)
+        if self._channel_files is not None:
+            await self._load_channel_files()
+        self._update_rollovers(now)
+        scheduled_count = sum(gate.scheduled for gate in self._gates.values())
         logger.info(f"{scheduled_count} gate openings scheduled for today")
+        if self._partial_shards and self._unowned:
+            logger.info(
+                f"{len(self._unowned)} configured channel(s) aren't in this "
+                f"process's guilds, they're left to the other shards"
+            )
 
-    async def _try_delete_gate(self, channel_id: int):
-        if channel_id not in self._gates:
-            return
+    async def _load_channel_files(self):
+        """Load the channel files one by one, scheduling each file's gates."""
+        async for path, channels in self._channel_files.load(self._bot.loop):
+            channels = _without_duplicates(self._channels, channels, path)
+            self._reconcile(channels, drop_missing=False, source=path.name)
+        if self._channel_files.errors:
+            logger.error(
+                f"{len(self._channel_files.errors)} channel file(s) failed to load"
+            )
+
+    def _reconcile(
+        self,
+        channels: dict[int, GateChannel],
+        rollover: bool = True,
+        drop_missing: bool = True,
+        source: str = "config",
+    ) -> ReconcileCounts:
+        """
+        Bring the live gate controllers in line with the configured channels.
+        Controllers with unchanged configs are kept, controllers whose
+        gate_open config is unchanged get the new config swapped in, and only
+        removed or changed gates are cancelled.
+
+        :param channels: the configured channels
+        :param rollover: whether this is a new day, in which case kept
+            controllers plan the day's transitions
+        :param drop_missing: whether `channels` are all the configured
+            channels, so gates for any others are dropped. Otherwise they're
+            added to the configured channels.
+        :param source: where the channels came from, for logging
+        """
+        reused = updated = created = dropped = 0
+        # Gates to plan today's windows for, compiled in one go below
+        kept: list[int] = []
+        new: list[int] = []
+        # Channel ID -> whether the gate being replaced was closed
+        replaced: dict[int, bool] = {}
+
+        if drop_missing:
+            for channel_id in self._gates.keys() - channels.keys():
+                self._drop_gate(channel_id)
+                dropped += 1
+            self._channels = dict(channels)
+            self._unowned &= channels.keys()
+        else:
+            self._channels.update(channels)
+
+        for channel_id, channel_config in channels.items():
+            gate = self._gates.get(channel_id)
+            if gate is not None:
+                if gate.config == channel_config:
+                    if rollover:
+                        kept.append(channel_id)
+                    reused += 1
+                    continue
+                if gate.config.gate_open == channel_config.gate_open:
+                    gate.update_config(channel_config)
+                    if rollover:
+                        kept.append(channel_id)
+                    updated += 1
+                    continue
+                replaced[channel_id] = gate.closed
+                self._drop_gate(channel_id, forget=False)
+                if (
+                    gate.config.mode == "permissions"
+                    and channel_config.mode != "permissions"
+                ):
+                    gate.release()
+                dropped += 1
+            new.append(channel_id)
+
+        context = _time_context(self._scheduler)
+        windows = compile_timetable(
+            {channel_id: channels[channel_id] for channel_id in kept + new},
+            context=context,
+            salt=self._salt,
+        ).by_channel()
+        for channel_id in kept:
+            self._gates[channel_id].reschedule(
+                context=context, windows=windows.get(channel_id, [])
+            )
+        for channel_id in new:
+            if self._create_gate(
+                channel_id,
+                channels[channel_id],
+                context,
+                windows.get(channel_id, []),
+                replaced.get(channel_id),
+            ):
+                created += 1
+
+        counts = ReconcileCounts(reused, updated, created, dropped)
+        logger.info(f"Reconciled gates from {source}: {counts}")
+        return counts
+
+    def _create_gate(
+        self,
+        channel_id: int,
+        channel_config: GateChannel,
+        context: Optional[TimeContext] = None,
+        windows: Optional[list[tuple[float, float]]] = None,
+        replaces_closed: Optional[bool] = None,
+    ) -> bool:
+        channel = self._bot.get_channel(channel_id)
+        if channel is None:
+            self._unowned.add(channel_id)
+            if self._partial_shards:
+                logger.debug(f"Channel with ID {channel_id} isn't in our guilds")
+            else:
+                logger.warning(f"Channel with ID {channel_id} cannot be found")
+            return False
+        self._unowned.discard(channel_id)
+        self._gates[channel_id] = GateController(
+            self._scheduler,
+            self._bot.dispatcher,
+            self._closed_channels,
+            self._store,
+            channel,
+            channel_config,
+            saved=self._saved.pop(channel_id, None),
+            context=context,
+            salt=self._salt,
+            windows=windows,
+            lateness=self._metrics.transition_lateness,
+            announcer=self._announcer,
+            replaces_closed=replaces_closed,
+        )
+        self._messages_seen.setdefault(str(channel_id), 0)
+        if channel_id not in self._cursors:
+            # Nothing before now can have been missed by this gate
+            self._set_cursor(channel_id, timestamp_snowflake(self._scheduler.time()))
+        return True
+
+    def _drop_gate(self, channel_id: int, forget: bool = True):
+        """
+        Cancel a gate's controller.
+
+        :param channel_id: the gate's channel ID
+        :param forget: whether to also undo its overwrites and delete its saved
+            state, for gates that are removed rather than replaced. Replaced
+            gates keep their state, which their new controller takes over.
+        """
         logger.info(f"Canceling gate opening (channel_id={channel_id})")
-        self._gates[channel_id].cancel()
-        del self._gates[channel_id]
+        gate = self._gates.pop(channel_id)
+        if forget:
+            gate.release()
+            self._cursors.pop(channel_id, None)
+            self._dirty_cursors.discard(channel_id)
+            self._messages_seen.pop(str(channel_id), None)
+            if self._store is not None:
+                self._store.delete(channel_id)
+        else:
+            gate.cancel()
+
+    def _set_cursor(self, channel_id: int, message_id: int):
+        if message_id > self._cursors.get(channel_id, 0):
+            self._cursors[channel_id] = message_id
+            self._dirty_cursors.add(channel_id)
+
+    def _queue_leaked_message(self, channel: discord.TextChannel, message_id: int):
+        self._get_deletion_queue(channel).enqueue(message_id)
+
+    def _get_deletion_queue(self, channel: discord.TextChannel) -> DeletionQueue:
+        try:
+            return self._deletion_queues[channel.id]
+        except KeyError:
+            pass
+        queue = self._deletion_queues[channel.id] = DeletionQueue(
+            self._bot.loop,
+            self._bot.dispatcher,
+            channel,
+            window=self._config.deletion_window.total_seconds(),
+            latency_histogram=self._metrics.delete_latency,
+        )
+        return queue
+
+    def _install_raw_message_hook(self):
+        """
+        Handle MESSAGE_CREATE payloads before discord.py turns them into
+        models. Messages in closed channels are queued for deletion straight
+        from the payload, and other messages are only parsed (and dispatched
+        to on_message) if they could be commands.
+        """
+        # noinspection PyProtectedMember
+        parsers = self._bot._connection.parsers
+        self._parse_message_create = parsers["MESSAGE_CREATE"]
+        parsers["MESSAGE_CREATE"] = self._on_raw_message_create
+
+    def _on_raw_message_create(self, data: dict):
+        channel_key = data["channel_id"]
+        messages_seen = self._messages_seen
+        if channel_key in messages_seen:
+            messages_seen[channel_key] += 1
+            self._set_cursor(int(channel_key), int(data["id"]))
+        if (
+            channel_key in self._closed_channels.keys
+            and data["author"]["id"] != self._bot_user_key
+        ):
+            gate = self._gates[int(channel_key)]
+            self._queue_leaked_message(gate.channel, int(data["id"]))
+            return
+        if data["content"].startswith(self._bot.command_prefix):
+            self._parse_message_create(data)
 
     @commands.Cog.listener(name="on_message")
     async def leak_prevention(self, msg: discord.Message):
         """Delete new messages in channels with closed floodgates"""
+        if self._parse_message_create is not None:
+            # The raw hook already counted this message, and it only lets
+            # through messages that aren't leaks
+            return
+        channel_id = msg.channel.id
+        if channel_id in self._gates:
+            self._messages_seen[str(channel_id)] += 1
+            self._set_cursor(channel_id, msg.id)
+        if channel_id not in self._closed_channels:
+            return
         if msg.author.id == self._bot.user.id:
             return
+        self._queue_leaked_message(msg.channel, msg.id)
 
-        try:
-            gate = self._gates[msg.channel.id]
-        except KeyError:
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self._start_sweep()
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild: discord.Guild):
+        self._gate_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        self._gate_guild(guild)
+
+    def _gate_guild(self, guild: discord.Guild):
+        """
+        Create gates for the configured channels in a guild that became
+        available after the gates were scheduled, e.g. after an outage.
+        """
+        if not self._initialized:
             return
+        channels = {
+            channel.id: self._channels[channel.id]
+            for channel in guild.text_channels
+            if channel.id in self._unowned
+        }
+        if channels:
+            self._reconcile(channels, drop_missing=False, source=f"guild {guild.id}")
 
-        if not gate.closed:
+    @commands.Cog.listener()
+    async def on_resumed(self):
+        self._start_sweep()
+
+    def _start_sweep(self):
+        if not self._gates:
+            return
+        if self._sweep_task is not None and not self._sweep_task.done():
             return
+        self._sweep_task = self._bot.loop.create_task(self._sweep())
+        self._sweep_task.add_done_callback(_handle_task_exception)
 
-        try:
-            await msg.delete()
-        except (discord.Forbidden, discord.NotFound, discord.HTTPException) as e:
-            logger.error(
-                f"Failed to delete message in channel with a closed floodgate "
-                f"(message_id={msg.id}, channel={msg.channel.name}, "
-                f"guild={msg.guild.name})",
-                exc_info=e,
-            )
+    async def _sweep(self):
+        """
+        Delete messages that were sent in closed channels while we weren't
+        listening, going by each channel's cursor. History is fetched a page
+        at a time with the lowest REST priority, and only a few channels are
+        swept at once.
+        """
+        # Anything newer is handled by leak_prevention
+        before = timestamp_snowflake(self._scheduler.time())
+        semaphore = asyncio.Semaphore(self._config.sweep_concurrency)
+        gates = list(self._gates.values())
+        results = await asyncio.gather(
+            *(self._sweep_channel(gate, before, semaphore) for gate in gates),
+            return_exceptions=True,
+        )
+        leaked = failed = 0
+        for gate, result in zip(gates, results):
+            if isinstance(result, BaseException):
+                failed += 1
+                logger.error(
+                    f"Failed to sweep channel (channel_id={gate.channel.id})",
+                    exc_info=result,
+                )
+            elif result is None:
+                failed += 1
+            else:
+                leaked += result
+        logger.info(
+            f"Catch-up sweep found {leaked} leaked message(s) in "
+            f"{len(gates)} channel(s)"
+            + (f", {failed} channel(s) couldn't be swept" if failed else "")
+        )
+
+    async def _sweep_channel(
+        self, gate: GateController, before: int, semaphore: asyncio.Semaphore
+    ) -> Optional[int]:
+        """
+        Sweep a channel's history from its cursor up to `before`.
+
+        :return: how many leaked messages were found, or None if the history
+            couldn't be read
+        """
+        channel = gate.channel
+        after = self._cursors.get(channel.id)
+        if after is None:
+            return 0
+
+        leaked = 0
+        async with semaphore:
+            while after < before:
+                try:
+                    page = await self._bot.dispatcher.request(
+                        Priority.SWEEP,
+                        ("history", channel.id),
+                        lambda after=after: self._bot.http.logs_from(
+                            channel.id, 100, after=after
+                        ),
+                    )
+                except (discord.Forbidden, discord.NotFound) as e:
+                    # Trying again won't help, so skip what can't be read
+                    # rather than failing on every resume
+                    logger.warning(
+                        f"Can't read channel history to sweep it, skipping "
+                        f"(channel_id={channel.id}): {e}"
+                    )
+                    self._set_cursor(channel.id, before)
+                    return None
+                except discord.HTTPException as e:
+                    # The cursor stays put, so the next sweep tries again
+                    logger.error(
+                        f"Failed to read channel history to sweep it "
+                        f"(channel_id={channel.id})",
+                        exc_info=e,
+                    )
+                    return None
+                if not page:
+                    break
+                for data in page:
+                    message_id = int(data["id"])
+                    if message_id >= before:
+                        continue
+                    if data["author"]["id"] == self._bot_user_key:
+                        continue
+                    if gate.was_closed_at(snowflake_timestamp(message_id)):
+                        self._get_deletion_queue(channel).enqueue(message_id)
+                        leaked += 1
+                # Pages are sorted newest first
+                after = int(page[0]["id"])
+                self._set_cursor(channel.id, min(after, before))
+                if len(page) < 100:
+                    break
+        self._set_cursor(channel.id, before)
+        return leaked
 
     @commands.command()
     async def ping(self, context: commands.Context):
         await context.reply("Pong!")
+
+    @commands.command()
+    @commands.is_owner()
+    async def deletions(self, context: commands.Context):
+        """Show deletion backlog and latency for each floodgate channel"""
+        if not self._deletion_queues:
+            await context.reply("No messages have been deleted yet")
+            return
+        lines = [
+            f"<#{channel_id}>: backlog={queue.backlog} deleted={queue.deleted} "
+            f"failed={queue.failed} latency({queue.latency})"
+            for channel_id, queue in self._deletion_queues.items()
+        ]
+        await context.reply("\n".join(lines))
+
+    @commands.command()
+    @commands.is_owner()
+    async def reload(self, context: commands.Context):
+        """Reload the config file"""
+        try:
+            summary, elapsed = await self._bot.reload_config()
+        except Exception as e:
+            logger.error("Failed to reload config", exc_info=e)
+            await context.reply(f"Failed to reload config: {e}")
+            return
+        await context.reply(f"Reloaded config in {elapsed * 1000:.0f} ms ({summary})")
+
+    @commands.command()
+    @commands.is_owner()
+    async def schedule(
+        self,
+        context: commands.Context,
+        channel: Optional[discord.TextChannel] = None,
+        days: int = 7,
+    ):
+        """Preview a floodgate channel's windows over the coming days"""
+        if channel is None:
+            channel = context.channel
+        channel_config = self._channels.get(channel.id)
+        if channel_config is None:
+            await context.reply(f"<#{channel.id}> has no floodgate")
+            return
+        days = max(1, min(days, 14))
+        timetable = compile_timetable(
+            {channel.id: channel_config}, days=days, salt=self._salt
+        )
+        windows = timetable.by_channel().get(channel.id, [])
+        if not windows:
+            await context.reply(
+                f"<#{channel.id}> has no windows in the next {days} days"
+            )
+            return
+        lines = [
+            f"<t:{int(open_at)}:F> to <t:{int(close_at)}:t>"
+            for open_at, close_at in windows
+        ]
+        if channel_config.gate_open.time is None and self._salt is None:
+            lines.append("Random times are drawn each day, so these are only examples")
+        await context.reply("\n".join(lines))
+
+    @commands.command()
+    @commands.is_owner()
+    async def status(self, context: commands.Context):
+        """Show the status of each process running the bot"""
+        statuses = await self._bot.query_status()
+        # Replies are limited to 2000 characters
+        reply = ""
+        for line in format_status(statuses).splitlines():
+            if reply and len(reply) + len(line) >= 2000:
+                await context.reply(reply)
+                reply = ""
+            reply += line + "\n"
+        await context.reply(reply)
+
+    @commands.command()
+    @commands.is_owner()
+    async def rest(self, context: commands.Context):
+        """Show REST dispatcher counters"""
+        dispatcher: RestDispatcher = self._bot.dispatcher
+        await context.reply(
+            f"queued={dispatcher.queued} in_flight={dispatcher.in_flight} "
+            f"completed={dispatcher.completed} failed={dispatcher.failed} "
+            f"rate_limited={self._bot.rate_limit_log.rate_limited} "
+            f"retried_429={dispatcher.retried_429} banned={dispatcher.banned}"
+        )
+
+    @commands.command()
+    @commands.is_owner()
+    async def timing(self, context: commands.Context):
+        """Show how late gate transitions ran and were announced"""
+        error = self._scheduler.error
+        announcer = self._announcer
+        await context.reply(
+            f"transitions={error.count} mean={error.mean * 1000:.1f}ms "
+            f"max={error.max * 1000:.1f}ms last={error.last * 1000:.1f}ms "
+            f"clock_jumps={self._scheduler.clock_jumps}\n"
+            f"announcements: queued={announcer.queued} "
+            f"in_flight={announcer.in_flight} completed={announcer.completed} "
+            f"failed={announcer.failed} lag({announcer.lag})"
+        )
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+import discord
+
+from floodgate.common.snowflake import snowflake_timestamp
+from floodgate.common.stats import LatencyStats
+from floodgate.dispatch import Priority, RestDispatcher
+from floodgate.metrics import Histogram
+
+__all__ = ["BULK_DELETE_LIMIT", "BULK_DELETE_MAX_AGE", "DeletionQueue"]
+
+logger = logging.getLogger("floodgate.gate.deletion")
+
+# Discord accepts at most 100 messages per bulk delete request
+BULK_DELETE_LIMIT = 100
+# ...and refuses to bulk delete messages older than 14 days. Keep a minute of
+# leeway for clock skew and time spent in the queue.
+BULK_DELETE_MAX_AGE = 14 * 24 * 60 * 60 - 60
+
+
+class DeletionQueue:
+    """
+    Collects messages to delete from a channel and deletes them in bulk.
+
+    Message IDs are gathered for `window` seconds after the first one is
+    queued, then sent in batches of up to 100 with a single bulk delete
+    request each. Messages too old to be bulk deleted are deleted one by one.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        dispatcher: RestDispatcher,
+        channel: discord.TextChannel,
+        window: float,
+        latency_histogram: Optional[Histogram] = None,
+    ):
+        self._loop = loop
+        self._dispatcher = dispatcher
+        self._channel = channel
+        self.window = window
+
+        self._bucket = ("delete", channel.id)
+        # (message ID, loop time it was queued at)
+        self._pending: list[tuple[int, float]] = []
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+        self.deleted = 0
+        self.failed = 0
+        self.latency = LatencyStats()
+        self._latency_histogram = latency_histogram
+
+    @property
+    def backlog(self) -> int:
+        return len(self._pending)
+
+    def enqueue(self, message_id: int):
+        self._pending.append((message_id, self._loop.time()))
+        if self._flush_timer is None and self._flush_task is None:
+            self._flush_timer = self._loop.call_later(self.window, self._start_flush)
+
+    def cancel(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self._pending.clear()
+
+    def _start_flush(self):
+        self._flush_timer = None
+        self._flush_task = self._loop.create_task(self._flush())
+
+    async def _flush(self):
+        try:
+            while self._pending:
+                batch = self._pending[:BULK_DELETE_LIMIT]
+                del self._pending[:BULK_DELETE_LIMIT]
+                await self._delete_batch(batch)
+        finally:
+            self._flush_task = None
+
+    async def _delete_batch(self, batch: list[tuple[int, float]]):
+        min_timestamp = time.time() - BULK_DELETE_MAX_AGE
+        young = [m for m in batch if snowflake_timestamp(m[0]) > min_timestamp]
+        old = [m for m in batch if snowflake_timestamp(m[0]) <= min_timestamp]
+
+        if young:
+            objects = [discord.Object(id=message_id) for message_id, __ in young]
+            try:
+                await self._dispatcher.request(
+                    Priority.DELETION,
+                    self._bucket,
+                    lambda: self._channel.delete_messages(objects),
+                )
+            except (discord.Forbidden, discord.NotFound, discord.HTTPException) as e:
+                self._on_failed(young, e)
+            else:
+                self._on_deleted(young)
+
+        for message in old:
+            partial = self._channel.get_partial_message(message[0])
+            try:
+                await self._dispatcher.request(
+                    Priority.DELETION, self._bucket, partial.delete
+                )
+            except (discord.Forbidden, discord.NotFound, discord.HTTPException) as e:
+                self._on_failed([message], e)
+            else:
+                self._on_deleted([message])
+
+    def _on_deleted(self, messages: list[tuple[int, float]]):
+        now = self._loop.time()
+        self.deleted += len(messages)
+        histogram = self._latency_histogram
+        for __, queued_at in messages:
+            self.latency.record(now - queued_at)
+            if histogram is not None:
+                histogram.observe(now - queued_at, self._channel.id)
+
+    def _on_failed(self, messages: list[tuple[int, float]], exc: Exception):
+        self.failed += len(messages)
+        logger.error(
+            f"Failed to delete {len(messages)} message(s) in channel with a "
+            f"closed floodgate (channel_id={self._channel.id}, "
+            f"message_ids={[message_id for message_id, __ in messages]})",
+            exc_info=exc,
+        )
@@ -0,0 +1,242 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable, Optional
+
+from floodgate.common.stats import LatencyStats
+
+__all__ = ["ScheduledCall", "GateScheduler"]
+
+logger = logging.getLogger("floodgate.gate.scheduler")
+
+# Longest the driver sleeps before checking the wall clock again
+MAX_SLEEP = 60.0
+# Within this many seconds of a deadline, sleep right up to it instead of
+# halving the remaining time
+FINAL_STEP = 0.05
+# Wall clock deadlines are re-keyed when the wall clock drifts from the loop
+# clock by more than this...
+RESYNC_TOLERANCE = 0.001
+# ...and it's logged as a jump when it's more than this
+CLOCK_JUMP_THRESHOLD = 0.1
+
+
+class ScheduledCall:
+    """
+    A handle to a callback queued in a :class:`GateScheduler`. `when` is the
+    event loop time it runs at and `timestamp` is its wall clock deadline, if
+    it was scheduled with one.
+    """
+
+    __slots__ = ("when", "timestamp", "callback", "cancelled", "_seq", "_scheduler")
+
+    def __init__(
+        self,
+        when: float,
+        seq: int,
+        callback: Callable[[], Any],
+        scheduler: "GateScheduler",
+        timestamp: Optional[float] = None,
+    ):
+        self.when = when
+        self.timestamp = timestamp
+        self.callback = callback
+        self.cancelled = False
+        self._seq = seq
+        self._scheduler = scheduler
+
+    @property
+    def pending(self) -> bool:
+        return self.callback is not None
+
+    def __lt__(self, other: "ScheduledCall") -> bool:
+        return (self.when, self._seq) < (other.when, other._seq)
+
+    def cancel(self):
+        if self.callback is None:
+            # Already run or cancelled
+            return
+        self.cancelled = True
+        self.callback = None
+        self._scheduler._on_cancel(self)
+
+
+class GateScheduler:
+    """
+    Runs callbacks at given event loop times.
+
+    Every pending call lives in a single binary heap which is drained by one
+    driver task, so the cost of a scheduled gate transition is one heap entry
+    rather than a sleeping task. Inserting is O(log n); cancelling marks the
+    entry and leaves it to be discarded when it reaches the top of the heap
+    (or when cancelled entries make up most of the heap).
+
+    Calls can also be scheduled at a wall clock time. The event loop's clock
+    is monotonic, so the wall clock can step away from it (NTP corrections,
+    the host suspending). The driver never sleeps longer than a minute, sleeps
+    in shorter steps as a deadline nears, and compares the two clocks each
+    time it wakes, moving wall clock deadlines if they've drifted apart. How
+    late each of them actually ran is kept in `error`.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        clock: Callable[[], float] = time.time,
+    ):
+        self._loop = loop
+        self._clock = clock
+        self._heap: list[ScheduledCall] = []
+        self._seq = itertools.count()
+        self._cancelled_count = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._next_wakeup: Optional[float] = None
+
+        # Wall clock time minus loop time when the clocks were last compared
+        self._offset = clock() - loop.time()
+        self._wall_calls = 0
+        self.error = LatencyStats()
+        self.clock_jumps = 0
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def __len__(self) -> int:
+        return len(self._heap) - self._cancelled_count
+
+    def time(self) -> float:
+        """Get the current time from the scheduler's wall clock."""
+        return self._clock()
+
+    def call_at(self, when: float, callback: Callable[[], Any]) -> ScheduledCall:
+        """Schedule `callback` to run at event loop time `when`."""
+        return self._push(ScheduledCall(when, next(self._seq), callback, self))
+
+    def call_at_time(
+        self, timestamp: float, callback: Callable[[], Any]
+    ) -> ScheduledCall:
+        """Schedule `callback` to run at Unix timestamp `timestamp`."""
+        when = timestamp - (self._clock() - self._loop.time())
+        self._wall_calls += 1
+        return self._push(
+            ScheduledCall(when, next(self._seq), callback, self, timestamp)
+        )
+
+    def _push(self, call: ScheduledCall) -> ScheduledCall:
+        when = call.when
+        heapq.heappush(self._heap, call)
+        self._ensure_running()
+        if self._next_wakeup is None or when < self._next_wakeup:
+            # The driver is sleeping past this call, wake it up to reschedule
+            self._wakeup.set()
+        return call
+
+    def call_later(self, delay: float, callback: Callable[[], Any]) -> ScheduledCall:
+        """Schedule `callback` to run `delay` seconds from now."""
+        return self.call_at(self._loop.time() + delay, callback)
+
+    def close(self):
+        """Stop the driver task and drop all pending calls."""
+        for call in self._heap:
+            call.cancelled = True
+            call.callback = None
+        self._heap.clear()
+        self._cancelled_count = 0
+        self._wall_calls = 0
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _ensure_running(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+
+    def _on_cancel(self, call: ScheduledCall):
+        if call.timestamp is not None:
+            self._wall_calls -= 1
+        self._cancelled_count += 1
+        if self._cancelled_count > len(self._heap) // 2:
+            # Compact the heap so cancelled entries don't pile up
+            self._heap[:] = [c for c in self._heap if not c.cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled_count = 0
+
+    def _pop_cancelled(self):
+        heap = self._heap
+        while heap and heap[0].cancelled:
+            heapq.heappop(heap)
+            self._cancelled_count -= 1
+
+    def _run_due(self, now: float):
+        heap = self._heap
+        while heap and heap[0].when <= now:
+            call = heapq.heappop(heap)
+            if call.cancelled:
+                self._cancelled_count -= 1
+                continue
+            callback = call.callback
+            call.callback = None
+            if call.timestamp is not None:
+                self._wall_calls -= 1
+                self.error.record(self._clock() - call.timestamp)
+            try:
+                callback()
+            except Exception as e:
+                logger.error(
+                    f"Exception raised by scheduled call {callback}", exc_info=e
+                )
+
+    def _sync_clock(self):
+        """Move wall clock deadlines if the wall clock has drifted."""
+        offset = self._clock() - self._loop.time()
+        drift = offset - self._offset
+        if abs(drift) <= RESYNC_TOLERANCE:
+            return
+        self._offset = offset
+        if abs(drift) > CLOCK_JUMP_THRESHOLD:
+            self.clock_jumps += 1
+            logger.warning(
+                f"Wall clock jumped {drift:+.3f} s relative to the event loop "
+                f"clock, moving {self._wall_calls} scheduled call(s)"
+            )
+        if not self._wall_calls:
+            return
+        for call in self._heap:
+            if call.timestamp is not None:
+                call.when = call.timestamp - offset
+        heapq.heapify(self._heap)
+
+    def _next_step(self) -> float:
+        """The loop time to wake up at next, given a non-empty heap."""
+        now = self._loop.time()
+        remaining = self._heap[0].when - now
+        if remaining <= FINAL_STEP:
+            return self._heap[0].when
+        return now + min(remaining / 2, MAX_SLEEP)
+
+    async def _run(self):
+        wakeup = self._wakeup
+        while True:
+            self._sync_clock()
+            self._pop_cancelled()
+            self._run_due(self._loop.time())
+            self._pop_cancelled()
+
+            wakeup.clear()
+            if not self._heap:
+                self._next_wakeup = None
+                await wakeup.wait()
+                continue
+
+            self._next_wakeup = self._next_step()
+            timer = self._loop.call_at(self._next_wakeup, wakeup.set)
+            try:
+                await wakeup.wait()
+            finally:
+                timer.cancel()
@@ -0,0 +1,160 @@
+import logging
+from pathlib import Path
+import queue
+import sqlite3
+import threading
+from typing import NamedTuple, Optional
+
+__all__ = ["GateRecord", "GateStore"]
+
+logger = logging.getLogger("floodgate.gate.store")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS gates (
+    channel_id INTEGER PRIMARY KEY,
+    open_at REAL NOT NULL,
+    close_at REAL NOT NULL,
+    closed INTEGER NOT NULL DEFAULT 1,
+    config_hash TEXT NOT NULL
+)
+"""
+
+_CURSORS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cursors (
+    channel_id INTEGER PRIMARY KEY,
+    message_id INTEGER NOT NULL
+)
+"""
+
+_SAVE_PLAN = """
+INSERT INTO gates (channel_id, open_at, close_at, config_hash)
+VALUES (?, ?, ?, ?)
+ON CONFLICT (channel_id) DO UPDATE SET
+    open_at = excluded.open_at,
+    close_at = excluded.close_at,
+    config_hash = excluded.config_hash
+"""
+
+_SAVE_STATE = "UPDATE gates SET closed = ? WHERE channel_id = ?"
+
+_SAVE_CURSOR = """
+INSERT INTO cursors (channel_id, message_id) VALUES (?, ?)
+ON CONFLICT (channel_id) DO UPDATE SET message_id = excluded.message_id
+"""
+
+_DELETE = "DELETE FROM gates WHERE channel_id = ?"
+
+_DELETE_CURSOR = "DELETE FROM cursors WHERE channel_id = ?"
+
+
+class GateRecord(NamedTuple):
+    """A channel's planned open/close Unix timestamps and its last state."""
+
+    open_at: float
+    close_at: float
+    closed: bool
+    config_hash: str
+
+
+class GateStore:
+    """
+    Persists gate plans and states to an SQLite database in WAL mode.
+
+    Writes are queued and committed in batches by a background thread, so
+    saving never blocks the event loop.
+    """
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._queue: queue.SimpleQueue[Optional[tuple[str, tuple]]] = (
+            queue.SimpleQueue()
+        )
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        with conn:
+            conn.execute(_SCHEMA)
+            conn.execute(_CURSORS_SCHEMA)
+        conn.close()
+
+        self._thread = threading.Thread(
+            target=self._write_loop, name="floodgate-gate-store", daemon=True
+        )
+        self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def load(self) -> dict[int, GateRecord]:
+        """Read all records. This blocks, so run it in an executor."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT channel_id, open_at, close_at, closed, config_hash FROM gates"
+            ).fetchall()
+        finally:
+            conn.close()
+        return {
+            channel_id: GateRecord(open_at, close_at, bool(closed), config_hash)
+            for channel_id, open_at, close_at, closed, config_hash in rows
+        }
+
+    def load_cursors(self) -> dict[int, int]:
+        """
+        Read the ID of the last processed message in each channel. This
+        blocks, so run it in an executor.
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT channel_id, message_id FROM cursors").fetchall()
+        finally:
+            conn.close()
+        return dict(rows)
+
+    def save_plan(
+        self, channel_id: int, open_at: float, close_at: float, config_hash: str
+    ):
+        self._queue.put((_SAVE_PLAN, (channel_id, open_at, close_at, config_hash)))
+
+    def save_state(self, channel_id: int, closed: bool):
+        self._queue.put((_SAVE_STATE, (int(closed), channel_id)))
+
+    def save_cursor(self, channel_id: int, message_id: int):
+        self._queue.put((_SAVE_CURSOR, (channel_id, message_id)))
+
+    def delete(self, channel_id: int):
+        self._queue.put((_DELETE, (channel_id,)))
+        self._queue.put((_DELETE_CURSOR, (channel_id,)))
+
+    def close(self):
+        """Write any queued changes and stop the writer thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _write_loop(self):
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                with conn:
+                    for item in batch:
+                        if item is None:
+                            stopping = True
+                            continue
+                        conn.execute(*item)
+            except sqlite3.Error as e:
+                logger.error(
+                    f"Failed to write {len(batch)} change(s) to the gate store",
+                    exc_info=e,
+                )
+        conn.close()
@@ -0,0 +1,152 @@
+from array import array
+import datetime as dt
+from random import random
+from typing import Optional
+
+from floodgate.common.time import TimeContext, seeded_random_table
+from floodgate.records import GateChannel, GateRule
+
+__all__ = ["WEEKDAYS", "Timetable", "compile_timetable"]
+
+# Names used in the weekdays config, indexed by date.weekday()
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+class Timetable:
+    """
+    Gate windows as parallel arrays of channel IDs and open/close Unix
+    timestamps. Each channel's windows are in chronological order.
+    """
+
+    __slots__ = ("channel_ids", "open_at", "close_at")
+
+    def __init__(self):
+        self.channel_ids = array("q")
+        self.open_at = array("d")
+        self.close_at = array("d")
+
+    def __len__(self) -> int:
+        return len(self.channel_ids)
+
+    def _extend(self, channel_ids: array, open_at: array, duration: float):
+        self.channel_ids.extend(channel_ids)
+        self.open_at.extend(open_at)
+        self.close_at.extend(array("d", [t + duration for t in open_at]))
+
+    def by_channel(self) -> dict[int, list[tuple[float, float]]]:
+        """Get each channel's (open, close) windows."""
+        windows: dict[int, list[tuple[float, float]]] = {}
+        for channel_id, open_at, close_at in zip(
+            self.channel_ids, self.open_at, self.close_at
+        ):
+            try:
+                windows[channel_id].append((open_at, close_at))
+            except KeyError:
+                windows[channel_id] = [(open_at, close_at)]
+        return windows
+
+
+def _fixed_windows(config: GateRule) -> list[tuple[dt.time, float]]:
+    """Get a fixed time gate's (open time, length) windows, merging overlaps."""
+    duration = config.duration.total_seconds()
+    windows: list[tuple[dt.time, float]] = []
+    last_end = None
+    for time in sorted(set(config.time)):
+        start = time.hour * 3600 + time.minute * 60 + time.second
+        if last_end is not None and start <= last_end:
+            open_time, length = windows[-1]
+            windows[-1] = open_time, length + start + duration - last_end
+        else:
+            windows.append((time, duration))
+        last_end = start + duration
+    return windows
+
+
+def compile_timetable(
+    channels: dict[int, GateChannel],
+    days: int = 1,
+    start: Optional[dt.date] = None,
+    context: Optional[TimeContext] = None,
+    salt: Optional[bytes] = None,
+) -> Timetable:
+    """
+    Expand the channels' gate_open rules into their windows over a number of
+    days. Channels with the same rules are expanded together, so the work
+    for fixed times is done once per rule rather than once per channel.
+
+    :param channels: the channels to compile
+    :param days: how many days to compile
+    :param start: the first day, or today in each channel's timezone if not
+        given
+    :param context: calendar lookups to share with the rest of the pass
+    :param salt: the salt for seeded random times, if enabled
+    :return: the windows
+    """
+    if context is None:
+        context = TimeContext()
+
+    groups: dict[GateRule, list[int]] = {}
+    for channel_id, config in channels.items():
+        try:
+            groups[config.gate_open].append(channel_id)
+        except KeyError:
+            groups[config.gate_open] = [channel_id]
+
+    timetable = Timetable()
+    for config, channel_ids in groups.items():
+        _compile_group(timetable, config, channel_ids, days, start, context, salt)
+    return timetable
+
+
+def _compile_group(
+    timetable: Timetable,
+    config: GateRule,
+    channel_ids: list[int],
+    days: int,
+    start: Optional[dt.date],
+    context: TimeContext,
+    salt: Optional[bytes],
+):
+    timezone = config.timezone
+    first_day = start if start is not None else context.today(timezone)
+    weekdays = None
+    if config.weekdays is not None:
+        weekdays = {WEEKDAYS.index(name) for name in config.weekdays}
+    skip_dates = set(config.skip_dates)
+    ids = array("q", channel_ids)
+    count = len(ids)
+    duration = config.duration.total_seconds()
+    fixed_windows = None if config.time is None else _fixed_windows(config)
+    # Either end of a random window can be left open
+    start_time = config.time_window_start or dt.time(0)
+    end_time = config.time_window_end or dt.time(23, 59, 59)
+
+    active_days = []
+    for i in range(days):
+        day = first_day + dt.timedelta(days=i)
+        if weekdays is not None and day.weekday() not in weekdays:
+            continue
+        if day in skip_dates:
+            continue
+        active_days.append(day)
+
+    if fixed_windows is not None:
+        for day in active_days:
+            for open_time, length in fixed_windows:
+                open_at = context.timestamp(timezone, day, open_time)
+                timetable._extend(ids, array("d", [open_at]) * count, length)
+        return
+
+    if salt is not None:
+        seeded = seeded_random_table(salt, channel_ids, active_days)
+    for i, day in enumerate(active_days):
+        window_start = context.timestamp(timezone, day, start_time)
+        window_end = context.timestamp(timezone, day, end_time)
+        if salt is None:
+            fractions = [random() for __ in range(count)]
+        else:
+            fractions = seeded[i]
+        span = window_end - window_start
+        timetable._extend(
+            ids, array("d", [window_start + f * span for f in fractions]), duration
+        )
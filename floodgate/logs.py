@@ -0,0 +1,155 @@
+import logging
+from logging.handlers import QueueHandler, TimedRotatingFileHandler
+import queue
+import sys
+import threading
+import traceback
+from typing import Callable, Optional, Union
+
+__all__ = [
+    "BatchedTimedRotatingFileHandler",
+    "BoundedQueueHandler",
+    "LogPipeline",
+]
+
+# Records written per flush at most
+_MAX_BATCH = 500
+
+
+class BatchedTimedRotatingFileHandler(TimedRotatingFileHandler):
+    """
+    A TimedRotatingFileHandler that can hold off flushing its stream until
+    a batch of records has been written.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._batching = False
+
+    def flush(self):
+        if not self._batching:
+            super().flush()
+
+    def begin_batch(self):
+        self._batching = True
+
+    def end_batch(self):
+        self._batching = False
+        self.flush()
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Puts records on a bounded queue without ever blocking. Records that
+    don't fit are dropped and counted.
+    """
+
+    def __init__(self, queue_: queue.Queue):
+        super().__init__(queue_)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """
+    Moves log output off the calling thread. Loggers get `handler`, which
+    only queues records, and a background thread writes them to the real
+    handlers in batches (file rotation included).
+
+    `handlers` can also be a function returning them, which the writer
+    thread calls when it starts, so that opening log files doesn't hold up
+    the caller. Records logged before then wait in the queue.
+    """
+
+    def __init__(
+        self,
+        handlers: Union[list[logging.Handler], Callable[[], list[logging.Handler]]],
+        queue_size: int = 10_000,
+    ):
+        self._queue: queue.Queue[Optional[logging.LogRecord]] = queue.Queue(queue_size)
+        self.handler = BoundedQueueHandler(self._queue)
+        self._handlers = handlers
+        self._thread: Optional[threading.Thread] = None
+        self._reported_dropped = 0
+
+    @property
+    def dropped(self) -> int:
+        return self.handler.dropped
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="floodgate-log-writer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Write any queued records and stop the writer thread."""
+        if self._thread is None:
+            return
+        # Wait for room rather than dropping the sentinel
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        if callable(self._handlers):
+            try:
+                self._handlers = self._handlers()
+            except Exception:
+                # Don't lose the records, stderr is better than nothing
+                print("Failed to create log handlers", file=sys.stderr)
+                traceback.print_exc()
+                self._handlers = [logging.lastResort]
+
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < _MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = []
+            for record in batch:
+                if record is None:
+                    stopping = True
+                else:
+                    records.append(record)
+            dropped = self.handler.dropped - self._reported_dropped
+            if dropped:
+                self._reported_dropped += dropped
+                records.append(self._make_dropped_record(dropped))
+            self._write(records)
+
+    def _write(self, records: list[logging.LogRecord]):
+        for handler in self._handlers:
+            batched = isinstance(handler, BatchedTimedRotatingFileHandler)
+            if batched:
+                handler.begin_batch()
+            try:
+                for record in records:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+            finally:
+                if batched:
+                    handler.end_batch()
+
+    @staticmethod
+    def _make_dropped_record(dropped: int) -> logging.LogRecord:
+        return logging.LogRecord(
+            "floodgate.logs",
+            logging.WARNING,
+            __file__,
+            0,
+            f"Dropped {dropped} log record(s) because the log queue was full",
+            None,
+            None,
+        )
@@ -0,0 +1,251 @@
+import bisect
+from collections import defaultdict
+from collections.abc import Hashable
+import logging
+from typing import TYPE_CHECKING, Callable, Optional, Union
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+__all__ = [
+    "Counter",
+    "Histogram",
+    "Collector",
+    "MetricsRegistry",
+    "MetricsServer",
+    "FloodgateMetrics",
+]
+
+logger = logging.getLogger("floodgate.metrics")
+
+T_Values = Union[float, dict[Hashable, float]]
+
+# Seconds, for latencies measured in the event loop
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Finer at the low end, since transitions should run within milliseconds
+TRANSITION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, 60)
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in labels.items())
+    return f"{{{pairs}}}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_: str, label: Optional[str] = None):
+        self.name = name
+        self.help = help_
+        self.label = label
+
+    def _labels(self, key: Hashable) -> dict[str, str]:
+        return {} if self.label is None else {self.label: str(key)}
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """
+    A counter with at most one label. It's only updated from the event loop
+    thread, so increments are plain dict updates with no locking.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_: str, label: Optional[str] = None):
+        super().__init__(name, help_, label)
+        self.values: defaultdict[Hashable, float] = defaultdict(int)
+
+    def inc(self, key: Hashable = None, amount: float = 1):
+        self.values[key] += amount
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for key, value in self.values.items():
+            labels = _format_labels(self._labels(key))
+            lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """A histogram with at most one label, updated like Counter."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_: str,
+        label: Optional[str] = None,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help_, label)
+        self.buckets = buckets
+        # Per key: [count in each bucket (not cumulative)..., +Inf count, sum]
+        self._series: dict[Hashable, list[float]] = {}
+
+    def observe(self, value: float, key: Hashable = None):
+        try:
+            series = self._series[key]
+        except KeyError:
+            series = self._series[key] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for key, series in self._series.items():
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), series):
+                cumulative += count
+                bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            formatted = _format_labels(labels)
+            lines.append(f"{self.name}_sum{formatted} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{formatted} {cumulative}")
+        return lines
+
+
+class Collector(_Metric):
+    """
+    A counter or gauge whose values are read from `fn` at scrape time, for
+    numbers that are already tracked elsewhere. `fn` returns a single value
+    or a dict of label values to values, or None to skip the metric.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help_: str,
+        fn: Callable[[], Optional[T_Values]],
+        kind: str = "gauge",
+        label: Optional[str] = None,
+    ):
+        super().__init__(name, help_, label)
+        self.kind = kind
+        self.fn = fn
+
+    def render(self) -> list[str]:
+        values = self.fn()
+        if values is None:
+            return []
+        lines = super().render()
+        if not isinstance(values, dict):
+            values = {None: values}
+        for key, value in values.items():
+            labels = _format_labels(self._labels(key))
+            lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Add a metric, replacing any with the same name."""
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class FloodgateMetrics:
+    """The metrics recorded by the bot and gates as they run."""
+
+    def __init__(self):
+        self.registry = MetricsRegistry()
+        self.messages_seen = self.registry.register(
+            Counter(
+                "floodgate_messages_seen_total",
+                "Messages received in floodgate channels",
+                label="channel_id",
+            )
+        )
+        self.delete_latency = self.registry.register(
+            Histogram(
+                "floodgate_delete_latency_seconds",
+                "Time from queueing a leaked message to deleting it",
+                label="channel_id",
+            )
+        )
+        self.transition_lateness = self.registry.register(
+            Histogram(
+                "floodgate_transition_lateness_seconds",
+                "How long after the planned time gates opened or closed",
+                label="transition",
+                buckets=TRANSITION_BUCKETS,
+            )
+        )
+        self.announcement_lag = self.registry.register(
+            Histogram(
+                "floodgate_announcement_lag_seconds",
+                "Time from a gate transition until its announcement was sent",
+            )
+        )
+
+    def collect(
+        self,
+        name: str,
+        help_: str,
+        fn: Callable[[], Optional[T_Values]],
+        kind: str = "gauge",
+        label: Optional[str] = None,
+    ):
+        """Add a metric read from existing state at scrape time."""
+        self.registry.register(Collector(name, help_, fn, kind, label))
+
+
+class MetricsServer:
+    """Serves a registry in the Prometheus text format over HTTP."""
+
+    def __init__(self, registry: MetricsRegistry, host: str, port: int):
+        self._registry = registry
+        self.host = host
+        self.port = port
+        self._runner: Optional["web.AppRunner"] = None
+
+    async def start(self):
+        if self._runner is not None:
+            return
+        # Only imported when metrics are enabled, it isn't needed to connect
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, self.host, self.port)
+        await site.start()
+        self._runner = runner
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+
+        return web.Response(
+            text=self._registry.render(),
+            content_type="text/plain",
+            headers={"X-Content-Type-Options": "nosniff"},
+            charset="utf-8",
+        )
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import sys
+from typing import TYPE_CHECKING, Optional
+import weakref
+
+from pendulum import Duration
+from pendulum.tz.timezone import Timezone
+
+if TYPE_CHECKING:
+    from floodgate.config import Config
+
+    # noinspection PyProtectedMember
+    ChannelModel = Config._Bot._Modules._Floodgate._Channel
+    # noinspection PyProtectedMember
+    GateOpenModel = ChannelModel._GateOpen
+
+__all__ = ["GateRule", "GateChannel", "freeze_channels"]
+
+
+def _optional_tuple(items: Optional[list]) -> Optional[tuple]:
+    return None if items is None else tuple(items)
+
+
+class GateRule:
+    """
+    A channel's validated `gate_open` config. Rules are interned, so
+    channels with the same rule share one instance, and shouldn't be
+    modified.
+    """
+
+    __slots__ = (
+        "timezone",
+        "duration",
+        "time",
+        "time_window_start",
+        "time_window_end",
+        "weekdays",
+        "skip_dates",
+        "key",
+        "hash",
+        "__weakref__",
+    )
+
+    # Rule key -> the rule, for as long as something uses it
+    _interned: weakref.WeakValueDictionary[tuple, GateRule] = (
+        weakref.WeakValueDictionary()
+    )
+
+    def __init__(
+        self,
+        timezone: Timezone,
+        duration: Duration,
+        time: Optional[tuple[dt.time, ...]],
+        time_window_start: Optional[dt.time],
+        time_window_end: Optional[dt.time],
+        weekdays: Optional[tuple[str, ...]],
+        skip_dates: tuple[dt.date, ...],
+        hash: str,
+    ):
+        """
+        :param hash: identifies the rule in saved gate state. Taken from the
+            validated config so saved state carries over.
+        """
+        self.timezone = timezone
+        self.duration = duration
+        self.time = time
+        self.time_window_start = time_window_start
+        self.time_window_end = time_window_end
+        self.weekdays = weekdays
+        self.skip_dates = skip_dates
+        # Equal rules have equal keys, even though timezones are only equal
+        # to themselves
+        self.key = self._key(
+            timezone,
+            duration,
+            time,
+            time_window_start,
+            time_window_end,
+            weekdays,
+            skip_dates,
+        )
+        self.hash = hash
+
+    @staticmethod
+    def _key(
+        timezone: Timezone,
+        duration: Duration,
+        time: Optional[tuple[dt.time, ...]],
+        time_window_start: Optional[dt.time],
+        time_window_end: Optional[dt.time],
+        weekdays: Optional[tuple[str, ...]],
+        skip_dates: tuple[dt.date, ...],
+    ) -> tuple:
+        return (
+            timezone.name,
+            time,
+            time_window_start,
+            time_window_end,
+            duration.total_seconds(),
+            weekdays,
+            skip_dates,
+        )
+
+    @classmethod
+    def freeze(cls, gate_open: GateOpenModel) -> GateRule:
+        """Get the interned rule for a validated `gate_open` config."""
+        fields = (
+            gate_open.timezone,
+            gate_open.duration,
+            _optional_tuple(gate_open.time),
+            gate_open.time_window_start,
+            gate_open.time_window_end,
+            _optional_tuple(gate_open.weekdays),
+            tuple(gate_open.skip_dates),
+        )
+        rule = cls._interned.get(cls._key(*fields))
+        if rule is None:
+            config_hash = hashlib.sha1(repr(gate_open).encode()).hexdigest()
+            rule = cls._intern(*fields, config_hash)
+        return rule
+
+    @classmethod
+    def _intern(cls, *args) -> GateRule:
+        rule = cls(*args)
+        return cls._interned.setdefault(rule.key, rule)
+
+    def __reduce__(self):
+        # Rules unpickled from a cached config are shared with fresh ones
+        return self._intern, (
+            self.timezone,
+            self.duration,
+            self.time,
+            self.time_window_start,
+            self.time_window_end,
+            self.weekdays,
+            self.skip_dates,
+            self.hash,
+        )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, GateRule):
+            return NotImplemented
+        return self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        return f"GateRule{self.key!r}"
+
+
+class GateChannel:
+    """
+    A floodgate channel's validated config, keeping only what its gate
+    reads. Message strings are interned since most channels share them.
+    """
+
+    __slots__ = ("gate_open", "open_message", "close_message", "mode", "roles")
+
+    def __init__(
+        self,
+        gate_open: GateRule,
+        open_message: str,
+        close_message: str,
+        mode: str = "delete",
+        roles: tuple[int, ...] = (),
+    ):
+        self.gate_open = gate_open
+        self.open_message = sys.intern(open_message)
+        self.close_message = sys.intern(close_message)
+        self.mode = sys.intern(mode)
+        self.roles = tuple(roles)
+
+    @classmethod
+    def freeze(cls, channel: ChannelModel) -> GateChannel:
+        """Get the record for a validated channel config."""
+        return cls(
+            GateRule.freeze(channel.gate_open),
+            channel.messages.open,
+            channel.messages.close,
+            channel.mode,
+            channel.roles,
+        )
+
+    def __reduce__(self):
+        # Through __init__ so the strings are interned again
+        return self.__class__, (
+            self.gate_open,
+            self.open_message,
+            self.close_message,
+            self.mode,
+            self.roles,
+        )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, GateChannel):
+            return NotImplemented
+        return (
+            self.gate_open == other.gate_open
+            and self.open_message == other.open_message
+            and self.close_message == other.close_message
+            and self.mode == other.mode
+            and self.roles == other.roles
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"GateChannel(gate_open={self.gate_open!r}, "
+            f"open_message={self.open_message!r}, "
+            f"close_message={self.close_message!r}, mode={self.mode!r}, "
+            f"roles={self.roles!r})"
+        )
+
+
+def freeze_channels(channels: dict[int, ChannelModel]) -> dict[int, GateChannel]:
+    """Turn validated channel configs into the records gates are run from."""
+    return {
+        channel_id: GateChannel.freeze(channel)
+        for channel_id, channel in channels.items()
+    }
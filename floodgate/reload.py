@@ -0,0 +1,149 @@
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+from pathlib import Path
+import struct
+from typing import Any, Callable, Optional
+
+__all__ = ["ConfigWatcher"]
+
+logger = logging.getLogger("floodgate.reload")
+
+# From <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class ConfigWatcher:
+    """
+    Calls `callback` when a file changes.
+
+    On Linux the file's directory is watched with inotify (editors often
+    replace files instead of writing to them). Elsewhere, or if inotify
+    can't be set up, the file's mtime and size are polled. Bursts of changes
+    within `debounce` seconds only trigger one call.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        path: Path,
+        callback: Callable[[], Any],
+        poll_interval: float = 5,
+        debounce: float = 0.5,
+    ):
+        self._loop = loop
+        self._path = path
+        self._callback = callback
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+
+        self._inotify_fd: Optional[int] = None
+        self._poll_task: Optional[asyncio.Task] = None
+        self._debounce_timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def mode(self) -> Optional[str]:
+        if self._inotify_fd is not None:
+            return "inotify"
+        if self._poll_task is not None:
+            return "polling"
+        return None
+
+    def start(self):
+        if self.mode is not None:
+            return
+        try:
+            self._start_inotify()
+        except OSError as e:
+            logger.info(f"inotify unavailable, polling config for changes ({e})")
+            self._poll_task = self._loop.create_task(self._poll())
+
+    def stop(self):
+        if self._inotify_fd is not None:
+            self._loop.remove_reader(self._inotify_fd)
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+        if self._debounce_timer is not None:
+            self._debounce_timer.cancel()
+            self._debounce_timer = None
+
+    def _start_inotify(self):
+        library = ctypes.util.find_library("c")
+        if library is None:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(library, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("libc has no inotify support")
+
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = libc.inotify_add_watch(
+            fd,
+            os.fsencode(self._path.parent),
+            _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE,
+        )
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, "inotify_add_watch failed")
+
+        self._inotify_fd = fd
+        self._loop.add_reader(fd, self._on_inotify_readable)
+
+    def _on_inotify_readable(self):
+        name = os.fsencode(self._path.name)
+        changed = False
+        while True:
+            try:
+                data = os.read(self._inotify_fd, 4096)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                __, __, __, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                event_name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if event_name == name:
+                    changed = True
+        if changed:
+            self._on_change()
+
+    def _stat(self) -> Optional[tuple[int, int]]:
+        try:
+            stat = self._path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    async def _poll(self):
+        last = self._stat()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            current = self._stat()
+            if current != last:
+                last = current
+                self._on_change()
+
+    def _on_change(self):
+        if self._debounce_timer is not None:
+            self._debounce_timer.cancel()
+        self._debounce_timer = self._loop.call_later(self.debounce, self._fire)
+
+    def _fire(self):
+        self._debounce_timer = None
+        try:
+            self._callback()
+        except Exception as e:
+            logger.error("Exception raised by config change callback", exc_info=e)
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from typing import Optional
+
+from floodgate.config import Config
+
+__all__ = ["LoopLagMonitor", "configure_loop", "install_event_loop_policy"]
+
+logger = logging.getLogger("floodgate.runtime")
+
+
+class LoopLagMonitor:
+    """
+    Samples how late the event loop runs a timer. A timer that fires late
+    means a callback blocked the loop, so lateness over `threshold` seconds
+    is logged. Blocks that start and end between samples go unnoticed, which
+    is the price of only waking every `interval` seconds.
+    """
+
+    def __init__(
+        self, loop: asyncio.AbstractEventLoop, interval: float, threshold: float
+    ):
+        self._loop = loop
+        self.interval = interval
+        self.threshold = threshold
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._expected = 0.0
+
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.slow_count = 0
+
+    def start(self):
+        if self._handle is None:
+            self._schedule()
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _schedule(self):
+        self._expected = self._loop.time() + self.interval
+        self._handle = self._loop.call_at(self._expected, self._sample)
+
+    def _sample(self):
+        lag = self._loop.time() - self._expected
+        self.last_lag = lag
+        if lag > self.max_lag:
+            self.max_lag = lag
+        if lag > self.threshold:
+            self.slow_count += 1
+            logger.warning(f"Event loop was blocked for at least {lag * 1000:.0f} ms")
+        self._schedule()
+
+
+def install_event_loop_policy(config: Config._Runtime) -> str:
+    """
+    Use uvloop's event loop if it's enabled and installed. This has to run
+    before the bot creates its loop.
+
+    :return: the name of the event loop implementation in use
+    """
+    if not config.uvloop:
+        return "asyncio"
+    try:
+        import uvloop
+    except ImportError:
+        logger.info("uvloop isn't installed, using the asyncio event loop")
+        return "asyncio"
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return "uvloop"
+
+
+def configure_loop(
+    loop: asyncio.AbstractEventLoop, config: Config._Runtime
+) -> Optional[LoopLagMonitor]:
+    """
+    Apply the runtime profile to a loop. The debug profile turns on asyncio's
+    debug mode, which logs every callback slower than the threshold but slows
+    down every task and callback. The production profile leaves debug mode
+    off and starts a sampling lag monitor instead.
+
+    :return: the lag monitor, if one was started
+    """
+    threshold = config.slow_callback_ms / 1000
+    if config.profile == "debug":
+        loop.set_debug(True)
+        loop.slow_callback_duration = threshold
+        return None
+
+    loop.set_debug(False)
+    monitor = LoopLagMonitor(loop, config.lag_sample_interval, threshold)
+    monitor.start()
+    return monitor
@@ -0,0 +1,46 @@
+from typing import Union
+
+__all__ = ["parse_shard_ids", "format_shard_ids", "shard_of"]
+
+
+def parse_shard_ids(shard_ids: Union[str, int, list[int]]) -> list[int]:
+    """
+    Parse shard IDs given as a list, or as a string of comma separated IDs
+    and inclusive ranges like `0-3,8`.
+
+    :return: the sorted, distinct shard IDs
+    :raises ValueError: if they can't be parsed or one is negative
+    """
+    if isinstance(shard_ids, int):
+        shard_ids = [shard_ids]
+    elif isinstance(shard_ids, str):
+        parsed = []
+        for part in shard_ids.split(","):
+            first, __, last = part.strip().partition("-")
+            if not last:
+                last = first
+            parsed.extend(range(int(first), int(last) + 1))
+        shard_ids = parsed
+    if not shard_ids:
+        raise ValueError("At least one shard ID is required")
+    if min(shard_ids) < 0:
+        raise ValueError("Shard IDs can't be negative")
+    return sorted(set(shard_ids))
+
+
+def format_shard_ids(shard_ids: list[int]) -> str:
+    """Format shard IDs like `parse_shard_ids` takes them, e.g. `0-3,8`."""
+    ranges = []
+    for shard_id in sorted(shard_ids):
+        if ranges and ranges[-1][1] == shard_id - 1:
+            ranges[-1][1] = shard_id
+        else:
+            ranges.append([shard_id, shard_id])
+    return ",".join(
+        str(first) if first == last else f"{first}-{last}" for first, last in ranges
+    )
+
+
+def shard_of(guild_id: int, shard_count: int) -> int:
+    """Get the shard that Discord sends a guild's events to."""
+    return (guild_id >> 22) % shard_count
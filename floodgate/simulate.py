@@ -0,0 +1,291 @@
+"""
+Run the gates in a config on a virtual clock to preview their schedule.
+
+The real `Gate` cog, scheduler and controllers run on an event loop whose
+clock only moves when there's nothing left to do, jumping straight to the
+next timer. A week of openings, closings and midnight rollovers takes a
+fraction of a second, and nothing is sent to Discord or saved.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+import selectors
+import time
+from typing import Optional
+
+import discord
+import pendulum as pen
+
+from floodgate.config import Config
+from floodgate.dispatch import RestDispatcher
+from floodgate.gate.cog import ClosedChannels, Gate
+from floodgate.metrics import FloodgateMetrics
+from floodgate.records import GateChannel
+
+__all__ = [
+    "VirtualClock",
+    "VirtualEventLoop",
+    "SimulationResult",
+    "simulate",
+    "print_simulation",
+]
+
+FloodgateConfig = Config._Bot._Modules._Floodgate
+DAY = 24 * 60 * 60
+
+
+class VirtualClock:
+    """A clock that only moves when it's told to."""
+
+    def __init__(self, start: float):
+        self._origin = start
+        # Kept apart from the origin so that the event loop's tiny timeouts
+        # aren't lost to rounding at Unix timestamp magnitudes
+        self._elapsed = 0.0
+
+    def time(self) -> float:
+        """Get the virtual Unix time."""
+        return self._origin + self._elapsed
+
+    def monotonic(self) -> float:
+        """Get the virtual time since the clock started."""
+        return self._elapsed
+
+    def advance(self, seconds: float):
+        self._elapsed += seconds
+
+
+class _FastForwardSelector(selectors.DefaultSelector):
+    """Polls instead of blocking, advancing the clock by the time it would block."""
+
+    def __init__(self, clock: VirtualClock):
+        super().__init__()
+        self._clock = clock
+        # Executor jobs in flight, which take real time to finish
+        self.pending_jobs = 0
+
+    def select(self, timeout: Optional[float] = None):
+        if self.pending_jobs and timeout != 0:
+            # Wait for a worker thread to wake the loop rather than skipping
+            # ahead, so e.g. channel files are loaded before anything runs
+            return super().select(None)
+        events = super().select(0)
+        if not events:
+            if timeout is None:
+                raise RuntimeError("Nothing is scheduled, the simulation would hang")
+            self._clock.advance(timeout)
+        return events
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    """
+    An event loop running on a :class:`VirtualClock`. Whenever every task
+    is waiting, the clock skips ahead to the next timer, unless a job is
+    still running in an executor.
+    """
+
+    def __init__(self, clock: VirtualClock):
+        self._fast_forward = _FastForwardSelector(clock)
+        super().__init__(self._fast_forward)
+        self.virtual_clock = clock
+
+    def time(self) -> float:
+        return self.virtual_clock.monotonic()
+
+    def run_in_executor(self, executor, func, *args) -> asyncio.Future:
+        future = super().run_in_executor(executor, func, *args)
+        self._fast_forward.pending_jobs += 1
+        future.add_done_callback(self._on_job_done)
+        return future
+
+    def _on_job_done(self, future: asyncio.Future):
+        self._fast_forward.pending_jobs -= 1
+
+
+class _TimelineRecorder(ClosedChannels):
+    """Records every gate's closed/open changes with the time they happened."""
+
+    __slots__ = ("_clock", "recording", "events")
+
+    def __init__(self, clock: VirtualClock):
+        super().__init__()
+        self._clock = clock
+        self.recording = False
+        # (Unix time, channel ID, "open" or "close")
+        self.events: list[tuple[float, int, str]] = []
+
+    def add(self, channel_id: int):
+        if self.recording and channel_id not in self.ids:
+            self.events.append((self._clock.time(), channel_id, "close"))
+        super().add(channel_id)
+
+    def discard(self, channel_id: int):
+        if self.recording and channel_id in self.ids:
+            self.events.append((self._clock.time(), channel_id, "open"))
+        super().discard(channel_id)
+
+
+class _SimulatedGuild:
+    id = 0
+
+    def __init__(self):
+        self.default_role = discord.Object(id=0)
+
+    def get_role(self, role_id: int) -> discord.Object:
+        return discord.Object(id=role_id)
+
+
+class _SimulatedChannel:
+    def __init__(self, channel_id: int, guild: _SimulatedGuild):
+        self.id = channel_id
+        self.guild = guild
+        self.sent = 0
+        self._overwrites: dict[int, discord.PermissionOverwrite] = {}
+
+    def overwrites_for(self, target) -> discord.PermissionOverwrite:
+        return self._overwrites.get(target.id, discord.PermissionOverwrite())
+
+    async def set_permissions(self, target, *, overwrite, reason=None):
+        self._overwrites[target.id] = overwrite
+
+    async def send(self, msg: str):
+        self.sent += 1
+
+
+class _SimulatedBot:
+    """The parts of the bot the Gate cog uses, with no connection to Discord."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.dispatcher = RestDispatcher(loop)
+        self.metrics = FloodgateMetrics()
+        self.user = discord.Object(id=0)
+        self.channels: dict[int, _SimulatedChannel] = {}
+        self._guild = _SimulatedGuild()
+
+    def get_channel(self, channel_id: int) -> _SimulatedChannel:
+        try:
+            return self.channels[channel_id]
+        except KeyError:
+            channel = self.channels[channel_id] = _SimulatedChannel(
+                channel_id, self._guild
+            )
+            return channel
+
+    async def wait_until_ready(self):
+        # The simulation schedules the gates itself, and there's no history
+        # to sweep
+        await asyncio.Event().wait()
+
+
+@dataclass
+class SimulationResult:
+    start: float
+    days: int
+    # The channels that were gated, from the config and any channel files
+    channels: dict[int, GateChannel] = field(default_factory=dict)
+    # (Unix time, channel ID, "open" or "close"), in order
+    events: list[tuple[float, int, str]] = field(default_factory=list)
+    announcements: int = 0
+    # Process CPU time spent running the simulated days, in seconds
+    cpu_time: float = 0.0
+    # The most any transition ran after its planned time, in virtual seconds
+    max_error: float = 0.0
+
+    @property
+    def cpu_per_day(self) -> float:
+        return self.cpu_time / self.days if self.days else 0.0
+
+
+async def _simulate(
+    config: FloodgateConfig, days: int, clock: VirtualClock
+) -> SimulationResult:
+    loop = asyncio.get_running_loop()
+    bot = _SimulatedBot(loop)
+    recorder = _TimelineRecorder(clock)
+    gate = Gate(bot, config, clock=clock.time, closed_channels=recorder)
+    result = SimulationResult(clock.time(), days)
+    try:
+        await gate.schedule_gates()
+        recorder.recording = True
+
+        cpu_start = time.process_time()
+        await asyncio.sleep(days * DAY)
+        result.cpu_time = time.process_time() - cpu_start
+    finally:
+        gate.cog_unload()
+
+    result.channels = dict(gate._channels)
+    result.events = recorder.events
+    result.announcements = sum(channel.sent for channel in bot.channels.values())
+    result.max_error = gate._scheduler.error.max
+    return result
+
+
+def simulate(
+    config: FloodgateConfig, days: int = 7, start: Optional[float] = None
+) -> SimulationResult:
+    """
+    Run a config's gates for `days` days of virtual time.
+
+    :param config: the floodgate module's config. Its state file and raw
+        event setting are ignored.
+    :param days: how many days to simulate
+    :param start: the Unix time to start at (default now)
+    """
+    config = config.copy(update={"state_file": None, "raw_events": False})
+    clock = VirtualClock(time.time() if start is None else start)
+    loop = VirtualEventLoop(clock)
+    try:
+        return loop.run_until_complete(_simulate(config, days, clock))
+    finally:
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.close()
+
+
+def print_simulation(result: SimulationResult, timeline: bool = True):
+    """Print a simulation's timeline in each gate's timezone, then its stats."""
+    timezones = {
+        channel_id: channel.gate_open.timezone
+        for channel_id, channel in result.channels.items()
+    }
+    open_since: dict[int, float] = {}
+    open_time: dict[int, float] = {channel_id: 0.0 for channel_id in timezones}
+    openings: dict[int, int] = {channel_id: 0 for channel_id in timezones}
+
+    for timestamp, channel_id, transition in result.events:
+        if timeline:
+            local = pen.from_timestamp(timestamp, tz=timezones[channel_id])
+            print(
+                f"{local.format('ddd YYYY-MM-DD HH:mm:ss')} "
+                f"{timezones[channel_id].name:<20} {transition:<5} {channel_id}"
+            )
+        if transition == "open":
+            openings[channel_id] += 1
+            open_since[channel_id] = timestamp
+        elif channel_id in open_since:
+            open_time[channel_id] += timestamp - open_since.pop(channel_id)
+
+    end = result.start + result.days * DAY
+    for channel_id, since in open_since.items():
+        open_time[channel_id] += end - since
+
+    if timeline and result.events:
+        print()
+    print(f"Simulated {result.days} day(s) of {len(timezones)} gate(s)")
+    for channel_id in timezones:
+        print(
+            f"  {channel_id}: opened {openings[channel_id]} time(s), "
+            f"open for {open_time[channel_id] / 60:.1f} min"
+        )
+    print(
+        f"{len(result.events)} transitions, {result.announcements} announcements, "
+        f"max lateness {result.max_error * 1000:.3f} ms"
+    )
+    print(
+        f"Scheduler CPU time: {result.cpu_time * 1000:.1f} ms "
+        f"({result.cpu_per_day * 1000:.2f} ms per simulated day)"
+    )
@@ -0,0 +1,172 @@
+import asyncio
+from collections import Counter
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Callable, Optional
+
+from floodgate.sharding import format_shard_ids
+
+__all__ = ["StatusServer", "query_status", "format_status"]
+
+logger = logging.getLogger("floodgate.status")
+
+# Configured channels listed in a status summary before the rest are counted
+LISTED_CHANNELS = 10
+
+
+class StatusServer:
+    """
+    Serves a process's status on a Unix socket, so the processes running a
+    bot's shards can report on each other. Each connection is sent the
+    status as a line of JSON and closed.
+
+    :param path: the socket to serve on, usually one per process in a shared
+        directory (see `query_status`)
+    :param status: gets the process's status
+    """
+
+    def __init__(self, path: Path, status: Callable[[], dict]):
+        self.path = path
+        self._status = status
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        if self._server is not None:
+            return
+        if not hasattr(asyncio, "start_unix_server"):
+            raise OSError("Unix sockets aren't supported on this platform")
+        if self.path.exists() and "error" not in await _query(self.path, 1):
+            raise OSError(f"Another process is serving status on {self.path}")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._server = await asyncio.start_unix_server(self._handle, self.path)
+        # The status isn't secret, but only the bot's user needs it
+        os.chmod(self.path, 0o600)
+        logger.info(f"Serving status on {self.path}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            self.path.unlink(missing_ok=True)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            writer.write(json.dumps(self._status()).encode() + b"\n")
+            await writer.drain()
+        except Exception:
+            logger.error("Failed to send status", exc_info=True)
+        finally:
+            writer.close()
+
+
+async def _query(path: Path, timeout: float) -> dict:
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(path), timeout
+        )
+        try:
+            line = await asyncio.wait_for(reader.readline(), timeout)
+        finally:
+            writer.close()
+        status = json.loads(line)
+    except asyncio.TimeoutError:
+        return {"socket": path.name, "error": "timed out"}
+    except (OSError, ValueError) as e:
+        return {"socket": path.name, "error": str(e) or type(e).__name__}
+    status["socket"] = path.name
+    return status
+
+
+async def query_status(directory: Path, timeout: float = 2) -> list[dict]:
+    """
+    Get the status of every process serving it in a directory. Processes
+    that don't answer (e.g. the socket of one that crashed) are given as
+    `{"socket": ..., "error": ...}`.
+    """
+    try:
+        paths = sorted(directory.glob("*.sock"))
+    except OSError:
+        return []
+    return list(await asyncio.gather(*(_query(path, timeout) for path in paths)))
+
+
+def _format_ids(ids: list[int]) -> str:
+    listed = ", ".join(map(str, ids[:LISTED_CHANNELS]))
+    if len(ids) > LISTED_CHANNELS:
+        listed += f" (+{len(ids) - LISTED_CHANNELS} more)"
+    return listed
+
+
+def _format_process(status: dict) -> str:
+    shard_ids = status["shard_ids"]
+    shards = (
+        "all shards" if shard_ids is None else f"shards {format_shard_ids(shard_ids)}"
+    )
+    line = f"pid {status['pid']} ({shards}): {status['guilds']} guild(s)"
+    gates = status["gates"]
+    if gates is None:
+        line += ", gates not scheduled yet"
+    else:
+        line += (
+            f", {gates['gates']} gate(s) ({gates['closed']} closed), "
+            f"deletion backlog {gates['backlog']}"
+        )
+    latencies = [latency for latency in status["latencies"].values() if latency]
+    if latencies:
+        line += f", latency {max(latencies) * 1000:.0f} ms"
+    return line
+
+
+def format_status(statuses: list[dict]) -> str:
+    """
+    Summarize the status of the processes running a bot: each process, the
+    totals, and any problems seen across them (shards no process runs or
+    runs twice, and configured channels that no process could find).
+    """
+    if not statuses:
+        return "No processes are serving status"
+    running = [status for status in statuses if "error" not in status]
+    lines = [_format_process(status) for status in running]
+    lines.extend(
+        f"{status['socket']}: not responding ({status['error']})"
+        for status in statuses
+        if "error" in status
+    )
+
+    gates = [status["gates"] for status in running if status["gates"] is not None]
+    lines.append(
+        f"total: {len(running)} process(es), "
+        f"{sum(status['guilds'] for status in running)} guild(s), "
+        f"{sum(g['gates'] for g in gates)} gate(s) "
+        f"({sum(g['closed'] for g in gates)} closed)"
+    )
+
+    # Shards are counted twice if two processes run them, and left out if
+    # only a process that isn't responding does
+    shard_count = max((status["shard_count"] or 0 for status in running), default=0)
+    seen: Counter[int] = Counter()
+    for status in running:
+        shard_ids = status["shard_ids"]
+        seen.update(range(shard_count) if shard_ids is None else shard_ids)
+    duplicated = sorted(shard_id for shard_id, count in seen.items() if count > 1)
+    missing = sorted(set(range(shard_count)) - seen.keys())
+    if duplicated:
+        lines.append(
+            f"shards {format_shard_ids(duplicated)} are run by more than one process"
+        )
+    if missing:
+        lines.append(f"shards {format_shard_ids(missing)} aren't running")
+
+    if gates and len(gates) == len(running) and not missing:
+        # Every guild is in some process, so channels none of them found
+        # don't exist or the bot can't see them
+        unowned = set.intersection(*(set(g["unowned"]) for g in gates))
+        if unowned:
+            lines.append(
+                f"{len(unowned)} configured channel(s) can't be found: "
+                f"{_format_ids(sorted(unowned))}"
+            )
+    return "\n".join(lines)
@@ -0,0 +1,60 @@
+import datetime as dt
+
+import pendulum as pen
+import pytest
+
+from floodgate.common.time import *
+
+
+@pytest.mark.parametrize(
+    "timezone, day",
+    [
+        ("UTC", pen.date(2024, 6, 1)),
+        ("America/New_York", pen.date(2024, 6, 1)),
+        # DST starts and ends
+        ("America/New_York", pen.date(2024, 3, 10)),
+        ("Europe/Berlin", pen.date(2024, 10, 27)),
+    ],
+)
+def test_timestamp_matches_pendulum(timezone: str, day: pen.Date):
+    tz = pen.timezone(timezone)
+    context = TimeContext()
+    for time in (pen.time(0, 0), pen.time(3, 30), pen.time(12, 0, 15, 500)):
+        expected = pen.instance(dt.datetime.combine(day, time), tz=tz).timestamp()
+        assert context.timestamp(tz, day, time) == pytest.approx(expected)
+
+
+def test_today_uses_the_snapshot():
+    now = pen.datetime(2024, 6, 1, 23, 30, tz="UTC")
+    context = TimeContext(now)
+    assert context.today(pen.timezone("UTC")) == pen.date(2024, 6, 1)
+    assert context.today(pen.timezone("Asia/Tokyo")) == pen.date(2024, 6, 2)
+
+
+def test_day_bounds_span_dst_change():
+    tz = pen.timezone("America/New_York")
+    start, end = TimeContext().day_bounds(tz, pen.date(2024, 3, 10))
+    assert end - start == 23 * 60 * 60
+
+
+def test_seeded_random_is_deterministic():
+    day = pen.date(2024, 6, 1)
+    a = seeded_random(b"salt", 1234, day)
+    assert a == seeded_random(b"salt", 1234, day)
+    assert 0 <= a < 1
+    assert a != seeded_random(b"salt", 1234, day.add(days=1))
+    assert a != seeded_random(b"salt", 1235, day)
+    assert a != seeded_random(b"other salt", 1234, day)
+
+
+def test_seeded_random_times_match_single_draws():
+    start, end = pen.time(10), pen.time(22)
+    days = [pen.date(2024, 6, 1).add(days=i) for i in range(7)]
+    times = seeded_random_times(b"salt", [1, 2], days, start, end)
+    assert times.keys() == {1, 2}
+    for channel_id, channel_times in times.items():
+        assert channel_times == [
+            random_time(start, end, seeded_random(b"salt", channel_id, day))
+            for day in days
+        ]
+        assert all(start <= time <= end for time in channel_times)
@@ -0,0 +1,68 @@
+import asyncio
+
+from floodgate.gate.announce import AnnouncementDispatcher
+
+
+def test_guilds_take_turns():
+    async def main():
+        announcer = AnnouncementDispatcher(asyncio.get_running_loop(), 1)
+        order = []
+
+        def transition(name: str):
+            async def run():
+                order.append(name)
+
+            return run
+
+        for name in ("a1", "a2", "a3"):
+            announcer.announce(1, transition(name))
+        announcer.announce(2, transition("b1"))
+        await asyncio.sleep(0.01)
+        return order, announcer
+
+    order, announcer = asyncio.run(main())
+    assert order == ["a1", "b1", "a2", "a3"]
+    assert announcer.completed == 4
+    assert announcer.lag.count == 4
+
+
+def test_concurrency_is_capped():
+    async def main():
+        announcer = AnnouncementDispatcher(asyncio.get_running_loop(), 2)
+        running = 0
+        most = 0
+
+        async def transition():
+            nonlocal running, most
+            running += 1
+            most = max(most, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        for guild_id in range(6):
+            announcer.announce(guild_id, transition)
+        await asyncio.sleep(0)
+        assert announcer.queued == 4
+        await asyncio.sleep(0.1)
+        return most, announcer.completed
+
+    assert asyncio.run(main()) == (2, 6)
+
+
+def test_failed_transition_does_not_stop_others():
+    async def main():
+        announcer = AnnouncementDispatcher(asyncio.get_running_loop(), 1)
+        done = []
+
+        async def fail():
+            raise RuntimeError("boom")
+
+        async def succeed():
+            done.append(True)
+
+        announcer.announce(1, fail)
+        announcer.announce(1, succeed)
+        await asyncio.sleep(0.01)
+        return announcer.failed, done
+
+    assert asyncio.run(main()) == (1, [True])
@@ -0,0 +1,95 @@
+import asyncio
+from pathlib import Path
+
+from floodgate.gate.channel_files import ChannelFiles
+from floodgate.gate.cog import Gate
+from tests.helpers import FakeBot, make_config
+
+
+def write_channels(path: Path, channel_ids: list[int], time: str = "23:59"):
+    path.write_text(
+        "".join(
+            f"{channel_id}:\n"
+            f"  gate_open: {{timezone: UTC, time: '{time}', duration: 5 min}}\n"
+            f"  messages: {{open: open, close: close}}\n"
+            for channel_id in channel_ids
+        )
+    )
+
+
+async def load_all(files: ChannelFiles) -> list[str]:
+    loop = asyncio.get_running_loop()
+    return [path.name async for path, __ in files.load(loop)]
+
+
+def test_bad_files_are_skipped_and_keep_their_channels(tmp_path: Path):
+    write_channels(tmp_path / "a.yml", [10, 11])
+    write_channels(tmp_path / "b.yml", [20])
+    (tmp_path / "notes.txt").write_text("not a channel file")
+    files = ChannelFiles(tmp_path)
+    assert asyncio.run(load_all(files)) == ["a.yml", "b.yml"]
+
+    (tmp_path / "b.yml").write_text("20: {gate_open: {timezone: Nowhere}}")
+    write_channels(tmp_path / "c.yml", [30])
+    assert asyncio.run(load_all(files)) == ["a.yml", "c.yml"]
+    assert files.errors.keys() == {tmp_path / "b.yml"}
+    assert files.files[tmp_path / "b.yml"].keys() == {20}
+
+    (tmp_path / "b.yml").unlink()
+    asyncio.run(load_all(files))
+    assert files.files.keys() == {tmp_path / "a.yml", tmp_path / "c.yml"}
+    assert not files.errors
+
+
+def test_gates_are_scheduled_file_by_file(tmp_path: Path):
+    write_channels(tmp_path / "a.yml", [10, 11])
+    # 1 is already in the config, so it's ignored
+    write_channels(tmp_path / "b.yml", [1, 20])
+    (tmp_path / "c.yml").write_text("30: [not, a, channel]")
+
+    async def main():
+        gate = Gate(
+            FakeBot(asyncio.get_running_loop()),
+            make_config({1: "23:59"}, channels_dir=str(tmp_path)),
+        )
+        reconciled = []
+        reconcile = gate._reconcile
+
+        def record_reconcile(channels, *args, **kwargs):
+            reconciled.append((kwargs.get("source"), sorted(channels)))
+            return reconcile(channels, *args, **kwargs)
+
+        gate._reconcile = record_reconcile
+        await gate._schedule_todays_gate_openings()
+        gates = set(gate._gates)
+        rollovers = set(gate._rollovers)
+        gate.cog_unload()
+        return reconciled, gates, rollovers
+
+    reconciled, gates, rollovers = asyncio.run(main())
+    assert reconciled == [(None, [1]), ("a.yml", [10, 11]), ("b.yml", [20])]
+    assert gates == {1, 10, 11, 20}
+    assert rollovers == {"UTC"}
+
+
+def test_apply_config_reloads_channel_files(tmp_path: Path):
+    write_channels(tmp_path / "a.yml", [10, 11])
+
+    async def main():
+        config = make_config({1: "23:59"}, channels_dir=str(tmp_path))
+        gate = Gate(FakeBot(asyncio.get_running_loop()), config)
+        await gate._schedule_todays_gate_openings()
+        gate._initialized = True
+        before = dict(gate._gates)
+
+        write_channels(tmp_path / "a.yml", [10])
+        write_channels(tmp_path / "b.yml", [20], time="12:00")
+        counts = await gate.apply_config(config)
+        after = dict(gate._gates)
+        gate.cog_unload()
+        return before, after, counts
+
+    before, after, counts = asyncio.run(main())
+    assert after.keys() == {1, 10, 20}
+    assert after[10] is before[10]
+    assert (counts.reused, counts.created, counts.dropped) == (2, 1, 1)
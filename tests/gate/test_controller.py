@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+from tests.helpers import FakeChannel, make_config, make_controller, saved_today
+
+CHANNEL_ID = 1234
+
+
+def make_channel_config():
+    config = make_config({CHANNEL_ID: {"time": "0:00", "duration": "24 hours"}})
+    return config.channels[CHANNEL_ID]
+
+
+def test_missed_open_is_caught_up():
+    async def main():
+        config = make_channel_config()
+        channel = FakeChannel(CHANNEL_ID)
+        controller = make_controller(channel, config, saved_today(config, True))
+        assert controller.closed
+        await asyncio.sleep(0.05)
+        return controller, channel
+
+    controller, channel = asyncio.run(main())
+    assert not controller.closed
+    assert channel.sent == ["open"]
+
+
+def test_open_gate_is_resumed_silently():
+    async def main():
+        config = make_channel_config()
+        channel = FakeChannel(CHANNEL_ID)
+        controller = make_controller(channel, config, saved_today(config, False))
+        await asyncio.sleep(0.05)
+        return controller, channel
+
+    controller, channel = asyncio.run(main())
+    assert not controller.closed
+    assert channel.sent == []
+    assert controller.open_at <= time.time() < controller.close_at
+
+
+def test_changed_config_is_not_resumed():
+    async def main():
+        config = make_channel_config()
+        channel = FakeChannel(CHANNEL_ID)
+        saved = saved_today(config, True)._replace(config_hash="stale hash")
+        controller = make_controller(channel, config, saved)
+        await asyncio.sleep(0.05)
+        return controller, channel
+
+    controller, channel = asyncio.run(main())
+    assert controller.closed
+    # Only the close that moves on to the next window is scheduled
+    assert controller._open_gate_call is None
+    assert channel.sent == []
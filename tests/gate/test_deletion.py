@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+from floodgate.common.snowflake import timestamp_snowflake
+from floodgate.dispatch import RestDispatcher
+from floodgate.gate.deletion import BULK_DELETE_LIMIT, DeletionQueue
+
+
+def make_snowflake(timestamp: float, increment: int = 0) -> int:
+    return timestamp_snowflake(timestamp) | increment
+
+
+class FakePartialMessage:
+    def __init__(self, channel: "FakeChannel", message_id: int):
+        self._channel = channel
+        self.id = message_id
+
+    async def delete(self):
+        self._channel.single_deletes.append(self.id)
+
+
+class FakeChannel:
+    id = 1234
+
+    def __init__(self):
+        self.bulk_deletes: list[list[int]] = []
+        self.single_deletes: list[int] = []
+
+    async def delete_messages(self, messages):
+        self.bulk_deletes.append([m.id for m in messages])
+
+    def get_partial_message(self, message_id: int):
+        return FakePartialMessage(self, message_id)
+
+
+def test_messages_are_coalesced_into_bulk_deletes():
+    async def main():
+        channel = FakeChannel()
+        loop = asyncio.get_running_loop()
+        queue = DeletionQueue(loop, RestDispatcher(loop), channel, window=0.01)
+        now = time.time()
+        ids = [make_snowflake(now, i) for i in range(BULK_DELETE_LIMIT + 5)]
+        for message_id in ids:
+            queue.enqueue(message_id)
+        assert queue.backlog == len(ids)
+        await asyncio.sleep(0.05)
+        return channel, queue, ids
+
+    channel, queue, ids = asyncio.run(main())
+    assert channel.bulk_deletes == [ids[:BULK_DELETE_LIMIT], ids[BULK_DELETE_LIMIT:]]
+    assert channel.single_deletes == []
+    assert queue.backlog == 0
+    assert queue.deleted == len(ids)
+    assert queue.latency.count == len(ids)
+
+
+def test_old_messages_are_deleted_individually():
+    async def main():
+        channel = FakeChannel()
+        loop = asyncio.get_running_loop()
+        queue = DeletionQueue(loop, RestDispatcher(loop), channel, window=0.01)
+        now = time.time()
+        old_id = make_snowflake(now - 15 * 24 * 60 * 60)
+        new_ids = [make_snowflake(now, i) for i in range(2)]
+        queue.enqueue(old_id)
+        for message_id in new_ids:
+            queue.enqueue(message_id)
+        await asyncio.sleep(0.05)
+        return channel, old_id, new_ids
+
+    channel, old_id, new_ids = asyncio.run(main())
+    assert channel.bulk_deletes == [new_ids]
+    assert channel.single_deletes == [old_id]
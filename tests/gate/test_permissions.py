@@ -0,0 +1,136 @@
+import asyncio
+from typing import Optional
+
+import discord
+
+from floodgate.records import GateChannel
+from tests.helpers import make_config, make_controller, saved_today
+
+CHANNEL_ID = 1234
+EVERYONE_ID = 1
+ROLE_IDS = (5, 6)
+
+
+class FakeGuild:
+    id = 1
+
+    def __init__(self):
+        self.default_role = discord.Object(id=EVERYONE_ID)
+
+    def get_role(self, role_id: int) -> discord.Object:
+        return discord.Object(id=role_id)
+
+
+class FakeChannel:
+    id = CHANNEL_ID
+
+    def __init__(self, send_messages: Optional[dict[int, bool]] = None):
+        self.guild = FakeGuild()
+        # Target ID -> its send_messages overwrite
+        self.send_messages: dict[int, Optional[bool]] = dict(send_messages or {})
+        # ("send", message) and ("overwrite", target ID, send_messages)
+        self.requests: list[tuple] = []
+
+    def overwrites_for(self, target) -> discord.PermissionOverwrite:
+        return discord.PermissionOverwrite(
+            send_messages=self.send_messages.get(target.id)
+        )
+
+    async def set_permissions(self, target, *, overwrite, reason=None):
+        self.send_messages[target.id] = overwrite.send_messages
+        self.requests.append(("overwrite", target.id, overwrite.send_messages))
+
+    async def send(self, msg: str):
+        self.requests.append(("send", msg))
+
+
+def make_channel_config(roles=ROLE_IDS, mode: str = "permissions") -> GateChannel:
+    config = make_config({CHANNEL_ID: {"time": "0:00", "duration": "24 hours"}})
+    return GateChannel(
+        config.channels[CHANNEL_ID].gate_open, "open", "close", mode, roles
+    )
+
+
+def overwrites(*target_ids: int, allow: Optional[bool]) -> list[tuple]:
+    return [("overwrite", target_id, allow) for target_id in target_ids]
+
+
+def test_closing_denies_after_announcing_and_opening_resets_first():
+    async def main():
+        channel = FakeChannel()
+        config = make_channel_config()
+        controller = make_controller(channel, config, saved_today(config, False))
+        await asyncio.sleep(0.05)
+        # Nothing was denied yet
+        assert channel.requests == []
+
+        controller.close_now()
+        await asyncio.sleep(0.05)
+        closed = list(channel.requests)
+        channel.requests.clear()
+
+        # noinspection PyProtectedMember
+        controller._on_open()
+        await asyncio.sleep(0.05)
+        controller.cancel()
+        return closed, channel.requests
+
+    closed, opened = asyncio.run(main())
+    assert closed == [("send", "close")] + overwrites(
+        EVERYONE_ID, *ROLE_IDS, allow=False
+    )
+    assert opened == overwrites(EVERYONE_ID, *ROLE_IDS, allow=None) + [("send", "open")]
+
+
+def test_correct_overwrites_are_left_alone():
+    async def main():
+        # Closed from the start, with one role already denied
+        channel = FakeChannel({ROLE_IDS[0]: False})
+        controller = make_controller(channel, make_channel_config())
+        await asyncio.sleep(0.05)
+        closed = controller.closed
+        controller.cancel()
+        return closed, channel
+
+    closed, channel = asyncio.run(main())
+    assert closed
+    assert channel.requests == overwrites(EVERYONE_ID, ROLE_IDS[1], allow=False)
+
+
+def test_config_changes_and_release_undo_old_overwrites():
+    async def main():
+        channel = FakeChannel()
+        controller = make_controller(channel, make_channel_config())
+        await asyncio.sleep(0.05)
+        results = []
+
+        # A role is removed, @everyone stays denied throughout
+        channel.requests.clear()
+        controller.update_config(make_channel_config(roles=ROLE_IDS[:1]))
+        await asyncio.sleep(0.05)
+        results.append((list(channel.requests), dict(channel.send_messages)))
+
+        # Switching to delete mode undoes the rest
+        channel.requests.clear()
+        controller.update_config(make_channel_config(mode="delete"))
+        await asyncio.sleep(0.05)
+        results.append((list(channel.requests), dict(channel.send_messages)))
+
+        # Back to permissions, then the gate is dropped
+        controller.update_config(make_channel_config())
+        await asyncio.sleep(0.05)
+        controller.release()
+        await asyncio.sleep(0.05)
+        results.append(dict(channel.send_messages))
+        return results
+
+    removed_role, delete_mode, released = asyncio.run(main())
+    assert removed_role == (
+        overwrites(ROLE_IDS[1], allow=None),
+        {EVERYONE_ID: False, ROLE_IDS[0]: False, ROLE_IDS[1]: None},
+    )
+    assert delete_mode == (
+        overwrites(EVERYONE_ID, ROLE_IDS[0], allow=None),
+        {EVERYONE_ID: None, ROLE_IDS[0]: None, ROLE_IDS[1]: None},
+    )
+    assert released == {EVERYONE_ID: None, ROLE_IDS[0]: None, ROLE_IDS[1]: None}
@@ -0,0 +1,96 @@
+import asyncio
+from types import SimpleNamespace
+
+import pendulum as pen
+
+from floodgate.common.snowflake import timestamp_snowflake
+from floodgate.gate.cog import Gate
+from tests.helpers import BOT_USER_ID, FakeBot, make_config, start_gate
+
+CLOSED_CHANNEL_ID = 10
+OPEN_CHANNEL_ID = 20
+
+
+def payload(channel_id: int, author_id: int = 2, content: str = "hi") -> dict:
+    return {
+        "id": str(timestamp_snowflake(pen.now().timestamp())),
+        "channel_id": str(channel_id),
+        "author": {"id": str(author_id)},
+        "content": content,
+    }
+
+
+async def start_raw_gate() -> tuple[FakeBot, Gate]:
+    bot = FakeBot(asyncio.get_running_loop())
+    # Opens 12 hours from now, so it's closed
+    opens_at = pen.now("UTC").add(hours=12).format("HH:mm")
+    config = make_config(
+        {CLOSED_CHANNEL_ID: opens_at}, raw_events=True, deletion_window="0.01 sec"
+    )
+    gate = await start_gate(bot, config)
+    return bot, gate
+
+
+def test_leaked_payloads_are_deleted_without_parsing():
+    async def main():
+        bot, gate = await start_raw_gate()
+        parse = bot._connection.parsers["MESSAGE_CREATE"]
+        leaked = payload(CLOSED_CHANNEL_ID)
+        parse(leaked)
+        parse(payload(CLOSED_CHANNEL_ID, author_id=BOT_USER_ID))
+        await asyncio.sleep(0.05)
+        gate.cog_unload()
+        return bot, leaked
+
+    bot, leaked = asyncio.run(main())
+    assert bot.channels[CLOSED_CHANNEL_ID].deleted == [int(leaked["id"])]
+    assert bot._connection.parsed == []
+
+
+def test_only_possible_commands_are_parsed():
+    async def main():
+        bot, gate = await start_raw_gate()
+        parse = bot._connection.parsers["MESSAGE_CREATE"]
+        command = payload(OPEN_CHANNEL_ID, content="!ping")
+        parse(command)
+        parse(payload(OPEN_CHANNEL_ID))
+        gate.cog_unload()
+        return bot, command
+
+    bot, command = asyncio.run(main())
+    assert bot._connection.parsed == [command]
+
+
+def test_forwarded_commands_are_counted_once():
+    async def main():
+        bot, gate = await start_raw_gate()
+        command = payload(CLOSED_CHANNEL_ID, author_id=BOT_USER_ID, content="!ping")
+        bot._connection.parsers["MESSAGE_CREATE"](command)
+        # What discord.py dispatches after parsing it
+        await gate.leak_prevention(
+            SimpleNamespace(
+                id=int(command["id"]),
+                channel=bot.get_channel(CLOSED_CHANNEL_ID),
+                author=bot.user,
+            )
+        )
+        seen = gate._messages_seen[str(CLOSED_CHANNEL_ID)]
+        gate.cog_unload()
+        return bot, seen
+
+    bot, seen = asyncio.run(main())
+    assert len(bot._connection.parsed) == 1
+    assert seen == 1
+
+
+def test_unloading_restores_the_parser():
+    async def main():
+        bot, gate = await start_raw_gate()
+        connection = bot._connection
+        hooked = connection.parsers["MESSAGE_CREATE"]
+        gate.cog_unload()
+        return connection, hooked
+
+    connection, hooked = asyncio.run(main())
+    assert hooked != connection.parse_message_create
+    assert connection.parsers["MESSAGE_CREATE"] == connection.parse_message_create
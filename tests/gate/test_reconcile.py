@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import pendulum as pen
+
+from floodgate.gate.cog import Gate
+from tests.helpers import FakeBot, make_config, start_gate
+
+
+def test_reconcile_reuses_unchanged_gates():
+    async def main():
+        config = make_config({1: "23:59", 2: "23:59", 3: "23:59"})
+        gate = Gate(FakeBot(asyncio.get_running_loop()), config)
+        gate._reconcile(config.channels)
+        before = dict(gate._gates)
+
+        new_config = make_config({1: "23:59", 2: "23:58", 4: "23:59"})
+        gate._reconcile(new_config.channels)
+        after = dict(gate._gates)
+        gate.cog_unload()
+        return before, after
+
+    before, after = asyncio.run(main())
+    assert after.keys() == {1, 2, 4}
+    assert after[1] is before[1]
+    assert after[2] is not before[2]
+
+
+def test_set_config_only_touches_changed_gates():
+    async def main():
+        config = make_config({1: "23:59", 2: "23:59"})
+        gate = Gate(FakeBot(asyncio.get_running_loop()), config)
+        gate._reconcile(config.channels)
+        gate._initialized = True
+
+        counts = gate.set_config(make_config({1: "23:59", 3: "23:59"}))
+        gate.cog_unload()
+        return counts
+
+    counts = asyncio.run(main())
+    assert (counts.reused, counts.created, counts.dropped) == (1, 1, 1)
+
+
+def test_rollover_plans_the_timezones_next_day():
+    async def main():
+        config = make_config({1: "12:00", 2: "12:00"})
+        gate = Gate(FakeBot(asyncio.get_running_loop()), config)
+        gate._reconcile(config.channels)
+        gate._update_rollovers()
+        rollovers = set(gate._rollovers)
+
+        # Pretend the current plans have already run
+        for controller in gate._gates.values():
+            controller.cancel()
+        midnight = pen.tomorrow("UTC")
+        gate._roll_over("UTC", midnight)
+        open_dates = {
+            pen.from_timestamp(controller.open_at, tz="UTC").date()
+            for controller in gate._gates.values()
+        }
+        next_rollover = gate._rollovers["UTC"].when - gate._scheduler.loop.time()
+        gate.cog_unload()
+        return rollovers, open_dates, midnight, next_rollover
+
+    rollovers, open_dates, midnight, next_rollover = asyncio.run(main())
+    assert rollovers == {"UTC"}
+    assert open_dates == {midnight.date()}
+    assert next_rollover > 24 * 60 * 60
+
+
+def test_changing_an_open_gate_keeps_it_open_if_the_new_plan_allows():
+    async def main():
+        bot = FakeBot(asyncio.get_running_loop())
+        # Five minutes into a 12:00 window
+        noon = pen.today("UTC").add(hours=12).timestamp()
+        offset = noon + 5 * 60 - time.time()
+
+        def clock():
+            return time.time() + offset
+
+        gate = await start_gate(
+            bot, make_config({1: {"time": "12:00", "duration": "1 hour"}}), clock=clock
+        )
+        gate._gates[1]._on_open()
+        await asyncio.sleep(0.05)
+
+        results = []
+        for duration in ("2 hours", "1 min"):
+            gate.set_config(make_config({1: {"time": "12:00", "duration": duration}}))
+            await asyncio.sleep(0.05)
+            results.append(
+                (
+                    1 in gate._closed_channels,
+                    list(bot.get_channel(1).sent),
+                    gate._gates[1].close_at - noon,
+                )
+            )
+        gate.cog_unload()
+        return results
+
+    extended, shortened = asyncio.run(main())
+    assert extended == (False, ["open"], 2 * 60 * 60)
+    # The new window is already over
+    assert shortened == (True, ["open", "close"], 60)
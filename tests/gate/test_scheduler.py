@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+from floodgate.gate import scheduler as scheduler_module
+from floodgate.gate.scheduler import GateScheduler
+
+
+def test_calls_run_in_deadline_order():
+    async def main():
+        scheduler = GateScheduler(asyncio.get_running_loop())
+        calls = []
+        for delay in (0.03, 0.01, 0.02):
+            scheduler.call_later(delay, lambda d=delay: calls.append(d))
+        await asyncio.sleep(0.06)
+        scheduler.close()
+        return calls
+
+    assert asyncio.run(main()) == [0.01, 0.02, 0.03]
+
+
+def test_cancelled_call_does_not_run():
+    async def main():
+        scheduler = GateScheduler(asyncio.get_running_loop())
+        calls = []
+        call = scheduler.call_later(0.01, lambda: calls.append("cancelled"))
+        scheduler.call_later(0.02, lambda: calls.append("kept"))
+        call.cancel()
+        assert len(scheduler) == 1
+        await asyncio.sleep(0.04)
+        scheduler.close()
+        return calls
+
+    assert asyncio.run(main()) == ["kept"]
+
+
+def test_earlier_call_wakes_driver():
+    async def main():
+        scheduler = GateScheduler(asyncio.get_running_loop())
+        calls = []
+        scheduler.call_later(60, lambda: calls.append("late"))
+        await asyncio.sleep(0)
+        scheduler.call_later(0.01, lambda: calls.append("early"))
+        await asyncio.sleep(0.03)
+        scheduler.close()
+        return calls
+
+    assert asyncio.run(main()) == ["early"]
+
+
+def test_cancel_after_run_is_noop():
+    async def main():
+        scheduler = GateScheduler(asyncio.get_running_loop())
+        call = scheduler.call_later(0, lambda: None)
+        await asyncio.sleep(0.01)
+        call.cancel()
+        assert len(scheduler) == 0
+        scheduler.close()
+
+    asyncio.run(main())
+
+
+def test_heap_is_compacted_after_mass_cancel():
+    async def main():
+        scheduler = GateScheduler(asyncio.get_running_loop())
+        calls = [scheduler.call_later(60, lambda: None) for _ in range(100)]
+        for call in calls[:90]:
+            call.cancel()
+        assert len(scheduler) == 10
+        assert len(scheduler._heap) < 100
+        scheduler.close()
+
+    asyncio.run(main())
+
+
+class SkewedClock:
+    def __init__(self):
+        self.skew = 0.0
+
+    def __call__(self) -> float:
+        return time.time() + self.skew
+
+
+def test_wall_clock_jump_forward_runs_call(monkeypatch):
+    monkeypatch.setattr(scheduler_module, "MAX_SLEEP", 0.01)
+
+    async def main():
+        clock = SkewedClock()
+        scheduler = GateScheduler(asyncio.get_running_loop(), clock)
+        calls = []
+        scheduler.call_at_time(clock() + 30, lambda: calls.append("due"))
+        await asyncio.sleep(0.02)
+        assert calls == []
+        clock.skew = 31
+        await asyncio.sleep(0.05)
+        scheduler.close()
+        return calls, scheduler.clock_jumps, scheduler.error
+
+    calls, clock_jumps, error = asyncio.run(main())
+    assert calls == ["due"]
+    assert clock_jumps == 1
+    assert error.count == 1 and 0 <= error.last < 2
+
+
+def test_wall_clock_jump_backward_delays_call():
+    async def main():
+        clock = SkewedClock()
+        scheduler = GateScheduler(asyncio.get_running_loop(), clock)
+        calls = []
+        scheduler.call_at_time(clock() + 0.05, lambda: calls.append("due"))
+        await asyncio.sleep(0)
+        clock.skew = -10
+        await asyncio.sleep(0.1)
+        scheduler.close()
+        return calls, scheduler.clock_jumps
+
+    assert asyncio.run(main()) == ([], 1)
+
+
+def test_wall_clock_call_records_error():
+    async def main():
+        scheduler = GateScheduler(asyncio.get_running_loop())
+        scheduler.call_at_time(time.time() + 0.02, lambda: None)
+        await asyncio.sleep(0.05)
+        scheduler.close()
+        return scheduler.error
+
+    error = asyncio.run(main())
+    assert error.count == 1
+    assert -0.001 < error.last < 0.02
@@ -0,0 +1,24 @@
+from floodgate.gate.store import GateRecord, GateStore
+
+
+def test_store_round_trip(tmp_path):
+    path = tmp_path / "state.sqlite3"
+    store = GateStore(path)
+    store.save_plan(1, 100.0, 400.0, "abc")
+    store.save_plan(2, 200.0, 500.0, "def")
+    store.save_state(1, False)
+    store.delete(2)
+    store.close()
+
+    assert GateStore(path).load() == {1: GateRecord(100.0, 400.0, False, "abc")}
+
+
+def test_new_plan_keeps_state(tmp_path):
+    path = tmp_path / "state.sqlite3"
+    store = GateStore(path)
+    store.save_plan(1, 100.0, 400.0, "abc")
+    store.save_state(1, False)
+    store.save_plan(1, 1100.0, 1400.0, "abc")
+    store.close()
+
+    assert GateStore(path).load() == {1: GateRecord(1100.0, 1400.0, False, "abc")}
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import time
+
+import pendulum as pen
+
+from floodgate.common.snowflake import timestamp_snowflake
+from tests.helpers import BOT_USER_ID, FakeBot, make_config, start_gate
+
+CHANNEL_ID = 1234
+FORBIDDEN_CHANNEL_ID = 5678
+USER_ID = 42
+
+
+def message(message_id: int, author_id: int = USER_ID) -> dict:
+    return {
+        "id": str(message_id),
+        "channel_id": str(CHANNEL_ID),
+        "author": {"id": str(author_id)},
+        "content": "hi",
+    }
+
+
+def make_closed_config(*channel_ids: int, **floodgate):
+    # Opens half a day from now, so the gates are closed throughout
+    opens_at = pen.now("UTC").add(hours=12).format("HH:mm")
+    return make_config(
+        {channel_id: opens_at for channel_id in channel_ids},
+        deletion_window="0.01 sec",
+        **floodgate,
+    )
+
+
+def test_sweep_deletes_missed_messages_and_skips_unreadable_channels(caplog):
+    async def main():
+        bot = FakeBot(asyncio.get_running_loop())
+        gate = await start_gate(
+            bot, make_closed_config(CHANNEL_ID, FORBIDDEN_CHANNEL_ID)
+        )
+        await gate._sweep_task
+
+        # Messages sent while we were disconnected, more than a page's worth
+        start = timestamp_snowflake(time.time() - 60)
+        missed = [start + (i + 1 << 22) for i in range(150)]
+        bot.http.history[CHANNEL_ID] = [message(i) for i in missed] + [
+            message(start + (200 << 22), author_id=BOT_USER_ID)
+        ]
+        bot.http.forbidden.add(FORBIDDEN_CHANNEL_ID)
+        for channel_id in (CHANNEL_ID, FORBIDDEN_CHANNEL_ID):
+            gate._cursors[channel_id] = start
+        bot.http.history_requests = 0
+
+        await gate.on_resumed()
+        await gate._sweep_task
+        await asyncio.sleep(0.1)
+        cursors = dict(gate._cursors)
+        gate.cog_unload()
+        return bot, missed, start, cursors
+
+    with caplog.at_level(logging.INFO, logger="floodgate"):
+        bot, missed, start, cursors = asyncio.run(main())
+    assert sorted(bot.get_channel(CHANNEL_ID).deleted) == missed
+    # Two pages plus the forbidden channel's one request
+    assert bot.http.history_requests == 3
+    assert f"channel_id={FORBIDDEN_CHANNEL_ID}" in caplog.text
+    assert (
+        "Catch-up sweep found 150 leaked message(s) in 2 channel(s), "
+        "1 channel(s) couldn't be swept" in caplog.text
+    )
+    # Neither channel is swept from the same place again
+    assert cursors[CHANNEL_ID] > missed[-1]
+    assert cursors[FORBIDDEN_CHANNEL_ID] > start
+
+
+def test_cursors_follow_messages_in_open_gates():
+    async def main():
+        bot = FakeBot(asyncio.get_running_loop())
+        gate = await start_gate(bot, make_closed_config(CHANNEL_ID, raw_events=True))
+        # noinspection PyProtectedMember
+        gate._gates[CHANNEL_ID]._on_open()
+        await asyncio.sleep(0.05)
+        assert CHANNEL_ID not in gate._closed_channels
+
+        message_id = timestamp_snowflake(time.time() + 1)
+        bot._connection.parsers["MESSAGE_CREATE"](message(message_id))
+        cursor = gate._cursors[CHANNEL_ID]
+        gate.cog_unload()
+        return message_id, cursor
+
+    message_id, cursor = asyncio.run(main())
+    assert cursor == message_id
+
+
+def test_sweep_stops_at_the_gates_clock():
+    async def main():
+        bot = FakeBot(asyncio.get_running_loop())
+
+        def clock():
+            # The gates run an hour behind
+            return time.time() - 60 * 60
+
+        gate = await start_gate(bot, make_closed_config(CHANNEL_ID), clock=clock)
+        await gate._sweep_task
+
+        start = timestamp_snowflake(clock() - 60)
+        before_now = start + (1 << 22)
+        bot.http.history[CHANNEL_ID] = [
+            message(before_now),
+            message(timestamp_snowflake(time.time())),
+        ]
+        gate._cursors[CHANNEL_ID] = start
+        await gate.on_resumed()
+        await gate._sweep_task
+        await asyncio.sleep(0.1)
+        gate.cog_unload()
+        return bot, before_now
+
+    bot, before_now = asyncio.run(main())
+    assert bot.get_channel(CHANNEL_ID).deleted == [before_now]
+
+
+def test_sweep_keeps_messages_from_a_window_past_midnight():
+    async def main():
+        bot = FakeBot(asyncio.get_running_loop())
+        # Yesterday's 23:00 window ran until 01:00 and it's now 01:30
+        midnight = pen.now("UTC").add(days=1).start_of("day").timestamp()
+        offset = midnight + 90 * 60 - time.time()
+
+        def clock():
+            return time.time() + offset
+
+        config = make_config(
+            {CHANNEL_ID: {"time": "23:00", "duration": "2 hours"}},
+            deletion_window="0.01 sec",
+        )
+        gate = await start_gate(bot, config, clock=clock)
+        await gate._sweep_task
+
+        in_window = timestamp_snowflake(midnight + 29 * 60)
+        after_window = timestamp_snowflake(midnight + 70 * 60)
+        bot.http.history[CHANNEL_ID] = [message(in_window), message(after_window)]
+        gate._cursors[CHANNEL_ID] = timestamp_snowflake(midnight)
+        await gate.on_resumed()
+        await gate._sweep_task
+        await asyncio.sleep(0.1)
+        gate.cog_unload()
+        return bot, after_window
+
+    bot, after_window = asyncio.run(main())
+    assert bot.get_channel(CHANNEL_ID).deleted == [after_window]
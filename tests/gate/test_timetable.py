@@ -0,0 +1,87 @@
+import pendulum as pen
+
+from floodgate.common.time import TimeContext
+from floodgate.config import Config
+from floodgate.gate.timetable import compile_timetable
+
+# A Monday
+MONDAY = pen.date(2024, 6, 3)
+
+
+def make_channels(channels: dict[int, dict]):
+    config = Config.parse_obj(
+        {
+            "bot_token": "token",
+            "bot": {
+                "modules": {
+                    "floodgate": {
+                        "state_file": None,
+                        "channels": {
+                            channel_id: {
+                                "gate_open": {
+                                    "timezone": "UTC",
+                                    "duration": "1 hour",
+                                    **gate_open,
+                                },
+                                "messages": {"open": "open", "close": "close"},
+                            }
+                            for channel_id, gate_open in channels.items()
+                        },
+                    }
+                }
+            },
+        }
+    )
+    return config.bot.modules.floodgate.channels
+
+
+def utc(day: pen.Date, hour: int, minute: int = 0) -> float:
+    return pen.datetime(day.year, day.month, day.day, hour, minute, tz="UTC").timestamp()
+
+
+def test_rules_expand_over_days():
+    channels = make_channels(
+        {
+            1: {"time": ["9:00", "17:00"], "weekdays": ["mon", "wed"]},
+            2: {"time": "12:00", "skip_dates": [str(MONDAY.add(days=1))]},
+        }
+    )
+    windows = compile_timetable(channels, days=3, start=MONDAY).by_channel()
+    wednesday = MONDAY.add(days=2)
+    assert windows[1] == [
+        (utc(MONDAY, 9), utc(MONDAY, 10)),
+        (utc(MONDAY, 17), utc(MONDAY, 18)),
+        (utc(wednesday, 9), utc(wednesday, 10)),
+        (utc(wednesday, 17), utc(wednesday, 18)),
+    ]
+    assert windows[2] == [
+        (utc(MONDAY, 12), utc(MONDAY, 13)),
+        (utc(wednesday, 12), utc(wednesday, 13)),
+    ]
+
+
+def test_overlapping_windows_are_merged():
+    channels = make_channels({1: {"time": ["9:00", "9:30"]}})
+    windows = compile_timetable(channels, start=MONDAY).by_channel()
+    assert windows[1] == [(utc(MONDAY, 9), utc(MONDAY, 10, 30))]
+
+
+def test_random_windows_stay_in_range():
+    channels = make_channels(
+        {
+            channel_id: {"time_window_start": "9:00", "time_window_end": "10:00"}
+            for channel_id in range(100)
+        }
+    )
+    context = TimeContext()
+    timetable = compile_timetable(channels, days=2, start=MONDAY, context=context)
+    assert len(timetable) == 200
+    for open_at in timetable.open_at:
+        day = pen.from_timestamp(open_at, tz="UTC").date()
+        assert utc(day, 9) <= open_at <= utc(day, 10)
+
+    seeded = [
+        compile_timetable(channels, start=MONDAY, salt=b"salt").by_channel()
+        for __ in range(2)
+    ]
+    assert seeded[0] == seeded[1]
@@ -0,0 +1,498 @@
+"""
+A local stand-in for Discord's gateway and REST API, for running the real
+bot offline.
+
+`FakeDiscord` serves just enough of both for `Floodgate` to log in, connect,
+receive its guilds and make the requests gates make (sending announcements,
+changing permission overwrites, deleting messages and reading history). It
+can add latency to REST responses and answer some of them with 429s,
+either Discord's own or Cloudflare's for banned IPs, and sends synthetic
+MESSAGE_CREATE events to the connected bot. Bots can connect with several
+shards, from one process or several, and each shard is sent its own guilds'
+events. Deleted message IDs and sent announcements are recorded for
+checking.
+"""
+
+import asyncio
+from collections import Counter
+import itertools
+import json
+import random
+import time
+from typing import Optional
+
+from aiohttp import WSMsgType, web
+import discord.http
+
+from floodgate.common.snowflake import timestamp_snowflake
+from floodgate.config import Config
+from floodgate.floodgate import Floodgate, make_bot
+from floodgate.sharding import shard_of
+from tests.helpers import make_bot_config
+
+__all__ = ["FakeDiscord", "make_config", "start_bot", "stop_bot"]
+
+BOT_ID = 1000
+AUTHOR_ID = 1001
+HEARTBEAT_INTERVAL = 41250
+
+
+def _user(user_id: int, name: str, bot: bool = False) -> dict:
+    return {
+        "id": str(user_id),
+        "username": name,
+        "discriminator": "0001",
+        "avatar": None,
+        "bot": bot,
+    }
+
+
+def _json_response(data, status: int = 200, headers: Optional[dict] = None):
+    # discord.py only decodes bodies whose content type is exactly this, with
+    # no charset
+    return web.Response(
+        body=json.dumps(data).encode(),
+        status=status,
+        headers=headers,
+        content_type="application/json",
+    )
+
+
+def _timestamp() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+
+
+class FakeDiscord:
+    """
+    Serves a fake gateway and REST API on localhost.
+
+    :param guilds: number of guilds the bot is in
+    :param channels_per_guild: number of text channels in each guild
+    :param latency: seconds to wait before answering each REST request
+    :param rate_limit_chance: chance of answering a channel request with a
+        429 instead of handling it
+    :param ban_chance: chance of answering a channel request with a 429
+        without a Via header, like Cloudflare does for IPs it has banned
+    :param retry_after: the Retry-After given with 429s, in seconds
+    :param seed: seed for choosing which requests are rate limited
+    :param shards: the shard count recommended to bots that don't set one
+    """
+
+    def __init__(
+        self,
+        guilds: int = 1,
+        channels_per_guild: int = 1,
+        latency: float = 0.0,
+        rate_limit_chance: float = 0.0,
+        ban_chance: float = 0.0,
+        retry_after: float = 0.05,
+        seed: int = 0,
+        shards: int = 1,
+    ):
+        self.latency = latency
+        self.rate_limit_chance = rate_limit_chance
+        self.ban_chance = ban_chance
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self.shards = shards
+
+        # Guild ID -> its channel IDs
+        self.guilds: dict[int, list[int]] = {}
+        ids = itertools.count(10_000)
+        for __ in range(guilds):
+            # Guilds are spread over shards by their snowflake's timestamp
+            guild_id = next(ids) << 22
+            self.guilds[guild_id] = [next(ids) for __ in range(channels_per_guild)]
+        self._guild_of = {
+            channel_id: guild_id
+            for guild_id, channel_ids in self.guilds.items()
+            for channel_id in channel_ids
+        }
+        self._message_ids = itertools.count(timestamp_snowflake(time.time()))
+
+        self.base_url: Optional[str] = None
+        self.identified = asyncio.Event()
+        self._runner: Optional[web.AppRunner] = None
+        # Connected socket -> its (shard ID, shard count)
+        self._sockets: dict[web.WebSocketResponse, tuple[int, int]] = {}
+        self._seq = itertools.count(1)
+        self._old_base: Optional[str] = None
+
+        # Recorded traffic
+        self.requests: Counter[str] = Counter()
+        self.identified_shards: list[tuple[int, int]] = []
+        self.rate_limited = 0
+        self.banned = 0
+        self.deleted: set[int] = set()
+        self.last_deleted_at: Optional[float] = None
+        self.announcements: list[tuple[int, str, float]] = []
+        self.overwrites: list[tuple[int, int, float]] = []
+
+    @property
+    def channel_ids(self) -> list[int]:
+        return list(self._guild_of)
+
+    async def start(self):
+        """Start serving and point discord.py's REST client at this server."""
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/gateway", self._gateway)
+        routes = (
+            ("GET", "/api/v7/users/@me", self._get_me),
+            ("GET", "/api/v7/gateway", self._get_gateway),
+            ("GET", "/api/v7/gateway/bot", self._get_bot_gateway),
+            ("POST", "/api/v7/channels/{channel_id}/messages", self._send),
+            (
+                "POST",
+                "/api/v7/channels/{channel_id}/messages/bulk_delete",
+                self._bulk_delete,
+            ),
+            (
+                "DELETE",
+                "/api/v7/channels/{channel_id}/messages/{message_id}",
+                self._delete,
+            ),
+            (
+                "PUT",
+                "/api/v7/channels/{channel_id}/permissions/{target_id}",
+                self._set_overwrite,
+            ),
+            (
+                "DELETE",
+                "/api/v7/channels/{channel_id}/permissions/{target_id}",
+                self._set_overwrite,
+            ),
+            ("GET", "/api/v7/channels/{channel_id}/messages", self._history),
+        )
+        for method, path, handler in routes:
+            app.router.add_route(method, path, handler)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        # noinspection PyProtectedMember
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+
+        self._old_base = discord.http.Route.BASE
+        discord.http.Route.BASE = f"{self.base_url}/api/v7"
+
+    async def stop(self):
+        if self._old_base is not None:
+            discord.http.Route.BASE = self._old_base
+            self._old_base = None
+        for ws in list(self._sockets):
+            await ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def send_messages(self, channel_ids: list[int], count: int) -> list[int]:
+        """
+        Send `count` MESSAGE_CREATE events to the bot, spread evenly across
+        `channel_ids`.
+
+        :return: the IDs of the messages sent
+        """
+        message_ids = []
+        for i in range(count):
+            channel_id = channel_ids[i % len(channel_ids)]
+            message_id = next(self._message_ids)
+            message_ids.append(message_id)
+            await self._dispatch(
+                "MESSAGE_CREATE",
+                self._message(channel_id, message_id, AUTHOR_ID),
+                self._guild_sockets(self._guild_of[channel_id]),
+            )
+            if i % 100 == 99:
+                # Let the bot keep up, like a real socket would
+                await asyncio.sleep(0)
+        return message_ids
+
+    def _message(self, channel_id: int, message_id: int, author_id: int, **kwargs):
+        author = _user(author_id, "bot" if author_id == BOT_ID else "raider")
+        return {
+            "id": str(message_id),
+            "channel_id": str(channel_id),
+            "guild_id": str(self._guild_of[channel_id]),
+            "author": author,
+            "content": "spam",
+            "timestamp": _timestamp(),
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": [],
+            "pinned": False,
+            "type": 0,
+            **kwargs,
+        }
+
+    def _guild(self, guild_id: int) -> dict:
+        return {
+            "id": str(guild_id),
+            "name": f"guild-{guild_id}",
+            "unavailable": False,
+            "owner_id": str(AUTHOR_ID),
+            "member_count": 2,
+            "large": False,
+            "features": [],
+            "emojis": [],
+            "voice_states": [],
+            "presences": [],
+            "roles": [
+                {
+                    "id": str(guild_id),
+                    "name": "@everyone",
+                    "permissions": "1071698660929",
+                    "position": 0,
+                    "color": 0,
+                    "hoist": False,
+                    "managed": False,
+                    "mentionable": False,
+                }
+            ],
+            "channels": [
+                {
+                    "id": str(channel_id),
+                    "type": 0,
+                    "name": f"channel-{channel_id}",
+                    "position": position,
+                    "permission_overwrites": [],
+                }
+                for position, channel_id in enumerate(self.guilds[guild_id])
+            ],
+            "members": [
+                {
+                    "user": _user(BOT_ID, "floodgate", bot=True),
+                    "roles": [],
+                    "joined_at": _timestamp(),
+                    "deaf": False,
+                    "mute": False,
+                }
+            ],
+        }
+
+    # Gateway
+
+    def _guild_sockets(self, guild_id: int) -> list[web.WebSocketResponse]:
+        """Get the sockets of the shards a guild's events go to."""
+        return [
+            ws
+            for ws, (shard_id, shard_count) in self._sockets.items()
+            if shard_of(guild_id, shard_count) == shard_id
+        ]
+
+    async def _dispatch(
+        self,
+        event: str,
+        data: dict,
+        sockets: Optional[list[web.WebSocketResponse]] = None,
+    ):
+        """Send an event to some sockets, or to all of them."""
+        payload = json.dumps({"op": 0, "t": event, "s": next(self._seq), "d": data})
+        for ws in list(self._sockets) if sockets is None else sockets:
+            try:
+                await ws.send_str(payload)
+            except ConnectionResetError:
+                # A client that's gone, its handler hasn't noticed yet
+                self._sockets.pop(ws, None)
+
+    async def _gateway(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_json({"op": 10, "d": {"heartbeat_interval": HEARTBEAT_INTERVAL}})
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            payload = json.loads(msg.data)
+            op = payload["op"]
+            if op == 1:
+                await ws.send_json({"op": 11})
+            elif op == 2:
+                shard_id, shard_count = payload["d"].get("shard", (0, 1))
+                await self._identify(ws, shard_id, shard_count)
+        self._sockets.pop(ws, None)
+        return ws
+
+    async def _identify(
+        self, ws: web.WebSocketResponse, shard_id: int, shard_count: int
+    ):
+        self._sockets[ws] = (shard_id, shard_count)
+        self.identified_shards.append((shard_id, shard_count))
+        guild_ids = [
+            guild_id
+            for guild_id in self.guilds
+            if shard_of(guild_id, shard_count) == shard_id
+        ]
+        await self._dispatch(
+            "READY",
+            {
+                "v": 6,
+                "user": _user(BOT_ID, "floodgate", bot=True),
+                "guilds": [
+                    {"id": str(guild_id), "unavailable": True} for guild_id in guild_ids
+                ],
+                "session_id": f"fake-session-{shard_id}",
+                "private_channels": [],
+                "relationships": [],
+                "shard": [shard_id, shard_count],
+            },
+            [ws],
+        )
+        for guild_id in guild_ids:
+            await self._dispatch("GUILD_CREATE", self._guild(guild_id), [ws])
+        self.identified.set()
+
+    # REST
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        self.requests[f"{request.method} {request.match_info.route.resource}"] += 1
+        if request.path.startswith("/api/"):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if "channel_id" in request.match_info:
+                roll = self._random.random()
+                if roll < self.ban_chance:
+                    self.banned += 1
+                    # Cloudflare's bans skip Discord, so they have no Via header
+                    # and discord.py gives up on them straight away
+                    return _json_response(
+                        {"message": "You are being blocked from accessing our API."},
+                        status=429,
+                        headers={"Retry-After": str(self.retry_after)},
+                    )
+                elif roll < self.ban_chance + self.rate_limit_chance:
+                    self.rate_limited += 1
+                    # Discord's own 429s come through Cloudflare with a Via
+                    # header, and discord.py retries them itself
+                    return _json_response(
+                        {
+                            "message": "You are being rate limited.",
+                            "retry_after": self.retry_after * 1000,
+                            "global": False,
+                        },
+                        status=429,
+                        headers={
+                            "Retry-After": str(self.retry_after),
+                            "Via": "1.1 google",
+                        },
+                    )
+        return await handler(request)
+
+    async def _get_me(self, request: web.Request) -> web.Response:
+        return _json_response(_user(BOT_ID, "floodgate", bot=True))
+
+    async def _get_gateway(self, request: web.Request) -> web.Response:
+        ws_url = self.base_url.replace("http", "ws", 1) + "/gateway"
+        return _json_response({"url": ws_url})
+
+    async def _get_bot_gateway(self, request: web.Request) -> web.Response:
+        ws_url = self.base_url.replace("http", "ws", 1) + "/gateway"
+        return _json_response(
+            {
+                "url": ws_url,
+                "shards": self.shards,
+                "session_start_limit": {
+                    "total": 1000,
+                    "remaining": 1000,
+                    "reset_after": 0,
+                    "max_concurrency": 1,
+                },
+            }
+        )
+
+    async def _send(self, request: web.Request) -> web.Response:
+        channel_id = int(request.match_info["channel_id"])
+        body = await request.json()
+        self.announcements.append((channel_id, body.get("content"), time.time()))
+        message = self._message(
+            channel_id, next(self._message_ids), BOT_ID, content=body.get("content")
+        )
+        return _json_response(message)
+
+    def _on_deleted(self, message_ids: list[int]):
+        self.deleted.update(message_ids)
+        self.last_deleted_at = time.time()
+
+    async def _bulk_delete(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self._on_deleted([int(message_id) for message_id in body["messages"]])
+        return web.Response(status=204)
+
+    async def _delete(self, request: web.Request) -> web.Response:
+        self._on_deleted([int(request.match_info["message_id"])])
+        return web.Response(status=204)
+
+    async def _set_overwrite(self, request: web.Request) -> web.Response:
+        self.overwrites.append(
+            (
+                int(request.match_info["channel_id"]),
+                int(request.match_info["target_id"]),
+                time.time(),
+            )
+        )
+        return web.Response(status=204)
+
+    async def _history(self, request: web.Request) -> web.Response:
+        return _json_response([])
+
+
+def make_config(
+    channels: dict[int, dict],
+    deletion_window: str = "0.1 sec",
+    sharding: Optional[dict] = None,
+    **floodgate_config,
+) -> Config:
+    """
+    Build a config for the fake Discord's channels.
+
+    :param channels: channel ID -> that channel's `gate_open` config
+    :param sharding: the bot's sharding config, if it's sharded
+    """
+    return make_bot_config(
+        channels,
+        bot={"reload": {"watch": False}, "sharding": sharding or {}},
+        deletion_window=deletion_window,
+        **floodgate_config,
+    )
+
+
+async def start_bot(
+    config: Config, timeout: float = 10
+) -> tuple[Floodgate, asyncio.Task]:
+    """
+    Start the bot against a running `FakeDiscord` and wait for its gates to
+    be scheduled.
+    """
+    bot = make_bot(config.bot)
+    # noinspection PyProtectedMember
+    bot._connection.guild_ready_timeout = 0.05
+
+    async def before_identify_hook(shard_id: int, *, initial: bool = False):
+        # The fake gateway doesn't limit how often shards identify
+        pass
+
+    bot.before_identify_hook = before_identify_hook
+    task = asyncio.get_running_loop().create_task(bot.start("token"))
+
+    deadline = time.monotonic() + timeout
+    # The gate extension is loaded once the bot has logged in
+    while (gate := bot.get_cog("Gate")) is None or not gate._initialized:
+        if task.done():
+            task.result()
+        if time.monotonic() > deadline:
+            raise TimeoutError("The bot didn't schedule its gates in time")
+        await asyncio.sleep(0.01)
+    return bot, task
+
+
+async def stop_bot(bot: Floodgate, task: asyncio.Task):
+    await bot.close()
+    try:
+        await asyncio.wait_for(task, 5)
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        pass
@@ -0,0 +1,193 @@
+"""Fakes and config builders shared by the gate tests."""
+
+import asyncio
+from typing import Optional, Union
+
+import discord
+import pendulum as pen
+
+from floodgate.config import Config
+from floodgate.dispatch import RestDispatcher
+from floodgate.gate.cog import ClosedChannels, Gate, GateController
+from floodgate.gate.scheduler import GateScheduler
+from floodgate.gate.store import GateRecord
+from floodgate.metrics import FloodgateMetrics
+from floodgate.records import GateChannel
+
+# noinspection PyProtectedMember
+FloodgateConfig = Config._Bot._Modules._Floodgate
+
+BOT_USER_ID = 1
+
+
+class FakeChannel:
+    guild = discord.Object(id=1)
+
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.sent: list[str] = []
+        self.deleted: list[int] = []
+
+    async def send(self, msg: str):
+        self.sent.append(msg)
+
+    async def delete_messages(self, messages):
+        self.deleted.extend(message.id for message in messages)
+
+
+class FakeResponse:
+    def __init__(self, status: int, reason: str):
+        self.status = status
+        self.reason = reason
+
+
+class FakeHTTP:
+    """Serves channel history from `history`, like Discord's REST API."""
+
+    def __init__(self):
+        # Channel ID -> its messages as raw payloads
+        self.history: dict[int, list[dict]] = {}
+        # Channels whose history we aren't allowed to read
+        self.forbidden: set[int] = set()
+        self.history_requests = 0
+
+    async def logs_from(self, channel_id: int, limit: int, after: int = 0):
+        self.history_requests += 1
+        if channel_id in self.forbidden:
+            raise discord.Forbidden(FakeResponse(403, "Forbidden"), "Missing Access")
+        messages = sorted(
+            (
+                message
+                for message in self.history.get(channel_id, ())
+                if int(message["id"]) > after
+            ),
+            key=lambda message: int(message["id"]),
+        )
+        # The oldest messages after `after`, newest first
+        return messages[:limit][::-1]
+
+
+class FakeConnection:
+    def __init__(self):
+        self.parsed: list[dict] = []
+        self.parsers = {"MESSAGE_CREATE": self.parse_message_create}
+
+    def parse_message_create(self, data: dict):
+        self.parsed.append(data)
+
+
+class FakeBot:
+    """
+    The parts of the bot the Gate cog uses. It becomes ready when `ready`
+    is set.
+    """
+
+    command_prefix = "!"
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.dispatcher = RestDispatcher(loop)
+        self.metrics = FloodgateMetrics()
+        self.user = discord.Object(id=BOT_USER_ID)
+        self.http = FakeHTTP()
+        self._connection = FakeConnection()
+        self.ready = asyncio.Event()
+        self.channels: dict[int, FakeChannel] = {}
+
+    def get_channel(self, channel_id: int) -> FakeChannel:
+        try:
+            return self.channels[channel_id]
+        except KeyError:
+            channel = self.channels[channel_id] = FakeChannel(channel_id)
+            return channel
+
+    async def wait_until_ready(self):
+        await self.ready.wait()
+
+
+def make_bot_config(
+    channels: dict[int, Union[str, dict]], bot: Optional[dict] = None, **floodgate
+) -> Config:
+    """
+    Build a whole config with no state file.
+
+    :param channels: channel ID -> its `gate_open` config (UTC and 5 minutes
+        long unless given), or just the time it opens
+    :param bot: other `bot` config fields
+    :param floodgate: other floodgate config fields
+    """
+    return Config.parse_obj(
+        {
+            "bot_token": "token",
+            "bot": {
+                "modules": {
+                    "floodgate": {
+                        "state_file": None,
+                        "channels": {
+                            channel_id: {
+                                "gate_open": {
+                                    "timezone": "UTC",
+                                    "duration": "5 min",
+                                    **(
+                                        {"time": gate_open}
+                                        if isinstance(gate_open, str)
+                                        else gate_open
+                                    ),
+                                },
+                                "messages": {"open": "open", "close": "close"},
+                            }
+                            for channel_id, gate_open in channels.items()
+                        },
+                        **floodgate,
+                    }
+                },
+                **(bot or {}),
+            },
+        }
+    )
+
+
+def make_config(channels: dict[int, Union[str, dict]], **floodgate) -> FloodgateConfig:
+    """
+    Build a floodgate config with no state file.
+
+    :param channels: see `make_bot_config`
+    :param floodgate: other floodgate config fields
+    """
+    return make_bot_config(channels, **floodgate).bot.modules.floodgate
+
+
+async def start_gate(bot: FakeBot, config: FloodgateConfig, **kwargs) -> Gate:
+    """
+    Add a Gate to a fake bot, make the bot ready and wait for the gates.
+
+    :param kwargs: other arguments for the Gate
+    """
+    gate = Gate(bot, config, **kwargs)
+    bot.ready.set()
+    while not gate._initialized:
+        await asyncio.sleep(0.001)
+    return gate
+
+
+def make_controller(
+    channel, config: GateChannel, saved: Optional[GateRecord] = None
+) -> GateController:
+    """Create a controller for a fake channel, with no store."""
+    loop = asyncio.get_running_loop()
+    return GateController(
+        GateScheduler(loop),
+        # Rate limits would hold up the later requests
+        RestDispatcher(loop, bucket_capacity=100),
+        ClosedChannels(),
+        None,
+        channel,
+        config,
+        saved=saved,
+    )
+
+
+def saved_today(config: GateChannel, closed: bool) -> GateRecord:
+    """A saved plan for a gate open all of today (in UTC), in a given state."""
+    open_at = pen.today("UTC").timestamp()
+    return GateRecord(open_at, open_at + 24 * 60 * 60, closed, config.gate_open.hash)
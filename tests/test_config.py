@@ -0,0 +1,110 @@
+from pathlib import Path
+from typing import Optional
+
+from pydantic import BaseModel
+import pytest
+
+import floodgate.config as config_module
+from floodgate.config import load_config
+
+CONFIG = """
+bot_token: token
+bot:
+  modules:
+    floodgate:
+      state_file: null
+      channels:
+        1:
+          gate_open:
+            timezone: Europe/Berlin
+            time: "{time}"
+            duration: 5 min
+          messages:
+            open: open
+            close: close
+"""
+
+
+def write_config(path: Path, time: str = "12:00") -> Path:
+    path.write_text(CONFIG.format(time=time))
+    return path
+
+
+def fail_to_parse(source: bytes):
+    raise AssertionError("The config was parsed again")
+
+
+def test_cached_config_is_reused(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    path = write_config(tmp_path / "config.yml")
+    config = load_config(path, tmp_path / "cache")
+    assert config_module._cache_file(tmp_path / "cache", path).exists()
+
+    monkeypatch.setattr(config_module, "_parse_config", fail_to_parse)
+    cached = load_config(path, tmp_path / "cache")
+    assert cached == config
+    assert cached.bot_token.get_secret_value() == "token"
+    gate_open = cached.bot.modules.floodgate.channels[1].gate_open
+    assert (
+        gate_open.timezone
+        is config.bot.modules.floodgate.channels[1].gate_open.timezone
+    )
+
+
+def test_changed_config_is_parsed_again(tmp_path: Path):
+    path = write_config(tmp_path / "config.yml")
+    load_config(path, tmp_path / "cache")
+
+    write_config(path, time="18:30")
+    config = load_config(path, tmp_path / "cache")
+    gate_open = config.bot.modules.floodgate.channels[1].gate_open
+    assert [str(time) for time in gate_open.time] == ["18:30:00"]
+
+
+def test_configs_with_the_same_name_are_cached_apart(tmp_path: Path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    path_a = write_config(tmp_path / "a/config.yml")
+    path_b = write_config(tmp_path / "b/config.yml", time="18:30")
+    load_config(path_a, tmp_path / "cache")
+    load_config(path_b, tmp_path / "cache")
+
+    assert len(list((tmp_path / "cache").iterdir())) == 2
+    config = load_config(path_a, tmp_path / "cache")
+    gate_open = config.bot.modules.floodgate.channels[1].gate_open
+    assert [str(time) for time in gate_open.time] == ["12:00:00"]
+
+
+def test_unreadable_cache_is_ignored(tmp_path: Path):
+    path = write_config(tmp_path / "config.yml")
+    expected = load_config(path, None)
+    cache_file = config_module._cache_file(tmp_path / "cache", path)
+    cache_file.parent.mkdir()
+    key = config_module._cache_key(path.read_bytes())
+    cache_file.write_bytes(key + b"\nnot a pickle")
+
+    assert load_config(path, tmp_path / "cache") == expected
+    # Replaced with a good one
+    assert load_config(path, tmp_path / "cache") == expected
+    assert cache_file.read_bytes() != key + b"\nnot a pickle"
+
+
+def test_schema_changes_change_the_cache_key():
+    def make_schema(new_field: bool) -> type[BaseModel]:
+        class Floodgate(BaseModel):
+            channels: dict[int, str] = {}
+            if new_field:
+                channels_dir: Optional[Path] = None
+
+        class Modules(BaseModel):
+            floodgate: Floodgate
+
+        return Modules
+
+    # Configs cached without the new, nested field aren't loaded
+    old, new = make_schema(False), make_schema(True)
+    assert repr(old.__fields__["floodgate"].outer_type_) == repr(
+        new.__fields__["floodgate"].outer_type_
+    )
+    assert config_module._schema_fingerprint(old) != config_module._schema_fingerprint(
+        new
+    )
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+
+import discord
+import pytest
+
+from floodgate.dispatch import Priority, RateLimitLog, RestDispatcher
+
+
+class FakeResponse:
+    def __init__(self, status: int, headers: dict[str, str]):
+        self.status = status
+        self.reason = "Too Many Requests"
+        self.headers = headers
+
+
+def test_transitions_are_dispatched_before_deletions():
+    async def main():
+        loop = asyncio.get_running_loop()
+        dispatcher = RestDispatcher(loop, max_concurrency=1)
+        order = []
+
+        async def make_request(name: str):
+            order.append(name)
+
+        requests = [
+            dispatcher.request(
+                Priority.DELETION, ("delete", i), lambda i=i: make_request(f"d{i}")
+            )
+            for i in range(3)
+        ]
+        requests.append(
+            dispatcher.request(
+                Priority.TRANSITION, ("send", 0), lambda: make_request("open")
+            )
+        )
+        await asyncio.gather(*requests)
+        dispatcher.close()
+        return order
+
+    assert asyncio.run(main()) == ["open", "d0", "d1", "d2"]
+
+
+def test_bucket_rate_limit_is_respected():
+    async def main():
+        loop = asyncio.get_running_loop()
+        dispatcher = RestDispatcher(loop, bucket_rate=100, bucket_capacity=1)
+        times = []
+
+        async def make_request():
+            times.append(loop.time())
+
+        await asyncio.gather(
+            *(
+                dispatcher.request(Priority.DELETION, "bucket", make_request)
+                for __ in range(3)
+            )
+        )
+        dispatcher.close()
+        return times
+
+    times = asyncio.run(main())
+    assert times[2] - times[0] >= 0.015
+
+
+def test_rate_limited_requests_are_retried():
+    async def main():
+        loop = asyncio.get_running_loop()
+        dispatcher = RestDispatcher(loop)
+        attempts = 0
+
+        async def make_request():
+            nonlocal attempts
+            attempts += 1
+            if attempts == 1:
+                # discord.py only raises Discord's 429s once it stops retrying
+                response = FakeResponse(
+                    429, {"Retry-After": "0.01", "Via": "1.1 google"}
+                )
+                raise discord.HTTPException(response, "rate limited")
+            return "ok"
+
+        result = await dispatcher.request(Priority.TRANSITION, "bucket", make_request)
+        dispatcher.close()
+        return result, attempts, dispatcher
+
+    result, attempts, dispatcher = asyncio.run(main())
+    assert result == "ok"
+    assert attempts == 2
+    assert dispatcher.retried_429 == 1
+    assert dispatcher.completed == 1
+
+
+def test_cloudflare_bans_hold_back_every_request():
+    async def main():
+        loop = asyncio.get_running_loop()
+        dispatcher = RestDispatcher(loop, ban_backoff=0.05)
+        attempts = 0
+
+        async def banned():
+            nonlocal attempts
+            attempts += 1
+            raise discord.HTTPException(FakeResponse(429, {}), "banned")
+
+        async def other():
+            return loop.time()
+
+        start = loop.time()
+        with pytest.raises(discord.HTTPException):
+            await dispatcher.request(Priority.TRANSITION, "bucket", banned)
+        sent_at = await dispatcher.request(Priority.TRANSITION, "other", other)
+        dispatcher.close()
+        return attempts, sent_at - start, dispatcher
+
+    attempts, delay, dispatcher = asyncio.run(main())
+    assert attempts == 1
+    assert delay >= 0.05
+    assert dispatcher.banned == 1
+    assert dispatcher.retried_429 == 0
+    assert dispatcher.failed == 1
+
+
+def test_rate_limit_log_counts_without_changing_the_level(
+    caplog: pytest.LogCaptureFixture,
+):
+    http_logger = logging.getLogger("discord.http")
+    rate_limit_log = RateLimitLog()
+    rate_limit_log.attach(logging.ERROR)
+    try:
+        with caplog.at_level(logging.DEBUG):
+            http_logger.warning(
+                "We are being rate limited. Retrying in %.2f seconds. "
+                'Handled under the bucket "%s"',
+                0.5,
+                "bucket",
+            )
+            http_logger.warning("Global rate limit has been hit.")
+            http_logger.error("Something else")
+    finally:
+        rate_limit_log.detach()
+
+    assert rate_limit_log.rate_limited == 1
+    assert rate_limit_log.global_rate_limited == 1
+    # Warnings are below the configured level
+    assert [record.levelname for record in caplog.records] == ["ERROR"]
@@ -1,5 +1,118 @@
+import asyncio
+
+import pendulum as pen
+
 from floodgate import __version__
+from floodgate.gate.store import GateStore
+from tests.harness import FakeDiscord, make_config, start_bot, stop_bot
 
 
 def test_version():
     assert __version__ == '0.1.0'
+
+
+def test_leaked_messages_are_deleted_despite_rate_limits():
+    async def main():
+        fake = FakeDiscord(
+            guilds=2, channels_per_guild=2, latency=0.001, rate_limit_chance=0.5
+        )
+        await fake.start()
+        # Open for a minute starting 12 hours from now, so every gate is closed
+        opens_at = pen.now("UTC").add(hours=12).format("HH:mm")
+        gate_open = {"timezone": "UTC", "time": opens_at, "duration": "1 min"}
+        config = make_config({channel_id: gate_open for channel_id in fake.channel_ids})
+        bot, task = await start_bot(config)
+        try:
+            sent = await fake.send_messages(fake.channel_ids, 200)
+            for __ in range(300):
+                if fake.deleted >= set(sent):
+                    break
+                await asyncio.sleep(0.01)
+            return set(sent), fake.deleted, fake.rate_limited, bot.rate_limit_log
+        finally:
+            await stop_bot(bot, task)
+            await fake.stop()
+
+    sent, deleted, rate_limited, rate_limit_log = asyncio.run(main())
+    assert deleted >= sent
+    assert rate_limited > 0
+    # discord.py retries them before the dispatcher sees them
+    assert rate_limit_log.rate_limited == rate_limited
+
+
+def test_cloudflare_bans_hold_back_requests():
+    async def main():
+        fake = FakeDiscord(guilds=1, channels_per_guild=2, ban_chance=1)
+        await fake.start()
+        opens_at = pen.now("UTC").add(hours=12).format("HH:mm")
+        gate_open = {"timezone": "UTC", "time": opens_at, "duration": "1 min"}
+        config = make_config({channel_id: gate_open for channel_id in fake.channel_ids})
+        bot, task = await start_bot(config)
+        try:
+            await fake.send_messages(fake.channel_ids, 20)
+            for __ in range(300):
+                if bot.dispatcher.banned:
+                    break
+                await asyncio.sleep(0.01)
+            # Let the requests that were already in flight finish
+            await asyncio.sleep(0.05)
+            banned = fake.banned
+
+            await fake.send_messages(fake.channel_ids, 20)
+            await asyncio.sleep(0.3)
+            return banned, fake.banned, bot.dispatcher
+        finally:
+            await stop_bot(bot, task)
+            await fake.stop()
+
+    banned, banned_later, dispatcher = asyncio.run(main())
+    assert dispatcher.banned == banned > 0
+    # Every request after the ban was held back
+    assert banned_later == banned
+    assert dispatcher.queued > 0
+
+
+def test_gate_state_is_saved_on_close(tmp_path):
+    async def main():
+        fake = FakeDiscord(guilds=1, channels_per_guild=2)
+        await fake.start()
+        opens_at = pen.now("UTC").add(hours=12).format("HH:mm")
+        gate_open = {"timezone": "UTC", "time": opens_at, "duration": "1 min"}
+        config = make_config(
+            {channel_id: gate_open for channel_id in fake.channel_ids},
+            state_file=str(tmp_path / "state.db"),
+        )
+        bot, task = await start_bot(config)
+        try:
+            sent = await fake.send_messages(fake.channel_ids, 2)
+            for __ in range(300):
+                if fake.deleted >= set(sent):
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await stop_bot(bot, task)
+            await fake.stop()
+        return fake.channel_ids, sent, bot
+
+    channel_ids, sent, bot = asyncio.run(main())
+    assert bot.get_cog("Gate") is None
+    store = GateStore(tmp_path / "state.db")
+    records, cursors = store.load(), store.load_cursors()
+    store.close()
+    assert records.keys() == set(channel_ids)
+    assert all(record.closed for record in records.values())
+    # The cursors moved past the leaked messages were written, rather than
+    # waiting for the next periodic save
+    assert all(
+        cursors[channel_id] >= message_id
+        for channel_id, message_id in zip(channel_ids, sent)
+    )
+
+
+def test_package_exports_the_bot_module():
+    import floodgate
+    import floodgate.floodgate
+
+    for name in floodgate.floodgate.__all__:
+        assert getattr(floodgate, name) is getattr(floodgate.floodgate, name)
+    assert floodgate.__all__ == floodgate.floodgate.__all__
@@ -0,0 +1,69 @@
+import logging
+from pathlib import Path
+import threading
+
+from floodgate.logs import BatchedTimedRotatingFileHandler, LogPipeline
+
+
+def make_logger(name: str, pipeline: LogPipeline) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(pipeline.handler)
+    return logger
+
+
+def test_full_queue_drops_and_counts(tmp_path: Path):
+    handler = BatchedTimedRotatingFileHandler(tmp_path / "test.log")
+    pipeline = LogPipeline([handler], queue_size=2)
+    logger = make_logger("floodgate.tests.full", pipeline)
+    for i in range(5):
+        logger.info(f"message {i}")
+    assert pipeline.dropped == 3
+
+    pipeline.start()
+    pipeline.stop()
+    handler.close()
+    lines = (tmp_path / "test.log").read_text().splitlines()
+    assert lines == [
+        "message 0",
+        "message 1",
+        "Dropped 3 log record(s) because the log queue was full",
+    ]
+
+
+def test_records_are_written_by_the_listener(tmp_path: Path):
+    handler = BatchedTimedRotatingFileHandler(tmp_path / "test.log")
+    handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    pipeline = LogPipeline([handler])
+    pipeline.start()
+    logger = make_logger("floodgate.tests.listener", pipeline)
+    try:
+        raise ValueError("oops")
+    except ValueError:
+        logger.exception("failed")
+    pipeline.stop()
+    handler.close()
+    text = (tmp_path / "test.log").read_text()
+    assert text.startswith("ERROR failed\nTraceback")
+    assert "ValueError: oops" in text
+
+
+def test_handlers_are_created_by_the_listener(tmp_path: Path):
+    created_by = []
+
+    def make_handlers():
+        created_by.append(threading.current_thread())
+        return [BatchedTimedRotatingFileHandler(tmp_path / "test.log")]
+
+    pipeline = LogPipeline(make_handlers)
+    logger = make_logger("floodgate.tests.factory", pipeline)
+    logger.info("before start")
+    pipeline.start()
+    logger.info("after start")
+    pipeline.stop()
+
+    assert len(created_by) == 1
+    assert created_by[0] is not threading.current_thread()
+    lines = (tmp_path / "test.log").read_text().splitlines()
+    assert lines == ["before start", "after start"]
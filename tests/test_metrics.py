@@ -0,0 +1,71 @@
+import asyncio
+import socket
+
+import aiohttp
+
+from floodgate.metrics import (
+    Collector,
+    Counter,
+    Histogram,
+    MetricsRegistry,
+    MetricsServer,
+)
+
+
+def test_counter_renders_one_series_per_label():
+    registry = MetricsRegistry()
+    counter = registry.register(Counter("seen_total", "Seen", label="channel_id"))
+    counter.inc(1)
+    counter.inc(1)
+    counter.inc(2, 3)
+    assert registry.render().splitlines() == [
+        "# HELP seen_total Seen",
+        "# TYPE seen_total counter",
+        'seen_total{channel_id="1"} 2.0',
+        'seen_total{channel_id="2"} 3.0',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 5):
+        histogram.observe(value)
+    lines = histogram.render()
+    assert lines[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1.0"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 5.65",
+        "latency_seconds_count 4",
+    ]
+
+
+def test_collector_reads_values_at_scrape_time():
+    values = {"gates": None}
+    collector = Collector("gates", "Gates", lambda: values["gates"])
+    assert collector.render() == []
+    values["gates"] = 3
+    assert collector.render()[-1] == "gates 3.0"
+
+
+def test_server_serves_the_registry():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    async def main():
+        registry = MetricsRegistry()
+        registry.register(Counter("seen_total", "Seen")).inc()
+        server = MetricsServer(registry, "127.0.0.1", port)
+        await server.start()
+        try:
+            async with aiohttp.ClientSession() as session:
+                url = f"http://127.0.0.1:{port}/metrics"
+                async with session.get(url) as response:
+                    return response.content_type, await response.text()
+        finally:
+            await server.stop()
+
+    content_type, text = asyncio.run(main())
+    assert content_type == "text/plain"
+    assert "seen_total 1.0" in text
@@ -0,0 +1,48 @@
+import hashlib
+import pickle
+
+from pydantic import parse_obj_as
+
+from floodgate.config import Config
+from floodgate.records import GateChannel, freeze_channels
+
+# noinspection PyProtectedMember
+ChannelModel = Config._Bot._Modules._Floodgate._Channel
+
+
+def parse_channels(times: dict[int, str]) -> dict[int, ChannelModel]:
+    # Each channel gets its own copy of the strings, like when parsing YAML
+    return parse_obj_as(
+        dict[int, ChannelModel],
+        {
+            channel_id: {
+                "gate_open": {"timezone": "UTC", "time": time, "duration": "5 min"},
+                "messages": {"open": "".join("open"), "close": "".join("close")},
+            }
+            for channel_id, time in times.items()
+        },
+    )
+
+
+def test_channels_share_rules_and_messages():
+    channels = freeze_channels(parse_channels({1: "12:00", 2: "12:00", 3: "13:00"}))
+    assert all(isinstance(channel, GateChannel) for channel in channels.values())
+    assert channels[1].gate_open is channels[2].gate_open
+    assert channels[1].gate_open != channels[3].gate_open
+    assert channels[1].open_message is channels[3].open_message
+    assert channels[1] == channels[2]
+
+
+def test_rule_hash_matches_saved_state():
+    # Gate plans were saved with a hash of the gate_open model's repr
+    model = parse_channels({1: "12:00"})[1]
+    expected = hashlib.sha1(repr(model.gate_open).encode()).hexdigest()
+    assert GateChannel.freeze(model).gate_open.hash == expected
+
+
+def test_unpickled_channels_are_interned_again():
+    channels = freeze_channels(parse_channels({1: "12:00"}))
+    unpickled = pickle.loads(pickle.dumps(channels))
+    assert unpickled[1] == channels[1]
+    assert unpickled[1].gate_open is channels[1].gate_open
+    assert unpickled[1].close_message is channels[1].close_message
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from floodgate.reload import ConfigWatcher
+
+
+class PollingConfigWatcher(ConfigWatcher):
+    def _start_inotify(self):
+        raise OSError("inotify disabled for testing")
+
+
+async def watch_for_change(path, force_polling: bool) -> tuple[str, int]:
+    loop = asyncio.get_running_loop()
+    changes = 0
+
+    def on_change():
+        nonlocal changes
+        changes += 1
+
+    watcher_class = PollingConfigWatcher if force_polling else ConfigWatcher
+    watcher = watcher_class(loop, path, on_change, poll_interval=0.01, debounce=0.05)
+    watcher.start()
+    mode = watcher.mode
+
+    await asyncio.sleep(0.05)
+    # Several quick writes should only trigger one change
+    for i in range(3):
+        path.write_text(f"version: {i}")
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.2)
+    watcher.stop()
+    return mode, changes
+
+
+@pytest.mark.parametrize("force_polling", [False, True])
+def test_watcher_detects_changes(tmp_path, force_polling):
+    path = tmp_path / "config.yml"
+    path.write_text("version: 0")
+    mode, changes = asyncio.run(watch_for_change(path, force_polling))
+    if force_polling:
+        assert mode == "polling"
+    assert changes == 1
@@ -0,0 +1,36 @@
+import asyncio
+import time
+
+from floodgate.config import Config
+from floodgate.runtime import LoopLagMonitor, configure_loop
+
+
+def test_monitor_sees_blocked_loop():
+    async def main():
+        monitor = LoopLagMonitor(asyncio.get_running_loop(), 0.01, 0.05)
+        monitor.start()
+        await asyncio.sleep(0.005)
+        time.sleep(0.1)
+        await asyncio.sleep(0.02)
+        monitor.stop()
+        return monitor
+
+    monitor = asyncio.run(main())
+    assert monitor.slow_count == 1
+    assert monitor.max_lag >= 0.05
+
+
+def test_profiles():
+    loop = asyncio.new_event_loop()
+    try:
+        debug = Config._Runtime(profile="debug", slow_callback_ms=20)
+        assert configure_loop(loop, debug) is None
+        assert loop.get_debug()
+        assert loop.slow_callback_duration == 0.02
+
+        monitor = configure_loop(loop, Config._Runtime())
+        assert monitor is not None
+        assert not loop.get_debug()
+        monitor.stop()
+    finally:
+        loop.close()
@@ -0,0 +1,103 @@
+import asyncio
+
+import pendulum as pen
+import pytest
+
+from floodgate.sharding import format_shard_ids, parse_shard_ids, shard_of
+from floodgate.status import format_status
+from tests.harness import FakeDiscord, make_config, start_bot, stop_bot
+
+
+def test_parse_shard_ids():
+    assert parse_shard_ids("0-3,8") == [0, 1, 2, 3, 8]
+    assert parse_shard_ids(" 2, 1,2 ") == [1, 2]
+    assert parse_shard_ids(5) == [5]
+    assert format_shard_ids([8, 0, 1, 2, 3]) == "0-3,8"
+    for invalid in ("", "a", "-1", []):
+        with pytest.raises(ValueError):
+            parse_shard_ids(invalid)
+
+
+def _process_status(shard_ids, unowned, closed=1):
+    return {
+        "pid": 100 + shard_ids[0],
+        "shard_ids": shard_ids,
+        "shard_count": 4,
+        "uptime": 1.0,
+        "guilds": 3,
+        "latencies": {str(shard_id): 0.05 for shard_id in shard_ids},
+        "gates": {
+            "gates": 2,
+            "closed": closed,
+            "scheduled": 2,
+            "backlog": 0,
+            "unowned": unowned,
+        },
+        "socket": f"shards-{format_shard_ids(shard_ids)}.sock",
+    }
+
+
+def test_format_status_finds_problems_across_processes():
+    statuses = [
+        _process_status([0, 1], [10, 11]),
+        _process_status([1, 2, 3], [11, 12]),
+    ]
+    summary = format_status(statuses)
+    assert "total: 2 process(es), 6 guild(s), 4 gate(s) (2 closed)" in summary
+    assert "shards 1 are run by more than one process" in summary
+    # Channel 11 isn't in any process's guilds
+    assert "1 configured channel(s) can't be found: 11" in summary
+
+    statuses = [
+        _process_status([0, 1], [10, 11]),
+        {"socket": "shards-2-3.sock", "error": "Connection refused"},
+    ]
+    summary = format_status(statuses)
+    assert "shards-2-3.sock: not responding (Connection refused)" in summary
+    assert "shards 2-3 aren't running" in summary
+    # The missing shards' guilds might have them
+    assert "can't be found" not in summary
+
+
+def test_processes_gate_only_their_shards_channels(tmp_path):
+    async def main():
+        fake = FakeDiscord(guilds=4, channels_per_guild=2, shards=2)
+        await fake.start()
+        opens_at = pen.now("UTC").add(hours=12).format("HH:mm")
+        gate_open = {"timezone": "UTC", "time": opens_at, "duration": "1 min"}
+        channels = {channel_id: gate_open for channel_id in fake.channel_ids}
+        bots = []
+        try:
+            for shard_id in range(2):
+                config = make_config(
+                    channels,
+                    sharding={
+                        "enabled": True,
+                        "shard_count": 2,
+                        "shard_ids": [shard_id],
+                        "status_dir": str(tmp_path),
+                    },
+                )
+                bots.append(await start_bot(config))
+            gated = [set(bot.get_cog("Gate")._gates) for bot, __ in bots]
+            statuses = await bots[0][0].query_status()
+            return fake, gated, statuses
+        finally:
+            for bot, task in bots:
+                await stop_bot(bot, task)
+            await fake.stop()
+
+    fake, gated, statuses = asyncio.run(main())
+    for shard_id, channel_ids in enumerate(gated):
+        assert channel_ids == {
+            channel_id
+            for guild_id, guild_channels in fake.guilds.items()
+            if shard_of(guild_id, 2) == shard_id
+            for channel_id in guild_channels
+        }
+    assert gated[0] and gated[1]
+    assert gated[0] | gated[1] == set(fake.channel_ids)
+    assert sorted(status["shard_ids"] for status in statuses) == [[0], [1]]
+    summary = format_status(statuses)
+    assert "aren't running" not in summary
+    assert "can't be found" not in summary
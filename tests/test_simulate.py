@@ -0,0 +1,75 @@
+import time
+
+import pendulum as pen
+
+from floodgate.simulate import DAY, print_simulation, simulate
+from tests.helpers import make_config
+
+
+def test_simulate_fixed_time():
+    start = pen.datetime(2021, 6, 1, 12, tz="UTC").timestamp()
+    config = make_config({1: {"time": "14:00", "duration": "30 min"}})
+
+    real_start = time.monotonic()
+    result = simulate(config, days=3, start=start)
+    assert time.monotonic() - real_start < 10
+
+    opened = pen.datetime(2021, 6, 1, 14, tz="UTC").timestamp()
+    expected = []
+    for day in range(3):
+        expected.append((opened + day * DAY, 1, "open"))
+        expected.append((opened + day * DAY + 30 * 60, 1, "close"))
+    assert [(round(t), c, tr) for t, c, tr in result.events] == expected
+    assert result.announcements == 6
+    assert result.max_error < 0.001
+
+
+def test_simulate_random_window_with_salt():
+    start = pen.datetime(2021, 6, 1, tz="UTC").timestamp()
+    gate_open = {
+        "time_window_start": "10:00",
+        "time_window_end": "12:00",
+        "duration": "5 min",
+    }
+    config = make_config({1: gate_open}, random_salt="salt")
+
+    first = simulate(config, days=2, start=start)
+    second = simulate(config, days=2, start=start)
+    assert first.events == second.events
+    assert [transition for _, _, transition in first.events] == [
+        "open",
+        "close",
+        "open",
+        "close",
+    ]
+    for timestamp, _, transition in first.events:
+        if transition == "open":
+            hour = pen.from_timestamp(timestamp, tz="UTC").hour
+            assert 10 <= hour < 12
+
+
+def test_simulate_loads_channel_files(tmp_path, capsys):
+    (tmp_path / "guild.yml").write_text(
+        "2:\n"
+        "  gate_open: {timezone: UTC, time: '15:00', duration: 10 min}\n"
+        "  messages: {open: open, close: close}\n"
+    )
+    start = pen.datetime(2021, 6, 1, 12, tz="UTC").timestamp()
+    config = make_config(
+        {1: {"time": "14:00", "duration": "30 min"}}, channels_dir=str(tmp_path)
+    )
+
+    result = simulate(config, days=1, start=start)
+    assert [
+        (channel_id, transition) for _, channel_id, transition in result.events
+    ] == [
+        (1, "open"),
+        (1, "close"),
+        (2, "open"),
+        (2, "close"),
+    ]
+
+    print_simulation(result)
+    output = capsys.readouterr().out
+    assert "Simulated 1 day(s) of 2 gate(s)" in output
+    assert "open  2" in output